@@ -5,14 +5,23 @@ import streamlit.components.v1 as components
 import plotly.express as px
 import plotly.graph_objects as go
 
-from utils.graph import get_person_influence, graph_vis
+from utils.graph import get_person_influence, get_kinship_path, graph_vis, search_people
 
 st.set_page_config(layout="wide")
 st.title('Elections Graph Search | Simple Relative Search')
 st.markdown("<hr>", unsafe_allow_html=True)
 
 with st.sidebar:
-    selected_national_no = st.text_input('National Number', value='')
+    search_text = st.text_input('Find Person', value='', help='A name, or the start of a national number')
+    matches = search_people(search_text)
+    picked_national_no = ''
+    if search_text and matches.empty:
+        st.caption('No matches.')
+    elif not matches.empty:
+        _format = {r['national_no']: f"{r['full_name']} | {r['national_no']} | {r['center']}" for r in matches.to_dict('records')}
+        picked_national_no = st.selectbox('Matches', options=list(_format), format_func=lambda x: _format[x])
+
+    selected_national_no = st.text_input('National Number', value=picked_national_no)
     
     RELATIONSHIPS = ['FATHER', 'MOTHER', 'SPOUSE', 'SIBLING']
     selected_relationships = st.multiselect('Relationship', RELATIONSHIPS, default=RELATIONSHIPS, format_func=lambda x: x.title())
@@ -22,6 +31,9 @@ with st.sidebar:
 
     selected_degree = st.slider('Degree', min_value=1, max_value=5, value=3)
 
+    st.markdown("<hr>", unsafe_allow_html=True)
+    selected_target_national_no = st.text_input('Connect To (National Number)', value='')
+
 if not selected_national_no:
     st.stop()
 
@@ -31,7 +43,20 @@ query_filters = {
         'degree': selected_degree
     }
 
-data, data2, G = get_person_influence(query_filters)
+data, data2, G, traversal_info = get_person_influence(query_filters)
+
+if traversal_info['reason'] == 'not_found':
+    st.error(f'No person with national number {selected_national_no} in the roll.')
+    st.stop()
+
+if traversal_info['truncated']:
+    st.warning(f"Search stopped early ({traversal_info['reason']}), results are partial up to degree {traversal_info['levels_done']}.")
+
+if data.empty:
+    # cut short before any relatives were reached (see above), or a person with no relatives
+    if not traversal_info['truncated']:
+        st.write('No relatives found within the selected degree.')
+    st.stop()
 
 col1, col2, col3 = st.columns([1, 1, 1])
 col1.metric(label='Total Relatives', value=data['num_relatives'].sum())
@@ -58,6 +83,15 @@ st.write('Drill Down')
 st.dataframe(data2, use_container_width=True)
 st.markdown("<hr>", unsafe_allow_html=True)
 
+if selected_target_national_no:
+    path, path_info = get_kinship_path(query_filters | {'target_national_no': selected_target_national_no})
+    st.write('Kinship Path')
+    if path.empty:
+        st.write('No path found within the selected degree.' if not path_info['truncated'] else f"Path search stopped early ({path_info['reason']}).")
+    else:
+        st.dataframe(path, use_container_width=True)
+    st.markdown("<hr>", unsafe_allow_html=True)
+
 # --------------------------------------------------------------------------------------------------
 g_html = graph_vis(G)
 components.html(g_html, height = 1000, width=1000)
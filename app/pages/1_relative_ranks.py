@@ -1,6 +1,8 @@
 import streamlit as st
 
-from utils.graph import get_circles, get_centers, get_boxes, get_relative_counts, get_counts_by_location
+from utils.graph import get_circles, get_centers, get_boxes, get_relative_counts, get_counts_by_location, get_location_turnout, get_family_index, get_family_members
+from utils.connections import connection_metrics
+from utils.jobs import get_job_manager, job_label, watch_job
 
 st.set_page_config(layout="wide")
 st.title('Elections Graph Search | Relative Rank')
@@ -40,6 +42,10 @@ with st.sidebar:
         st.stop()
 
     selected_degree = st.slider('Degree', min_value=1, max_value=3, value=2)
+    approximate = st.checkbox(
+        'Approximate', value=False,
+        help='Rank on HyperLogLog estimates of each reach, then recount the leading candidates exactly. Much faster for whole circles at degree 3.',
+    )
 
 query_filters = {
         'circle': selected_circle,
@@ -48,35 +54,102 @@ query_filters = {
         'relationship': selected_relationships,
         'degree': selected_degree
     }
+if approximate:
+    query_filters['approximate'] = True
 
 counts = get_counts_by_location(query_filters)
+turnout = get_location_turnout(query_filters)
 
-col1, col2, col3 = st.columns([1, 1, 1])
+col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
 col1.metric(label='Total Centers', value=counts['num_centers'])
 col2.metric(label='Total Boxes', value=counts['num_boxes'])
 col3.metric(label='Total Voters', value=f"{counts['num_voters']:000,}")
+if turnout:
+    col4.metric(
+        label='Expected Turnout',
+        value=f"{turnout['turnout']:.1%}",
+        delta=f"{turnout['turnout'] - turnout['roll_turnout']:+.1%} vs. roll",
+        help=f"About {turnout['expected_voters']:,.0f} voters; by year: "
+             + ', '.join(f"{y[2:]} {r:.0%}" for y, r in turnout['by_year'].items() if r is not None),
+    )
+
+st.markdown("<hr>", unsafe_allow_html=True)
+st.write('Top Families')
+family_by = st.radio(
+    'Group By', ['family_id', 'family_name'], horizontal=True,
+    format_func=lambda x: {'family_id': 'Family', 'family_name': 'Family Name'}[x],
+)
+families = get_family_index(query_filters, by=family_by)
+if families.empty:
+    st.write('Family index is not available for this location.')
+else:
+    st.dataframe(families.drop(columns=['family_ids']), use_container_width=True)
+    selected_family = st.selectbox(
+        'Family Members', options=families.index,
+        format_func=lambda i: f"{families.loc[i, 'family_name']} ({families.loc[i, 'num_voters']} voters)",
+    )
+    with st.expander('See Members:'):
+        st.dataframe(get_family_members(query_filters, families.loc[selected_family, 'family_ids']), use_container_width=True)
+st.markdown("<hr>", unsafe_allow_html=True)
 
+jobs = get_job_manager()
 with st.sidebar:
-    search_trigger = False    
+    # searches run in the background; the page only keeps the id of the one it is showing
     if st.button('Search'):
-        search_trigger = True
-        with st.spinner('Searching...'):
-            q, data = get_relative_counts(query_filters)    
-    
+        st.session_state['relative_ranks_job'] = jobs.submit('relative_counts', get_relative_counts, query_filters)
+
+    previous = [j for j in jobs.list('relative_counts') if j.status == 'done']
+    if previous:
+        selected_job = st.selectbox('Previous Searches', options=[j.job_id for j in previous], format_func=lambda x: job_label(jobs.get(x)))
+        if st.button('Open'):
+            st.session_state['relative_ranks_job'] = selected_job
+
+search_trigger = False
+job_id = st.session_state.get('relative_ranks_job')
+job = watch_job(job_id) if job_id else None
+if job is not None and job.status == 'done':
+    search_trigger = True
+    q, data, traversal_info = jobs.result(job_id)
+    counts = get_counts_by_location(job.params)
+
 if search_trigger:
-    # format data
-    data = (
-        data
-        .assign(
-            influence_perc = lambda x: x['num_relatives'] / counts['num_voters'] * 100,
+    if traversal_info['truncated']:
+        st.warning(f"Search stopped early ({traversal_info['reason']}), counts are partial up to degree {traversal_info['levels_done']}.")
+    if traversal_info['hotspot_families']:
+        st.info(f"This location includes {len(traversal_info['hotspot_families'])} hotspot families (very large family components), searches here take longer.")
+
+    if data.empty:
+        # cut short before any counts (the warning above says why), or nobody related here
+        if not traversal_info['truncated']:
+            st.write('No relatives found for this location.')
+    else:
+        # format data
+        data = (
+            data
+            .assign(
+                influence_perc = lambda x: x['num_relatives'] / counts['num_voters'] * 100,
+            )
+            .pipe(lambda x: x[['num_relatives', 'influence_perc'] + [c for c in x.columns if c not in ['num_relatives', 'influence_perc']]])
         )
-        .pipe(lambda x: x[['num_relatives', 'influence_perc'] + [c for c in x.columns if c not in ['num_relatives', 'influence_perc']]])
-    )
-    st.write(data)
+        if 'turnout_reach' in data.columns:
+            data = data[['num_relatives', 'influence_perc', 'turnout_reach'] + [c for c in data.columns if c not in ['num_relatives', 'influence_perc', 'turnout_reach']]]
+        st.write(data)
+        if 'turnout_reach' in data.columns:
+            st.caption('Turnout Reach: the relatives counted, each weighted by how likely they are to vote from their past elections.')
+        approx_info = traversal_info.get('approximate')
+        if approx_info:
+            st.caption(
+                f"Approximate ranking: reach estimated with {approx_info['registers']} HyperLogLog registers per person "
+                f"(±{approx_info['relative_error']:.1%} standard error, ±{3 * approx_info['relative_error']:.1%} at 3σ); "
+                f"the top {approx_info['refined']} candidates were recounted exactly, so the Num Relatives shown are exact."
+            )
+            if approx_info['unrefined_within_3_sigma']:
+                st.info(
+                    f"{approx_info['unrefined_within_3_sigma']} people outside the recounted candidates have estimates within 3σ "
+                    f"of the cut-off ({approx_info['cutoff']} relatives) and could belong in this list; run an exact search to be sure."
+                )
 
-    family_value_counts = data['family_name'].value_counts()
-    
-else:
+elif job is None:
     st.write('Click on Search to get the results.')
 
 if search_trigger:
@@ -84,8 +157,11 @@ if search_trigger:
     with st.expander("See Debug Info:"):    
         st.write(
             {
-                'query_filters': query_filters,
+                'query_filters': job.params,
                 'counts': counts,
+                'job': job.to_dict(),
+                'traversal': traversal_info,
+                'connections': connection_metrics(),
                 'query_string': "\n".join([l.strip() for l in q.splitlines()]),
             }
         )
\ No newline at end of file
@@ -2,6 +2,8 @@ import select
 import streamlit as st
 
 from utils.graph import get_circles, get_centers, get_boxes, run_clef, get_counts_by_location
+from utils.connections import connection_metrics
+from utils.jobs import get_job_manager, job_label, watch_job
 
 st.set_page_config(layout="wide")
 st.title('Elections Graph Search | Relative Rank')
@@ -64,16 +66,41 @@ col1.metric(label='Total Centers', value=counts['num_centers'])
 col2.metric(label='Total Boxes', value=counts['num_boxes'])
 col3.metric(label='Total Voters', value=f"{counts['num_voters']:000,}")
 
+jobs = get_job_manager()
 with st.sidebar:
-    search_trigger = False    
+    # searches run in the background; the page only keeps the id of the one it is showing
     if st.button('Search'):
-        search_trigger = True
-        with st.spinner('Searching...'):
-            data = run_clef(query_filters)    
-    
+        st.session_state['celf_ranks_job'] = jobs.submit('celf', run_clef, query_filters)
+
+    previous = [j for j in jobs.list('celf') if j.status == 'done']
+    if previous:
+        selected_job = st.selectbox('Previous Searches', options=[j.job_id for j in previous], format_func=lambda x: job_label(jobs.get(x)))
+        if st.button('Open'):
+            st.session_state['celf_ranks_job'] = selected_job
+
+search_trigger = False
+job_id = st.session_state.get('celf_ranks_job')
+job = watch_job(job_id) if job_id else None
+if job is not None and job.status == 'done':
+    search_trigger = True
+    data, traversal_info = jobs.result(job_id)
+
 if search_trigger:
+    if traversal_info['truncated']:
+        st.warning(f"Projection stopped early ({traversal_info['reason']}), ranks are based on relatives up to degree {traversal_info['levels_done']}.")
+    if traversal_info['hotspot_families']:
+        st.info(f"This location includes {len(traversal_info['hotspot_families'])} hotspot families (very large family components), searches here take longer.")
     st.write(data)
-else:
+    celf_info = traversal_info.get('celf')
+    if celf_info and celf_info['warm_start'] != 'cold':
+        st.caption({
+            'resumed': f"Continued the previous run on this projection ({celf_info['seeds_reused']} seeds kept).",
+            'seeded': f"Started from {celf_info['spreads_reused']:,} spread estimates of an overlapping location.",
+            'banked': 'Reused the saved simulations of this projection.',
+        }[celf_info['warm_start']])
+    if 'turnout_reach' in data.columns:
+        st.caption('Turnout Reach: the location voters within the selected degree of each seed, each weighted by how likely they are to vote from their past elections.')
+elif job is None:
     st.write('Click on Search to get the results.')
 
 if search_trigger:
@@ -81,6 +108,9 @@ if search_trigger:
     with st.expander("See Debug Info:"):    
         st.write(
             {
-                'query_filters': query_filters,
+                'query_filters': job.params,
+                'job': job.to_dict(),
+                'traversal': traversal_info,
+                'connections': connection_metrics(),
             }
-        )
+        )
\ No newline at end of file
@@ -0,0 +1,72 @@
+import streamlit as st
+
+from utils.graph import get_circles, get_centers, get_boxes, get_coordinator_coverage, get_uncovered_influencers
+
+st.set_page_config(layout="wide")
+st.title('Elections Graph Search | Coordinator Coverage')
+st.markdown("<hr>", unsafe_allow_html=True)
+
+with st.sidebar:
+    _tmp = get_circles()
+    _values = [x['circle_id'] for x in _tmp]
+    _format = {x['circle_id']: x['circle_name'] for x in _tmp}
+    selected_circle = st.selectbox('Circle', options=_values, format_func=lambda x: _format[x])
+
+    if not selected_circle:
+        st.stop()
+
+    col1, col2 = st.columns([1, 2], vertical_alignment='center')
+    _tmp = get_centers(selected_circle)
+    _values = [x['center_id'] for x in _tmp]
+    _format = {x['center_id']: x['center_name'] for x in _tmp}
+    filter_center = col1.checkbox('Filter by Center', value=True)
+    selected_center = col2.selectbox('Center', options=_values, format_func=lambda x: _format[x], disabled=not filter_center)
+
+    col1, col2 = st.columns([1, 2], vertical_alignment='center')
+    _tmp = get_boxes(selected_circle, selected_center)
+    _values = [x['box_id'] for x in _tmp]
+    _format = {x['box_id']: x['box_name'] for x in _tmp}
+    filter_box = col1.checkbox('Filter by Box')
+    selected_box = col2.selectbox('Box', options=_values, format_func=lambda x: _format[x], disabled=not filter_box)
+
+    st.markdown("<hr>", unsafe_allow_html=True)
+
+    selected_role = st.radio('Coordinator', ['principal', 'sub'], format_func=lambda x: x.title(), horizontal=True)
+    selected_degree = st.slider('Degree', min_value=1, max_value=3, value=2)
+
+query_filters = {
+        'circle': selected_circle,
+        'center': selected_center if filter_center else None,
+        'box': selected_box if filter_box else None,
+        'degree': selected_degree
+    }
+
+summary, coordinators = get_coordinator_coverage(query_filters, role=selected_role)
+if not summary:
+    st.write('Coordinator coverage is not available for this location, it is built with the graph.')
+else:
+    # an empty location has no voters to share out
+    location_voters = max(summary['location_voters'], 1)
+
+    col1, col2, col3 = st.columns([1, 1, 1])
+    col1.metric(label='Total Voters', value=f"{summary['location_voters']:000,}")
+    col2.metric(
+        label='Covered by a Principal',
+        value=f"{summary['principal_covered'] / location_voters:.1%}",
+        help=f"{summary['principal_covered']:,} voters, {summary['num_principals']} principal coordinators",
+    )
+    col3.metric(
+        label='Covered by a Sub Coordinator',
+        value=f"{summary['sub_covered'] / location_voters:.1%}",
+        help=f"{summary['sub_covered']:,} voters, {summary['num_subs']} sub coordinators",
+    )
+
+    st.markdown("<hr>", unsafe_allow_html=True)
+    st.write(f'{selected_role.title()} Coordinators')
+    st.caption(f'Reach: distinct people within {selected_degree} hops of the voters assigned here; Total columns cover the whole roll.')
+    st.dataframe(coordinators, use_container_width=True)
+
+st.markdown("<hr>", unsafe_allow_html=True)
+st.write('Uncovered High-Influence Voters')
+st.caption('Voters with no principal or sub coordinator, ranked by the number of other voters within 2 hops.')
+st.dataframe(get_uncovered_influencers(query_filters), use_container_width=True)
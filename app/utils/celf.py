@@ -0,0 +1,295 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.kinship import build_csr, gather_edges, gather_neighbors, sorted_contains, sorted_unique
+from utils.live_edges import (
+    LIVE_EDGES_MAX_BYTES, LiveEdgeBank, bank_bytes, bank_key, coin_salts, coin_threshold, coins, load_bank,
+    sample_masks, sample_reach, save_bank,
+)
+from utils.sketches import hash64
+
+# (cascade, edge) pairs a batch of cascades may walk; batches are sized on the spreads seen so far
+CELF_BATCH_EDGES = int(os.getenv('CELF__BATCH_EDGES', 10_000_000))
+# stale queue entries re-evaluated together per lazy-greedy step
+CELF_LAZY_BATCH = int(os.getenv('CELF__LAZY_BATCH', 8))
+# projections whose CELF state stays in memory between runs
+CELF_MAX_STATES = int(os.getenv('CELF__MAX_STATES', 8))
+
+
+class CelfState:
+    # independent-cascade CELF over one projection, kept between runs. Every simulation flips each
+    # edge's coin from a hash of the edge (its neo4j ids) and the simulation number, so gains computed
+    # in one run stay exact in the next one, and in any other projection holding the same edges.
+    # With a bank_dir the coins and first-round spreads come from a live-edge bank (utils.live_edges)
+    # shared by every run, user and process on the same projection, and cascades that reach the
+    # bank's hub skip walking its reach.
+    def __init__(self, src, dst, probability, simulations, bank_dir=None):
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        self.node_ids = sorted_unique(np.concatenate([src, dst]))
+        self.n = len(self.node_ids)
+
+        local_src, local_dst = np.searchsorted(self.node_ids, src), np.searchsorted(self.node_ids, dst)
+        edge_hash = hash64(hash64(src) ^ dst.astype(np.uint64))
+        # edges in (source, target) order, so the same edge set always lands on the same positions
+        order = np.lexsort((local_dst, local_src))
+        self.offsets, self.targets = build_csr(self.n, local_src[order], local_dst[order])
+        self.edge_hash = edge_hash[order]
+        self.fanout = max(len(self.targets) / max(self.n, 1), 1.0)
+        self._reverse = None
+
+        # in-edge fingerprint of every node: what changed between two projections
+        self.in_degree = np.bincount(local_dst, minlength=self.n)
+        self.in_signature = np.zeros(self.n, dtype=np.uint64)
+        np.bitwise_xor.at(self.in_signature, local_dst, edge_hash)
+
+        self.probability = probability
+        self.simulations = simulations
+        self.threshold = coin_threshold(probability)
+        self.salts = coin_salts(simulations)
+        self.bank_dir = bank_dir
+        self.bank = None
+        self.bank_status = None
+
+        # lazy-greedy queue: best known marginal gain of every node and the seed count it was computed at
+        self.initial = None
+        self.gains = None
+        self.rounds = None
+        self.seeds, self.seed_gains = [], []
+        self.active = np.empty(0, dtype=np.int64)       # (simulation, node) keys the seeds activate
+        self.reused = 0
+        self.info = {}
+        self._overlap = None
+        self.lock = threading.Lock()
+
+    def reverse(self):
+        # in-edges as a CSR, with the forward position of every edge (build_csr keeps the order stable)
+        if self._reverse is None:
+            owners = np.repeat(np.arange(self.n), np.diff(self.offsets))
+            self._reverse = (*build_csr(self.n, self.targets, owners), np.argsort(self.targets, kind='stable'))
+        return self._reverse
+
+    def sim_keys(self, keys):
+        # (group, node) -> (simulation, node); group = seed position * simulations + simulation
+        return (keys // self.n % self.simulations) * self.n + keys % self.n
+
+    def hub_overlap(self, blocked):
+        # per simulation, how much of the hub's reach is already active; blocked only ever grows
+        if blocked is None:
+            return 0
+        if self._overlap is None or self._overlap[0] != len(blocked):
+            sample = blocked // self.n
+            inside = self.bank.in_reach(sample, blocked % self.n)
+            self._overlap = (len(blocked), np.bincount(sample[inside], minlength=self.simulations))
+        return self._overlap[1]
+
+    def cascade(self, seeds, blocked=None, shortcut=False):
+        # one cascade per (seed, simulation), all expanded together as (group, node) keys over the
+        # live edges; nodes already active in a simulation (`blocked`) add nothing and stop the spread.
+        # With `shortcut`, a cascade whose seed reaches the bank's hub counts the hub's reach (less
+        # what is blocked) in `extra` instead of walking it. Returns (visited keys, extra per group).
+        n, sims = self.n, self.simulations
+        seeds = np.asarray(seeds, dtype=np.int64)
+        visited = np.arange(len(seeds) * sims, dtype=np.int64) * n + np.repeat(seeds, sims)
+        extra = np.zeros(len(visited), dtype=np.int64)
+        if blocked is not None:
+            visited = visited[~sorted_contains(blocked, self.sim_keys(visited))]
+
+        hubbed = None
+        if shortcut and self.bank is not None and self.bank.hub is not None:
+            group = visited // n
+            hubbed = np.zeros(len(extra), dtype=bool)
+            hubbed[group] = self.bank.in_upstream(group % sims, visited % n)
+            extra[hubbed] = (self.bank.reach_sizes - self.hub_overlap(blocked))[np.flatnonzero(hubbed) % sims]
+            visited = visited[~(hubbed[group] & self.bank.in_reach(group % sims, visited % n))]
+
+        frontier = visited
+        while len(frontier):
+            group, node = frontier // n, frontier % n
+            owner, pos = gather_edges(self.offsets, node)
+            sample = group[owner] % sims
+            if self.bank is not None:
+                live = self.bank.live(sample, pos)
+            else:
+                live = coins(self.edge_hash[pos], self.salts[sample], self.threshold)
+            keys = sorted_unique(group[owner[live]] * n + self.targets[pos[live]])
+            new = keys[~sorted_contains(visited, keys)]
+            if blocked is not None:
+                new = new[~sorted_contains(blocked, self.sim_keys(new))]
+            if hubbed is not None:
+                group = new // n
+                new = new[~(hubbed[group] & self.bank.in_reach(group % sims, new % n))]
+            visited = np.sort(np.concatenate([visited, new]))
+            frontier = new
+
+        return visited, extra
+
+    def gain(self, seeds, blocked=None):
+        # expected number of newly activated nodes, per seed, and the most (group, node) keys any
+        # one seed's cascades walked
+        visited, extra = self.cascade(seeds, blocked, shortcut=True)
+        walked = np.bincount(visited // self.n // self.simulations, minlength=len(seeds))
+        total = walked + extra.reshape(len(seeds), self.simulations).sum(axis=1)
+        return total / self.simulations, int(walked.max(initial=0))
+
+    def upstream(self, flagged):
+        # nodes that can reach a flagged node (flagged included)
+        offsets, sources, _ = self.reverse()
+        reached = flagged.copy()
+        frontier = np.flatnonzero(flagged)
+        while len(frontier):
+            _, found = gather_neighbors(offsets, sources, frontier)
+            found = sorted_unique(found)
+            frontier = found[~reached[found]]
+            reached[frontier] = True
+        return reached
+
+    def unchanged_nodes(self, other):
+        # nodes whose single-seed spread is the same in `other`: neither projection lets them reach a
+        # node whose in-edges differ between the two. Returns (positions here, positions in other).
+        common = self.node_ids[sorted_contains(other.node_ids, self.node_ids)]
+        mine, theirs = np.searchsorted(self.node_ids, common), np.searchsorted(other.node_ids, common)
+        same = (self.in_degree[mine] == other.in_degree[theirs]) & (self.in_signature[mine] == other.in_signature[theirs])
+
+        changed_here = np.ones(self.n, dtype=bool)
+        changed_here[mine[same]] = False
+        changed_there = np.ones(other.n, dtype=bool)
+        changed_there[theirs[same]] = False
+
+        keep = ~self.upstream(changed_here)[mine] & ~other.upstream(changed_there)[theirs]
+        return mine[keep], theirs[keep]
+
+    def initialize(self, donor=None, progress=None, should_stop=None):
+        # first round of the queue, every node's own spread: a node without out-edges only ever
+        # activates itself and a bank of this projection already holds the rest; otherwise unchanged
+        # nodes take the donor projection's spread and the others are simulated, then banked
+        gains = np.ones(self.n, dtype=np.float64)
+        todo = np.flatnonzero(np.diff(self.offsets) > 0)
+
+        key = None
+        if self.bank_dir is not None and bank_bytes(len(self.targets), self.n, self.simulations) <= LIVE_EDGES_MAX_BYTES:
+            key = bank_key(self.edge_hash, self.n, self.probability, self.simulations)
+            self.bank = load_bank(self.bank_dir, key)
+            if self.bank is not None:
+                self.bank_status = 'loaded'
+                gains[todo] = self.bank.spreads[todo]
+                todo = todo[:0]
+            else:
+                self.bank = self.sample_bank()
+
+        if donor is not None and len(todo):
+            mine, theirs = self.unchanged_nodes(donor)
+            gains[mine] = donor.initial[theirs]
+            todo = todo[~sorted_contains(mine, todo)]
+            self.reused = len(mine)
+
+        # costliest nodes first, so the walks mostly shrink as the batches grow: those that miss the
+        # bank's hub in the most simulations, then the widest
+        missed = np.full(self.n, self.simulations, dtype=np.int64)
+        if self.bank is not None and self.bank.hub is not None:
+            missed -= self.bank.upstream_counts(self.n)
+        todo = todo[np.lexsort((-np.diff(self.offsets)[todo], -missed[todo]))]
+        start, batch = 0, 1
+        while start < len(todo):
+            if should_stop is not None and should_stop():
+                return False
+            chunk = todo[start:start + batch]
+            gains[chunk], walked = self.gain(chunk)
+            start += len(chunk)
+            batch = int(max(min(batch * 4, CELF_BATCH_EDGES // (max(walked, self.simulations) * self.fanout)), 1))
+            if progress is not None:
+                progress(start, len(todo))
+
+        if key is not None and self.bank.path is None:
+            self.bank = save_bank(
+                self.bank_dir, key, self.bank, gains,
+                nodes=self.n, edges=len(self.targets), probability=self.probability, samples=self.simulations,
+            ) or self.bank
+            self.bank_status = 'built'
+
+        self.initial = gains
+        self.gains = gains.copy()
+        self.rounds = np.zeros(self.n, dtype=np.int64)
+        return True
+
+    def sample_bank(self):
+        # fresh masks plus the hub components; the hub is the node most edges run through
+        masks = sample_masks(self.edge_hash, self.probability, self.simulations)
+        out_degree = np.diff(self.offsets)
+        hub = int(np.argmax(out_degree * self.in_degree))
+        if out_degree[hub] * self.in_degree[hub] == 0:
+            empty = np.zeros((self.simulations, 0), dtype=np.uint8)
+            return LiveEdgeBank(None, masks, None, None, empty, empty)
+        reach = sample_reach(self.offsets, self.targets, masks, hub)
+        offsets, sources, positions = self.reverse()
+        upstream = sample_reach(offsets, sources, masks, hub, positions)
+        return LiveEdgeBank(None, masks, None, hub, reach, upstream)
+
+    def extend(self, k, progress=None, should_stop=None):
+        # lazy greedy from wherever the last run stopped; a smaller k is just a prefix
+        with self.lock:
+            while len(self.seeds) < min(k, self.n):
+                if should_stop is not None and should_stop():
+                    break
+                r = len(self.seeds)
+                best = int(np.argmax(self.gains))
+                if self.rounds[best] == r:
+                    visited, _ = self.cascade([best], self.active)
+                    self.active = np.sort(np.concatenate([self.active, self.sim_keys(visited)]))
+                    self.seeds.append(best)
+                    self.seed_gains.append(len(visited) / self.simulations)
+                    self.gains[best] = -np.inf
+                    if progress is not None:
+                        progress(len(self.seeds), k)
+                    continue
+
+                # stale: gains only shrink as seeds are added, so re-evaluate the leading few together
+                m = min(CELF_LAZY_BATCH, self.n - r)
+                top = np.union1d(np.argpartition(-self.gains, m - 1)[:m], [best])
+                top = top[(self.rounds[top] < r) & np.isfinite(self.gains[top])]
+                top = top[np.argsort(-self.gains[top], kind='stable')]
+                walked = np.cumsum(self.gains[top] * self.simulations * self.fanout)
+                top = top[:max(np.searchsorted(walked, CELF_BATCH_EDGES, side='right'), 1)]
+                self.gains[top], _ = self.gain(top, self.active)
+                self.rounds[top] = r
+
+            return self.node_ids[np.asarray(self.seeds[:k], dtype=np.int64)], list(self.seed_gains[:k])
+
+
+# states by (compatibility key, location); only states sharing a compatibility key (same build,
+# relationships, degree, probability and simulations) can lend each other spreads
+_states = OrderedDict()
+_states_lock = threading.Lock()
+
+
+def get_state(compat, location):
+    with _states_lock:
+        state = _states.get((compat, location))
+        if state is not None:
+            _states.move_to_end((compat, location))
+        return state
+
+
+def put_state(compat, location, state, max_states=CELF_MAX_STATES):
+    with _states_lock:
+        _states[(compat, location)] = state
+        _states.move_to_end((compat, location))
+        while len(_states) > max_states:
+            _states.popitem(last=False)
+
+
+def clear_states():
+    # forget every queue, e.g. once a new build is published (its keys can never match again)
+    with _states_lock:
+        _states.clear()
+
+
+def find_donor(compat, node_ids):
+    # the compatible state sharing the most nodes
+    with _states_lock:
+        candidates = [s for (c, _), s in _states.items() if c == compat and s.initial is not None]
+    overlaps = [int(sorted_contains(s.node_ids, node_ids).sum()) for s in candidates]
+    return candidates[int(np.argmax(overlaps))] if candidates and max(overlaps) else None
@@ -0,0 +1,211 @@
+import itertools
+import os
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import neo4j
+from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
+
+try:
+    # the app ships a .env; the build script gets its credentials on the command line
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+# pool and retry settings, shared by the app and the build script
+NEO4J_POOL_SIZE = int(os.getenv('NEO4J__POOL_SIZE', 50))
+NEO4J_ACQUISITION_TIMEOUT = float(os.getenv('NEO4J__ACQUISITION_TIMEOUT', 60))
+NEO4J_MAX_CONNECTION_LIFETIME = float(os.getenv('NEO4J__MAX_CONNECTION_LIFETIME', 3600))
+NEO4J_LIVENESS_CHECK_TIMEOUT = float(os.getenv('NEO4J__LIVENESS_CHECK_TIMEOUT', 30))
+NEO4J_RETRIES = int(os.getenv('NEO4J__RETRIES', 5))
+NEO4J_RETRY_BACKOFF = float(os.getenv('NEO4J__RETRY_BACKOFF', 0.5))
+NEO4J_RETRY_BACKOFF_MAX = float(os.getenv('NEO4J__RETRY_BACKOFF_MAX', 30))
+NEO4J_STARTUP_TIMEOUT = float(os.getenv('NEO4J__STARTUP_TIMEOUT', 300))
+
+TRANSIENT_ERRORS = (ServiceUnavailable, SessionExpired, TransientError)
+
+
+class ConnectionManager:
+    # one pooled driver (and one GDS client on top of it) per database, created on first use and
+    # rebuilt only when the server went away
+    def __init__(
+        self,
+        uri,
+        user,
+        password,
+        pool_size=NEO4J_POOL_SIZE,
+        retries=NEO4J_RETRIES,
+        backoff=NEO4J_RETRY_BACKOFF,
+    ):
+        self.uri = uri
+        self.auth = (user, password)
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff = backoff
+
+        self.lock = threading.RLock()
+        self.counters = Counter()
+        self.in_flight = 0
+        self.query_seconds = 0.0
+        self._driver = None
+        self._gds = None
+        self._sessions = Counter()         # open session() count per driver
+        self._retired = set()              # replaced drivers, closed once their sessions end
+
+    def driver(self):
+        with self.lock:
+            if self._driver is None:
+                self._driver = neo4j.GraphDatabase.driver(
+                    self.uri,
+                    auth=self.auth,
+                    max_connection_pool_size=self.pool_size,
+                    connection_acquisition_timeout=NEO4J_ACQUISITION_TIMEOUT,
+                    max_connection_lifetime=NEO4J_MAX_CONNECTION_LIFETIME,
+                    liveness_check_timeout=NEO4J_LIVENESS_CHECK_TIMEOUT,
+                )
+                self.counters['drivers_created'] += 1
+            return self._driver
+
+    def gds(self):
+        # imported here so the build script does not need the GDS client installed
+        from graphdatascience import GraphDataScience
+
+        with self.lock:
+            if self._gds is None:
+                self._gds = GraphDataScience(self.driver())
+                self.counters['gds_created'] += 1
+            return self._gds
+
+    @contextmanager
+    def session(self):
+        # a session on the current driver, counted so a reset never closes it under a running query
+        with self.lock:
+            driver = self.driver()
+            self._sessions[driver] += 1
+        try:
+            with driver.session() as session: # type: ignore
+                yield session
+        finally:
+            with self.lock:
+                self._sessions[driver] -= 1
+                if not self._sessions[driver]:
+                    del self._sessions[driver]
+                    if driver in self._retired:
+                        self._retired.discard(driver)
+                        self._close(driver)
+
+    def reset(self):
+        # drop pooled connections, e.g. after the server was restarted: new sessions get a new
+        # driver straight away, the old one is closed when the last of its sessions ends
+        with self.lock:
+            driver, self._driver, self._gds = self._driver, None, None
+            if driver is not None:
+                self.counters['resets'] += 1
+                if self._sessions[driver]:
+                    self._retired.add(driver)
+                else:
+                    self._sessions.pop(driver, None)
+                    self._close(driver)
+
+    def _close(self, driver):
+        try:
+            driver.close()
+        except Exception:
+            pass
+
+    def healthy(self):
+        self.counters['health_checks'] += 1
+        try:
+            self.driver().verify_connectivity()
+            return True
+        except Exception:
+            self.counters['health_check_failures'] += 1
+            return False
+
+    def wait_until_available(self, timeout=NEO4J_STARTUP_TIMEOUT):
+        started = time.monotonic()
+        for attempt in itertools.count():
+            if self.healthy():
+                return time.monotonic() - started
+            if time.monotonic() - started > timeout:
+                raise ServiceUnavailable(f"Neo4j at {self.uri} not available after {timeout:.0f}s")
+            self.reset()
+            time.sleep(self._delay(attempt))
+
+    def _delay(self, attempt):
+        # exponential backoff with full jitter
+        return random.uniform(0, min(self.backoff * 2 ** attempt, NEO4J_RETRY_BACKOFF_MAX))
+
+    def retry(self, fn, *args, **kwargs):
+        for attempt in range(self.retries + 1):
+            try:
+                return fn(*args, **kwargs)
+            except TRANSIENT_ERRORS:
+                if attempt == self.retries:
+                    self.counters['failures'] += 1
+                    raise
+                self.counters['retries'] += 1
+                if not self.healthy():
+                    # the pool only holds dead connections now; reconnect on the next attempt
+                    self.reset()
+                time.sleep(self._delay(attempt))
+
+    def run(self, query, **params):
+        def attempt():
+            with self.session() as session:
+                return session.run(query, **params).data()
+
+        with self.lock:
+            self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            return self.retry(attempt)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+                self.query_seconds += time.perf_counter() - started
+                self.counters['queries'] += 1
+
+    def metrics(self):
+        with self.lock:
+            return {
+                'uri': self.uri,
+                'pool_size': self.pool_size,
+                'connected': self._driver is not None,
+                'in_flight': self.in_flight,
+                'retired_drivers': len(self._retired),
+                'query_seconds': round(self.query_seconds, 3),
+                **dict(self.counters),
+            }
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_connection_manager(uri=None, user=None, password=None):
+    uri = uri or os.getenv('NEO4J__URI')
+    user = user or os.getenv('NEO4J__USER')
+    password = password or os.getenv('NEO4J__PASSWORD')
+
+    with _managers_lock:
+        key = (uri, user)
+        if key not in _managers:
+            _managers[key] = ConnectionManager(uri, user, password)
+        return _managers[key]
+
+
+def reset_connections(wait=True):
+    # after a server restart: forget every pooled connection, then block until neo4j answers again
+    for manager in list(_managers.values()):
+        manager.reset()
+        if wait:
+            manager.wait_until_available()
+
+
+def connection_metrics():
+    return [manager.metrics() for manager in list(_managers.values())]
@@ -1,45 +1,202 @@
+import functools
 import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 from uuid import uuid4
 from dotenv import load_dotenv
-import neo4j
-from graphdatascience import GraphDataScience
 import networkx as nx
 from prompt_toolkit import HTML
 import streamlit as st
 from pyvis.network import Network
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc
+
+from utils import celf, result_cache
+from utils.connections import get_connection_manager
+from utils.kinship import build_csr, grouped_reach, sorted_contains, sorted_unique
+from utils.search import CANDIDATE_POOL, normalize_name, open_search_index
+from utils.sketches import HLL_PRECISION, estimate, init_registers, propagate, relative_error
+from utils.snapshot import COORDINATOR_INDEX_FILE, FAMILY_INDEX_FILE, UNCOVERED_INDEX_FILE, current_build_id, open_snapshot
+from utils.traversal import TraversalBudget, expand_from_sources, find_path
+from utils.turnout import ELECTION_YEARS, group_turnout, propensity, smoothed_rate, turnout_rate, weighted_reach
+
+load_dotenv()
 
 DB_DIR = os.path.join(os.path.dirname(__file__), 'db')
 HTML_DIR = os.path.join('html')
+LIVE_EDGES_DIR = os.path.join(DB_DIR, 'live_edges')
+
+# traversal budgets: a query that would blow past these returns partial, flagged results instead
+TRAVERSAL_MAX_FRONTIER = int(os.getenv('TRAVERSAL__MAX_FRONTIER', 2_000_000))
+TRAVERSAL_TIME_BUDGET = float(os.getenv('TRAVERSAL__TIME_BUDGET', 60))
+TRAVERSAL_FAMILY_PREFETCH_MAX_NODES = int(os.getenv('TRAVERSAL__FAMILY_PREFETCH_MAX_NODES', 500_000))
+NEIGHBOR_BATCH_SIZE = 20_000
+
+# approximate ranking: people recounted exactly after ranking on HyperLogLog estimates
+APPROX_REFINE_CANDIDATES = int(os.getenv('APPROX__REFINE_CANDIDATES', 1_000))
+
+# CELF runs in-process on the snapshot (state kept between runs, see utils.celf) unless set to 'gds'
+CELF_ENGINE = os.getenv('CELF__ENGINE', 'local')
+
+# how often a caller waiting on an identical in-flight query checks its own job
+SINGLE_FLIGHT_POLL_INTERVAL = float(os.getenv('SINGLE_FLIGHT__POLL_INTERVAL', 0.5))
 
 # --------------------------------------------------------------------------------------------------
 # --------------------------------------------------------------------------------------------------
 
-@st.cache_resource
 def get_driver():
-    load_dotenv()
-    uri = os.getenv('NEO4J__URI')
-    user = os.getenv('NEO4J__USER')
-    password = os.getenv('NEO4J__PASSWORD')
-
-    return neo4j.GraphDatabase.driver(uri, auth=(user, password))
+    return get_connection_manager().driver()
 
 def get_gds():
-    load_dotenv()
-    uri = os.getenv('NEO4J__URI')
-    user = os.getenv('NEO4J__USER')
-    password = os.getenv('NEO4J__PASSWORD')
-
-    return GraphDataScience(uri, auth=(user, password))
+    return get_connection_manager().gds()
 
 def run_query(query, **kwargs):
-    with get_driver().session() as session: #type: ignore
-        return session.run(query, **kwargs).data() 
+    return get_connection_manager().run(query, **kwargs)
+
+# single-flight: identical calls already running are joined instead of repeated
+# --------------------------------------------------------------------------------------------------
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+LOCATION_KEYS = ['box', 'center', 'circle']
+INT_FILTERS = ['degree', 'seedSetSize', 'monteCarloSimulations', 'max_frontier']
+FLOAT_FILTERS = ['probability', 'time_budget']
+
+def normalize_filters(filters):
+    # only the most specific location is ever used; lists are order-free; numbers from widgets vary in type
+    location = next((k for k in LOCATION_KEYS if filters.get(k)), None)
+    out = []
+    for k, v in filters.items():
+        if v is None or v == '' or (k in LOCATION_KEYS and k != location):
+            continue
+        if isinstance(v, (list, tuple, set)):
+            v = tuple(sorted(v))
+        elif k in INT_FILTERS:
+            v = int(v)
+        elif k in FLOAT_FILTERS:
+            v = float(v)
+        out.append((k, v))
+    return tuple(sorted(out))
+
+def single_flight(fn):
+    # callers share the leader's result object, so they must treat it as read-only
+    @functools.wraps(fn)
+    def wrapper(filters, *args, job=None, **kwargs):
+        key = (fn.__name__, normalize_filters(filters), args, tuple(sorted(kwargs.items())))
+        while True:
+            with _inflight_lock:
+                call = _inflight.get(key)
+                leader = call is None
+                if leader:
+                    call = _inflight[key] = Future()
+
+            if leader:
+                break
+
+            # a follower whose own job is cancelled or out of time stops waiting: run on its own, the
+            # function sees the job and returns its usual partial result right away
+            while True:
+                try:
+                    result, complete = call.result(timeout=SINGLE_FLIGHT_POLL_INTERVAL)
+                    break
+                except FutureTimeout:
+                    if job is not None and (job.cancelled() or job.remaining() <= 0):
+                        return fn(filters, *args, job=job, **kwargs)
+
+            # a leader cancelled half way has nothing complete to share; try again (or lead)
+            if complete:
+                return result
+
+        try:
+            result = fn(filters, *args, job=job, **kwargs)
+            call.set_result((result, job is None or not job.cancelled()))
+            return result
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        finally:
+            with _inflight_lock:
+                _inflight.pop(key, None)
+
+    return wrapper
+
+def persistent_cache(cacheable=lambda result: True):
+    # results of the current snapshot build kept on disk across processes (and pre-filled by
+    # scripts/warm_cache.py); every call also counts towards its location's access frequency
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(filters, *args, job=None, **kwargs):
+            snapshot = get_snapshot()
+            if snapshot is None:
+                return fn(filters, *args, job=job, **kwargs)
+
+            location = get_location_names(filters.get('circle'), filters.get('center'), filters.get('box'))
+            key = repr((normalize_filters(filters), args, tuple(sorted(kwargs.items()))))
+            result_cache.record_access(DB_DIR, fn.__name__, result_cache.location_key(location))
+
+            hit, result = result_cache.get(DB_DIR, snapshot.build_id, fn.__name__, key)
+            if hit:
+                return result
+
+            started = time.perf_counter()
+            result = fn(filters, *args, job=job, **kwargs)
+            if (job is None or not job.cancelled()) and cacheable(result):
+                result_cache.put(DB_DIR, snapshot.build_id, fn.__name__, key, result, time.perf_counter() - started)
+            return result
+
+        return wrapper
+    return decorator
+# --------------------------------------------------------------------------------------------------
+
+@st.cache_resource
+def load_snapshot(build_id):
+    # one mapping per build shared by every session; a rebuild publishes a new build id, and the
+    # CELF queues of the previous one only hold memory from then on
+    celf.clear_states()
+    return open_snapshot(DB_DIR, build_id)
+
+def get_snapshot():
+    build_id = current_build_id(DB_DIR)
+    return load_snapshot(build_id) if build_id else None
+
+@st.cache_resource
+def load_turnout(build_id):
+    # (roll-wide rate, smoothed propensity of every person); None for snapshots built before the
+    # election history was packed
+    snapshot = load_snapshot(build_id)
+    if 'voted_mask' not in snapshot.arrays:
+        return None
+    voted, known = np.asarray(snapshot.arrays['voted_mask']), np.asarray(snapshot.arrays['known_mask'])
+    prior = turnout_rate(voted, known)
+    return prior, propensity(voted, known, prior)
+
+def get_turnout():
+    snapshot = get_snapshot()
+    return load_turnout(snapshot.build_id) if snapshot is not None else None
+
+@st.cache_resource
+def load_search_index(snapshot_path):
+    return open_search_index(snapshot_path)
+
+def get_search_index():
+    # written after the snapshot is published, so a fresh build may briefly have none yet
+    snapshot = get_snapshot()
+    if snapshot is None or not os.path.isdir(os.path.join(snapshot.path, 'search')):
+        return None
+    return load_search_index(snapshot.path)
 
 # --------------------------------------------------------------------------------------------------
 @st.cache_data
 def get_circles():
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        circles = snapshot.boxes.drop_duplicates('circle_id').sort_values('circle')
+        return [{'circle_name': r['circle'], 'circle_id': r['circle_id']} for r in circles.to_dict('records')]
+
     q = """
         MATCH (c:Circle)
         RETURN c.name as circle_name, elementId(c) as circle_id
@@ -50,6 +207,11 @@ def get_circles():
 
 @st.cache_data
 def get_centers(circle_id):
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        centers = snapshot.boxes[snapshot.boxes['circle_id'] == circle_id].drop_duplicates('center_id')
+        return [{'center_name': r['center'], 'center_id': r['center_id']} for r in centers.to_dict('records')]
+
     q = f"""
         MATCH (c:Circle)--(ce:Center)
         WHERE elementId(c) = '{circle_id}'
@@ -60,6 +222,11 @@ def get_centers(circle_id):
 
 @st.cache_data
 def get_boxes(circle_id, center_id):
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        boxes = snapshot.boxes[(snapshot.boxes['circle_id'] == circle_id) & (snapshot.boxes['center_id'] == center_id)]
+        return [{'box_name': r['box'], 'box_id': r['box_id']} for r in boxes.to_dict('records')]
+
     q = f"""
         MATCH (c:Circle)--(ce:Center)--(b:Box)
         WHERE elementId(c) = '{circle_id}' AND elementId(ce) = '{center_id}'
@@ -68,11 +235,21 @@ def get_boxes(circle_id, center_id):
 
     return run_query(q)
 
-def get_counts_by_location(filters):
+@single_flight
+def get_counts_by_location(filters, job=None):
     target_box = filters.get('box')
     target_center = filters.get('center')
     target_circle = filters.get('circle')
 
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        boxes = snapshot.boxes.iloc[snapshot.location_boxes(target_circle, target_center, target_box)]
+        return {
+            'num_centers': int(boxes['center_id'].nunique()),
+            'num_boxes': len(boxes),
+            'num_voters': int(np.diff(snapshot.box_offsets)[boxes.index].sum()),
+        }
+
     if target_box:
         q = f"""
             MATCH (p:Person)--(b:Box)
@@ -113,65 +290,368 @@ def get_counts_by_location(filters):
         'num_voters': num_voters
     }
 
-def get_relative_counts(filters):
-    target_relationships = f"({'|'.join(filters.get('relationship'))})"
-    target_degrees = filters.get('degree', '1')
-    RETURN_BLOCK = """
-        RETURN
-            DISTINCT
-            person.first_name + ' ' + person.father_name + ' ' + person.grand_name + ' ' + person.family_name as full_name,
-            // person.first_name as first_name,
-            // person.father_name as father_name,
-            // person.grand_name as grand_name,
-            person.family_name as family_name,
-            person.national_no as national_no,
-            person.phone_number as phone_number,
-            person.principal_coordinator as principal_coordinator,
-            person.sub_coordinator as sub_coordinator,
-            person.primary_key as primary_key,
-            COUNT(DISTINCT relative) AS num_relatives
-        ORDER BY num_relatives DESC
-        LIMIT 100;
-    """
-    # box search
+@single_flight
+def get_location_turnout(filters, job=None):
+    snapshot = get_snapshot()
+    turnout = get_turnout()
+    if turnout is None:
+        return {}
+
+    prior, person_turnout = turnout
+    members = snapshot.location_members(filters.get('circle'), filters.get('center'), filters.get('box'))
+    voted = np.asarray(snapshot.arrays['voted_mask'])[members]
+    known = np.asarray(snapshot.arrays['known_mask'])[members]
+    rate, by_year = group_turnout(np.zeros(len(members)), 1, voted, known, prior)
+
+    return {
+        'turnout': float(rate[0]),
+        'expected_voters': float(person_turnout[members].sum()),
+        'roll_turnout': prior,
+        'by_year': {y: (float(v / k) if k else None) for y, (v, k) in zip(ELECTION_YEARS, by_year[0])},
+    }
+
+def get_turnout_reach(snapshot, nodes, sources, relationships, degree, direction):
+    # expected turnout among the voters each person reaches: the walk behind the counts, summing
+    # every reached voter's propensity instead of counting them
+    turnout = get_turnout()
+    if turnout is None:
+        return None
+
+    weights = np.zeros(snapshot.num_nodes, dtype=np.float64)
+    weights[sources] = turnout[1][sources]
+    neighbors = lambda idx: snapshot.neighbors(idx, relationships, direction)
+    return weighted_reach(neighbors, nodes, degree, weights)
+
+def get_location_voters(filters):
     target_box = filters.get('box')
     target_center = filters.get('center')
     target_circle = filters.get('circle')
 
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        members = snapshot.location_members(target_circle, target_center, target_box)
+        q = f"snapshot {snapshot.build_id}: members of {target_box or target_center or target_circle}"
+        rows = pd.DataFrame({
+            'node_id': np.asarray(snapshot.node_ids)[members],
+            'family_id': np.asarray(snapshot.arrays['family_id'])[members],
+            'family_size': np.asarray(snapshot.arrays['family_size'])[members],
+            'is_hotspot': np.asarray(snapshot.arrays['is_hotspot'])[members],
+        })
+        return q, rows.to_dict('records')
+
     if target_box:
-        q = f"""
+        MATCH_BLOCK = f"""
             MATCH (relative:Person)--(box:Box)
             WHERE elementId(box) = '{target_box}'
-            WITH relative
-            MATCH (person)-[:{target_relationships}*1..{target_degrees}]->(relative:Person)
-            {RETURN_BLOCK}
         """
     elif target_center:
-        q = f"""
+        MATCH_BLOCK = f"""
             MATCH (relative:Person)--(box:Box)--(center:Center)
             WHERE elementId(center) = '{target_center}'
-            WITH relative
-            MATCH (person)-[:{target_relationships}*1..{target_degrees}]->(relative:Person)
-            {RETURN_BLOCK}
         """
     else:
-        q = f"""
+        MATCH_BLOCK = f"""
             MATCH (relative:Person)--(box:Box)--(center:Center)--(circle:Circle)
             WHERE elementId(circle) = '{target_circle}'
-            WITH relative
-            MATCH (person)-[:{target_relationships}*1..{target_degrees}]->(relative:Person)
-            {RETURN_BLOCK}
         """
 
-    print('execuitng query ... ')
-    data = run_query(q)
+    q = f"""
+        {MATCH_BLOCK}
+        WITH DISTINCT relative
+        OPTIONAL MATCH (family:Family {{family_id: relative.family_id}})
+        RETURN
+            id(relative) as node_id,
+            relative.family_id as family_id,
+            relative.family_size as family_size,
+            coalesce(family.is_hotspot, false) as is_hotspot
+    """
+
+    return q, run_query(q)
+
+def get_traversal_sources(voters):
+    # a voter alone in their family component has no relatives to reach
+    sources = [v['node_id'] for v in voters if v['family_size'] is None or v['family_size'] > 1]
+    hotspots = sorted({v['family_id'] for v in voters if v['is_hotspot']})
+
+    return sources, {'skipped_singletons': len(voters) - len(sources), 'hotspot_families': hotspots}
+
+def get_kinship_neighbors(relationships, direction='both'):
+    target_relationships = '|'.join(relationships)
+    pattern = {
+        'both': f"-[:{target_relationships}]-",
+        'out': f"-[:{target_relationships}]->",
+        'in': f"<-[:{target_relationships}]-",
+    }[direction]
+
+    q = f"""
+        UNWIND $ids AS node_id
+        MATCH (p) WHERE id(p) = node_id
+        MATCH (p){pattern}(n:Person)
+        RETURN node_id, collect(id(n)) AS neighbors
+    """
+
+    def neighbors(ids):
+        out = {}
+        for start in range(0, len(ids), NEIGHBOR_BATCH_SIZE):
+            for row in run_query(q, ids=ids[start:start + NEIGHBOR_BATCH_SIZE]):
+                out[row['node_id']] = row['neighbors']
+        return out
+
+    return neighbors
+
+def get_family_adjacency(relationships, family_ids):
+    target_relationships = '|'.join(relationships)
+    q = f"""
+        UNWIND $family_ids AS family_id
+        MATCH (p:Person {{family_id: family_id}})
+        OPTIONAL MATCH (p)-[:{target_relationships}]->(n:Person)
+        RETURN id(p) as node_id, collect(id(n)) as neighbors
+    """
+
+    adjacency = {}
+    for start in range(0, len(family_ids), NEIGHBOR_BATCH_SIZE):
+        for row in run_query(q, family_ids=family_ids[start:start + NEIGHBOR_BATCH_SIZE]):
+            adjacency[row['node_id']] = row['neighbors']
+    return adjacency
+
+def get_scoped_neighbors(relationships, voters, direction='both'):
+    # family components are closed under kinship, so every traversal from a voter stays inside the
+    # voter's family: small families are pulled whole in one query, hotspots are expanded per level
+    sizes = {
+        v['family_id']: v['family_size'] for v in voters
+        if v['family_id'] is not None and (v['family_size'] or 0) > 1 and not v['is_hotspot']
+    }
+    prefetch, total = [], 0
+    for family_id, size in sorted(sizes.items(), key=lambda x: x[1]):
+        if total + size > TRAVERSAL_FAMILY_PREFETCH_MAX_NODES:
+            break
+        prefetch.append(family_id)
+        total += size
+
+    out_adjacency = get_family_adjacency(relationships, prefetch) if prefetch else {}
+    adjacency = {u: [] for u in out_adjacency}
+    for u, vs in out_adjacency.items():
+        if direction in ('out', 'both'):
+            adjacency[u].extend(vs)
+        if direction in ('in', 'both'):
+            for v in vs:
+                adjacency[v].append(u)
+
+    remote = get_kinship_neighbors(relationships, direction=direction)
+
+    def neighbors(ids):
+        local = {i: adjacency[i] for i in ids if i in adjacency}
+        missing = [i for i in ids if i not in adjacency]
+        return (local | remote(missing)) if missing else local
 
-    return q, pd.DataFrame(data)
+    return neighbors
 
-def build_graph_from_query(query):
-    with get_driver().session() as session:
-        res = session.run(query)
-        n4j_graph = res.graph()
+def get_neighbors(relationships, voters, direction='both'):
+    # the mapped snapshot answers adjacency in-process; neo4j is the fallback before the first build
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        return snapshot.neighbors_fn(relationships, direction)
+    return get_scoped_neighbors(relationships, voters, direction)
+
+def get_traversal_budget(filters, job=None):
+    time_budget = float(filters.get('time_budget', TRAVERSAL_TIME_BUDGET))
+    if job is not None:
+        # background jobs also stop on cancel and never outlive their own timeout
+        return TraversalBudget(
+            max_frontier=int(filters.get('max_frontier', TRAVERSAL_MAX_FRONTIER)),
+            time_budget=min(time_budget, job.remaining()),
+            should_stop=job.cancelled,
+        )
+
+    return TraversalBudget(
+        max_frontier=int(filters.get('max_frontier', TRAVERSAL_MAX_FRONTIER)),
+        time_budget=time_budget,
+    )
+
+def get_person_rows(node_ids):
+    q = """
+        UNWIND $ids AS node_id
+        MATCH (person) WHERE id(person) = node_id
+        RETURN
+            node_id,
+            person.first_name + ' ' + person.father_name + ' ' + person.grand_name + ' ' + person.family_name as full_name,
+            person.family_name as family_name,
+            person.national_no as national_no,
+            person.phone_number as phone_number,
+            person.principal_coordinator as principal_coordinator,
+            person.sub_coordinator as sub_coordinator,
+            person.primary_key as primary_key
+    """
+
+    return run_query(q, ids=list(node_ids))
+
+@persistent_cache(lambda result: not result[2]['truncated'])
+@single_flight
+def get_relative_counts(filters, job=None):
+    snapshot = get_snapshot()
+    if filters.get('approximate') and snapshot is not None:
+        return get_approximate_relative_counts(snapshot, filters, job)
+
+    target_degrees = int(filters.get('degree', '1'))
+
+    # person -[*1..degree]-> relative, walked backwards from every voter in the location
+    q, voters = get_location_voters(filters)
+    sources, scope = get_traversal_sources(voters)
+    traversal = expand_from_sources(
+        sources,
+        get_neighbors(filters.get('relationship'), voters, direction='in'),
+        target_degrees,
+        budget=get_traversal_budget(filters, job),
+        progress=job.stage('Expanding relatives', 0.0, 0.9) if job else None,
+    )
+
+    top = sorted(traversal.counts.items(), key=lambda x: (-x[1], x[0]))[:100]
+    rows = {row['node_id']: row for row in get_person_rows([node_id for node_id, _ in top])}
+    data = [
+        {k: v for k, v in rows[node_id].items() if k != 'node_id'} | {'num_relatives': count}
+        for node_id, count in top if node_id in rows
+    ]
+
+    info = traversal.info()
+    if snapshot is not None and data:
+        # relatives were walked backwards from the voters, so their turnout is reached forwards
+        turnout_reach = get_turnout_reach(
+            snapshot, snapshot.index_of([node_id for node_id, _ in top if node_id in rows]), snapshot.index_of(sources),
+            filters.get('relationship'), info['levels_done'], 'out',
+        )
+        if turnout_reach is not None:
+            data = [row | {'turnout_reach': round(float(t), 1)} for row, t in zip(data, turnout_reach)]
+
+    return q, pd.DataFrame(data), info | scope
+
+def get_approximate_relative_counts(snapshot, filters, job=None):
+    started = time.perf_counter()
+    target_degrees = int(filters.get('degree', '1'))
+    relationships = filters.get('relationship')
+    budget = get_traversal_budget(filters, job)
+    progress = job.stage('Sketching relatives', 0.0, 0.9) if job else None
+
+    q, voters = get_location_voters(filters)
+    sources, scope = get_traversal_sources(voters)
+    sources = sorted_unique(snapshot.index_of(sources))
+
+    # everyone within `degree` hops upstream of a voter: every path that can count stays inside
+    ball, frontier = sources, sources
+    for _ in range(target_degrees):
+        _, found = snapshot.neighbors(frontier, relationships, 'in')
+        found = sorted_unique(found)
+        frontier = found[~sorted_contains(ball, found)]
+        ball = np.sort(np.concatenate([ball, frontier]))
+
+    owner, found = snapshot.neighbors(ball, relationships, 'out')
+    inside = sorted_contains(ball, found)
+    offsets, targets = build_csr(len(ball), owner[inside], np.searchsorted(ball, found[inside]))
+    is_source = sorted_contains(sources, ball)
+
+    # HyperANF: k sketch-union steps give every person a sketch of the voters within k hops
+    registers = init_registers(len(ball), np.flatnonzero(is_source))
+    levels_done, reason = 0, None
+    for level in range(target_degrees):
+        reason = budget.exceeded()
+        if reason:
+            break
+        registers = propagate(registers, offsets, targets)
+        levels_done = level + 1
+        if progress is not None:
+            progress(levels_done, target_degrees)
+
+    # a voter's own sketch holds the voter, the exact count never does
+    estimates = np.maximum(estimate(registers) - is_source, 0.0) if levels_done else np.zeros(len(ball))
+    del registers
+
+    # rank on the estimates, then recount only the leading candidates exactly
+    candidates = np.lexsort((ball, -estimates))[:APPROX_REFINE_CANDIDATES]
+    exact = (
+        grouped_reach(offsets, targets, np.arange(len(candidates)), candidates, levels_done, counted=is_source)[:, -1]
+        if levels_done and len(candidates) else np.zeros(len(candidates), dtype=np.int64)
+    )
+    order = np.lexsort((ball[candidates], -exact))[:100]
+    top = [(int(snapshot.node_ids[ball[candidates[i]]]), int(exact[i]), float(estimates[candidates[i]])) for i in order if exact[i] > 0]
+
+    rows = {row['node_id']: row for row in get_person_rows([node_id for node_id, _, _ in top])}
+    data = [
+        {k: v for k, v in rows[node_id].items() if k != 'node_id'} | {'num_relatives': count, 'estimated_relatives': round(est)}
+        for node_id, count, est in top if node_id in rows
+    ]
+    if data:
+        turnout_reach = get_turnout_reach(
+            snapshot, snapshot.index_of([node_id for node_id, _, _ in top if node_id in rows]), sources,
+            relationships, levels_done, 'out',
+        )
+        if turnout_reach is not None:
+            data = [row | {'turnout_reach': round(float(t), 1)} for row, t in zip(data, turnout_reach)]
+
+    # how close the best person left unrefined comes to making the list
+    error = relative_error(HLL_PRECISION)
+    cutoff = top[-1][1] if len(top) == 100 else 1
+    unrefined = np.delete(estimates, candidates)
+    info = {
+        'truncated': reason is not None,
+        'reason': reason,
+        'levels_done': levels_done,
+        'elapsed': round(time.perf_counter() - started, 3),
+        'fetched': 0,
+        'levels': [],
+        'approximate': {
+            'registers': 2 ** HLL_PRECISION,
+            'relative_error': round(float(error), 4),
+            'people_sketched': len(ball),
+            'refined': len(candidates),
+            'cutoff': cutoff,
+            'max_unrefined_estimate': round(float(unrefined.max()), 1) if len(unrefined) else 0.0,
+            'unrefined_within_3_sigma': int((unrefined * (1 + 3 * error) >= cutoff).sum()),
+        },
+    }
+
+    return q, pd.DataFrame(data), info | scope
+
+def search_people(text, limit=20):
+    text = (text or '').strip()
+    if not text:
+        return pd.DataFrame()
+
+    index = get_search_index()
+    if index is None:
+        # before the first build only a national number prefix can be looked up
+        if not text.isdigit():
+            return pd.DataFrame()
+        q = """
+            MATCH (p:Person) WHERE p.national_no STARTS WITH $prefix AND p.is_missing = false
+            RETURN p.national_no as national_no, p.full_name as full_name, p.family_name as family_name,
+                p.circle as circle, p.center as center, p.box as box, 1.0 as score
+            ORDER BY national_no
+            LIMIT $limit
+        """
+        return pd.DataFrame(run_query(q, prefix=text, limit=limit))
+
+    idx, scores = index.search(text, CANDIDATE_POOL)
+    columns = ['national_no', 'full_name', 'family_name', 'circle', 'center', 'box']
+    data = get_snapshot().persons.select(columns).take(pa.array(idx, pa.int64())).to_pandas()
+
+    # grams ignore word order; a name that reads like the query goes first among equal scores
+    query = normalize_name(text)
+    names = data['full_name'].map(normalize_name)
+    phrase = names.str.startswith(query).astype(int) + names.str.contains(query, regex=False).astype(int)
+
+    return (
+        data.assign(score=scores.round(3), phrase=phrase)
+        .sort_values(['score', 'phrase'], ascending=False, kind='stable')
+        .drop(columns='phrase')
+        .head(limit)
+        .reset_index(drop=True)
+    )
+
+def build_graph_from_query(query, **kwargs):
+    def fetch():
+        with get_connection_manager().session() as session:
+            return session.run(query, **kwargs).graph()
+
+    n4j_graph = get_connection_manager().retry(fetch)
 
     _nodes = []
     for node in n4j_graph.nodes:
@@ -199,19 +679,38 @@ def graph_vis(graph):
 
 def get_person_influence(filters):
     target_national_no = filters.get('national_no')
-    target_relationships = f"({'|'.join(filters.get('relationship'))})"
-    target_degrees = filters.get('degree', '1')
- 
-    q = f"""
-        MATCH (voter:Person {{national_no: '{target_national_no}'}}) -[:({target_relationships})*1..{target_degrees}]- (relatives: Person)
-        OPTIONAL MATCH (relatives) -[r1:VOTES_AT]-> (b1)
-        OPTIONAL  MATCH (voter) -[r2:VOTES_AT]-> (b2)
-        WITH voter, relatives, collect(distinct b1) + collect(distinct b2) AS b, r1, r2
-        UNWIND b AS singleb
-        OPTIONAL MATCH (ce) -[r3:HAS_BOX]-> (singleb)
-        UNWIND ce AS singlece
-        MATCH (c) -[r4:HAS_CENTER]-> (singlece)
-        RETURN DISTINCT
+    target_relationships = '|'.join(filters.get('relationship'))
+    target_degrees = int(filters.get('degree', '1'))
+
+    voter = run_query(
+        """
+            MATCH (voter:Person {national_no: $national_no})
+            OPTIONAL MATCH (family:Family {family_id: voter.family_id})
+            RETURN
+                id(voter) as node_id,
+                voter.family_id as family_id,
+                voter.family_size as family_size,
+                coalesce(family.is_hotspot, false) as is_hotspot
+            LIMIT 1
+        """,
+        national_no=target_national_no,
+    )
+    if not voter:
+        return pd.DataFrame(), pd.DataFrame(), nx.DiGraph(), {'truncated': False, 'reason': 'not_found', 'levels_done': 0}
+
+    voter_id = voter[0]['node_id']
+    traversal = expand_from_sources(
+        [voter_id],
+        get_neighbors(filters.get('relationship'), voter),
+        target_degrees,
+        budget=get_traversal_budget(filters),
+    )
+    relative_ids = list(traversal.reached[voter_id])
+
+    q = """
+        UNWIND $ids AS node_id
+        MATCH (relatives) WHERE id(relatives) = node_id
+        RETURN
             relatives.first_name + ' ' + relatives.father_name + ' ' + relatives.grand_name + ' ' + relatives.family_name as full_name,
             relatives.circle as circle,
             relatives.center as center,
@@ -223,7 +722,7 @@ def get_person_influence(filters):
             relatives.primary_key as primary_key
     """
 
-    data = run_query(q)
+    data = run_query(q, ids=relative_ids)
     
     if data:
         df2 = pd.DataFrame(data)
@@ -233,84 +732,429 @@ def get_person_influence(filters):
         df2 = pd.DataFrame()
         df1 = pd.DataFrame()
     
+    # kinship edges among everyone reached, instead of enumerating every path up to the degree
     q = f"""
-        MATCH (voter:Person {{national_no: '{target_national_no}'}}) -[x:({target_relationships})*1..{target_degrees}]- (relatives: Person)
-        OPTIONAL MATCH (relatives) -[r1:VOTES_AT]-> (b1)
-        OPTIONAL  MATCH (voter) -[r2:VOTES_AT]-> (b2)
-        return voter, relatives, x
+        MATCH (voter:Person)-[x:{target_relationships}]-(relatives:Person)
+        WHERE id(voter) IN $ids AND id(relatives) IN $ids
+        RETURN voter, relatives, x
     """
 
-    G = build_graph_from_query(q)
+    G = build_graph_from_query(q, ids=[voter_id] + relative_ids)
 
-    return df1, df2, G
+    return df1, df2, G, traversal.info()
 
+def get_kinship_path(filters):
+    source_national_no = filters.get('national_no')
+    target_national_no = filters.get('target_national_no')
+    target_degrees = int(filters.get('degree', '1'))
 
+    rows = run_query(
+        """
+            MATCH (p:Person) WHERE p.national_no IN $national_nos
+            OPTIONAL MATCH (family:Family {family_id: p.family_id})
+            RETURN
+                p.national_no as national_no,
+                id(p) as node_id,
+                p.family_id as family_id,
+                p.family_size as family_size,
+                coalesce(family.is_hotspot, false) as is_hotspot
+        """,
+        national_nos=[source_national_no, target_national_no],
+    )
+    people = {row['national_no']: row for row in rows}
+    if source_national_no not in people or target_national_no not in people:
+        return pd.DataFrame(), {'truncated': False, 'reason': 'not_found'}
 
-def run_clef(filters):
-    target_box = filters.get('box')
-    target_center = filters.get('center')
-    target_circle = filters.get('circle')
-    raw_relationships = filters.get('relationship')
-    target_relationships = f"({'|'.join(filters.get('relationship'))})"
+    # different family components are never connected
+    source, target = people[source_national_no], people[target_national_no]
+    if source['family_id'] is not None and source['family_id'] != target['family_id']:
+        return pd.DataFrame(), {'truncated': False, 'reason': None}
+
+    path, truncated, reason = find_path(
+        source['node_id'],
+        target['node_id'],
+        get_neighbors(filters.get('relationship'), [source]),
+        target_degrees,
+        budget=get_traversal_budget(filters),
+    )
+    if not path:
+        return pd.DataFrame(), {'truncated': truncated, 'reason': reason}
 
+    rows = {row['node_id']: row for row in get_person_rows(path)}
+    data = [
+        {'step': i} | {k: v for k, v in rows[node_id].items() if k != 'node_id'}
+        for i, node_id in enumerate(path) if node_id in rows
+    ]
+
+    return pd.DataFrame(data), {'truncated': truncated, 'reason': reason}
+
+
+
+CELF_COLUMNS = ['score', 'full_name', 'national_no', 'phone_number', 'principal_coordinator', 'sub_coordinator', 'primary_key']
+
+def get_celf_keys(filters, build_id):
+    # runs that only differ in seed count share a state; runs that also differ in location can
+    # still share spreads (see utils.celf)
+    params = dict(normalize_filters(filters))
+    location = tuple((k, params.pop(k)) for k in LOCATION_KEYS if k in params)
+    for k in ['seedSetSize', 'time_budget', 'max_frontier']:
+        params.pop(k, None)
+    return (build_id, tuple(sorted(params.items()))), location
+
+@single_flight
+def run_clef(filters, job=None):
+    _, voters = get_location_voters(filters)
+    sources, scope = get_traversal_sources(voters)
+    snapshot = get_snapshot()
+    if CELF_ENGINE == 'gds' or snapshot is None:
+        out, info = run_gds_celf(filters, voters, sources, job)
+    else:
+        out, info = run_local_celf(snapshot, filters, voters, sources, job)
+    if out.empty:
+        return out, info | scope
+
+    # seeds come back by national_no; the spread walk was undirected
+    if snapshot is not None:
+        idx = snapshot.lookup_national_no(out['national_no'].tolist())
+        turnout_reach = get_turnout_reach(
+            snapshot, np.maximum(idx, 0), snapshot.index_of(sources),
+            filters.get('relationship'), info['levels_done'], 'both',
+        )
+        if turnout_reach is not None:
+            out['turnout_reach'] = np.where(idx >= 0, turnout_reach.round(1), np.nan)
+
+    return out, info | scope
+
+def get_celf_pairs(filters, voters, sources, job=None, stop=0.3):
+    # (person)-[*1..degree]-(relative) pairs, one per distinct pair rather than one per path
+    traversal = expand_from_sources(
+        sources,
+        get_neighbors(filters.get('relationship'), voters),
+        int(filters.get('degree', '1')),
+        budget=get_traversal_budget(filters, job),
+        progress=job.stage('Expanding relatives', 0.0, stop) if job else None,
+    )
+    return traversal, [[person, relative] for person, relative in traversal.pairs()]
+
+def run_local_celf(snapshot, filters, voters, sources, job=None):
+    started = time.perf_counter()
+    target_set_size = int(filters.get('seedSetSize', 10))
+    compat, location = get_celf_keys(filters, snapshot.build_id)
+
+    # the same projection again (e.g. more seeds): continue its queue, no traversal at all
+    state = celf.get_state(compat, location)
+    warm_start = 'resumed' if state is not None else None
+    if state is None:
+        traversal, pairs = get_celf_pairs(filters, voters, sources, job)
+        if not pairs or (job is not None and job.cancelled()):
+            return pd.DataFrame(), traversal.info()
+
+        pairs = np.asarray(pairs, dtype=np.int64)
+        state = celf.CelfState(
+            pairs[:, 0], pairs[:, 1],
+            float(filters.get('probability', 0.1)), int(filters.get('monteCarloSimulations', 1000)),
+            bank_dir=LIVE_EDGES_DIR,
+        )
+        state.info = traversal.info()
+
+        # another location at the same settings (e.g. the box inside this center) lends every
+        # spread the new voters cannot change
+        donor = celf.find_donor(compat, state.node_ids)
+        if job is not None:
+            job.report(0.3, 'Estimating spreads')
+        initialized = state.initialize(
+            donor,
+            progress=job.stage('Estimating spreads', 0.3, 0.8) if job else None,
+            should_stop=job.cancelled if job else None,
+        )
+        if not initialized:
+            return pd.DataFrame(), state.info | {'truncated': True, 'reason': 'cancelled'}
+        warm_start = 'banked' if state.bank_status == 'loaded' else 'seeded' if state.reused else 'cold'
+        # a truncated projection is not the location's real one, it must not seed other runs
+        if not state.info['truncated']:
+            celf.put_state(compat, location, state)
+
+    seeds_before = len(state.seeds)
+    node_ids, gains = state.extend(
+        target_set_size,
+        progress=job.stage('Selecting seeds', 0.8, 1.0) if job else None,
+        should_stop=job.cancelled if job else None,
+    )
+
+    rows = {row['node_id']: row for row in get_person_rows(node_ids.tolist())}
+    out = pd.DataFrame([
+        {k: v for k, v in rows[node_id].items() if k != 'node_id'} | {'score': gain}
+        for node_id, gain in zip(node_ids.tolist(), gains) if node_id in rows
+    ])
+    if out.empty:
+        return out, state.info
+
+    info = state.info | {
+        'celf': {
+            'warm_start': warm_start,
+            'projection_nodes': state.n,
+            'projection_edges': len(state.targets),
+            'spreads_reused': state.reused,
+            'live_edge_bank': state.bank_status,
+            'seeds_reused': min(seeds_before, target_set_size),
+            'elapsed': round(time.perf_counter() - started, 3),
+        },
+    }
+    return out[CELF_COLUMNS].sort_values('score', ascending=False, kind='stable').reset_index(drop=True), info
+
+def run_gds_celf(filters, voters, sources, job=None):
     target_set_size = filters.get('seedSetSize', 10)
     target_monte_carlo = filters.get('monteCarloSimulations', 1000)
     target_probability = filters.get('probability', 0.1)
-    target_degrees = filters.get('degree', '1')
 
-    if target_box:
-        MATCH_BLOCK = f"""
-            MATCH (relative:Person)--(box:Box)
-            WHERE elementId(box) = '{target_box}'
-            WITH relative
-            MATCH (person)-[:{target_relationships}*1..{target_degrees}]-(relative:Person)
-            
-        """
-    elif target_center:
-        MATCH_BLOCK = f"""
-            MATCH (relative:Person)--(box:Box)--(center:Center)
-            WHERE elementId(center) = '{target_center}'
-            WITH relative
-            MATCH (person)-[:{target_relationships}*1..{target_degrees}]-(relative:Person)
-        """
-    else:
-        MATCH_BLOCK = f"""
-            MATCH (relative:Person)--(box:Box)--(center:Center)--(circle:Circle)
-            WHERE elementId(circle) = '{target_circle}'
-            WITH relative
-            MATCH (person)-[:{target_relationships}*1..{target_degrees}]-(relative:Person
-        """
-    
+    traversal, pairs = get_celf_pairs(filters, voters, sources, job)
+    if not pairs or (job is not None and job.cancelled()):
+        return pd.DataFrame(), traversal.info()
+    if job is not None:
+        job.report(0.3, 'Projecting graph')
+
     gds = get_gds()
     
     # build graph projection
     _projection_name = str(uuid4())
     
     build_q = f"""
-        {MATCH_BLOCK}
+        UNWIND $pairs AS pair
+        MATCH (person) WHERE id(person) = pair[0]
+        MATCH (relative) WHERE id(relative) = pair[1]
         RETURN gds.graph.project('{_projection_name}', person, relative)
     """
     
-    G, res = gds.graph.cypher.project(build_q)
+    G, res = gds.graph.cypher.project(build_q, pairs=pairs)
     print(res)
     print(f"Graph '{G.name()}' node count: {G.node_count()}")
     print(f"Graph '{G.name()}' node labels: {G.node_labels()}")
     print(f"Graph '{G.name()}' relationship count: {G.relationship_count()}")
 
-    # run clef
-    clef_result = gds.beta.influenceMaximization.celf.stream(
-        G=G,
-        seedSetSize=target_set_size,
-        monteCarloSimulations=target_monte_carlo,
-        propagationProbability=target_probability
-    )
-    
-    # augment with node details
-    _props = ['score', 'full_name', 'national_no', 'phone_number', 'principal_coordinator', 'sub_coordinator', 'primary_key']
-    out = []
-    for tup in clef_result.itertuples():
-        out.append(gds.util.asNode(tup.nodeId)._properties | {'score': tup.spread})
+    try:
+        # run clef
+        if job is not None:
+            job.report(0.4, 'Running CELF')
+        clef_result = gds.beta.influenceMaximization.celf.stream(
+            G=G,
+            seedSetSize=target_set_size,
+            monteCarloSimulations=target_monte_carlo,
+            propagationProbability=target_probability
+        )
+        
+        # augment with node details
+        out = []
+        for tup in clef_result.itertuples():
+            out.append(gds.util.asNode(tup.nodeId)._properties | {'score': tup.spread})
+    finally:
+        G.drop()
     
-    out = pd.DataFrame(out)[_props].sort_values('score', ascending=False).reset_index(drop=True)
-    return out
+    out = pd.DataFrame(out)[CELF_COLUMNS].sort_values('score', ascending=False).reset_index(drop=True)
+    return out, traversal.info()
+# --------------------------------------------------------------------------------------------------
+
+# --------------------------------------------------------------------------------------------------
+@st.cache_data
+def get_location_names(target_circle, target_center=None, target_box=None):
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        boxes = snapshot.boxes.iloc[snapshot.location_boxes(target_circle, target_center, target_box)]
+        if boxes.empty:
+            return None
+        level = 'box' if target_box else 'center' if target_center else 'circle'
+        first = boxes.iloc[0]
+        return {
+            'level': level,
+            'circle': first['circle'],
+            'center': first['center'] if level != 'circle' else '',
+            'box': first['box'] if level == 'box' else '',
+        }
+
+    if target_box:
+        q = """
+            MATCH (b:Box) WHERE elementId(b) = $location_id
+            RETURN 'box' as level, b.circle as circle, b.center as center, b.name as box
+        """
+        location_id = target_box
+    elif target_center:
+        q = """
+            MATCH (c:Center) WHERE elementId(c) = $location_id
+            RETURN 'center' as level, c.circle as circle, c.name as center, '' as box
+        """
+        location_id = target_center
+    else:
+        q = """
+            MATCH (c:Circle) WHERE elementId(c) = $location_id
+            RETURN 'circle' as level, c.name as circle, '' as center, '' as box
+        """
+        location_id = target_circle
+
+    res = run_query(q, location_id=location_id)
+    return res[0] if res else None
+
+def load_location_index(path):
+    if not os.path.exists(path):
+        return None, {}
+
+    # kept as the memory-mapped table so every worker shares the same pages; rows are sorted by
+    # location, so a request only copies its own slice out (index_rows)
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    keys = table.select(['level', 'circle', 'center', 'box']).to_pandas()
+    slices = {
+        key: (rows.min(), rows.max() + 1)
+        for key, rows in keys.groupby(['level', 'circle', 'center', 'box'], sort=False).indices.items()
+    }
+
+    return table, slices
+
+def index_rows(table, slices, key):
+    start, stop = slices.get(key, (0, 0))
+    return table.slice(start, stop - start).to_pandas()
+
+def get_location_index(load, filename):
+    # rollups live in the build's snapshot directory, cached per build; the build script writes
+    # them before publishing, a build made with the bare phases may still lack one
+    snapshot = get_snapshot()
+    if snapshot is None or not os.path.exists(os.path.join(snapshot.path, filename)):
+        return None, {}
+    return load(snapshot.build_id)
+
+@st.cache_resource
+def load_family_index(build_id):
+    return load_location_index(os.path.join(load_snapshot(build_id).path, FAMILY_INDEX_FILE))
+
+def get_location_rows(table, slices, filters):
+    location = get_location_names(filters.get('circle'), filters.get('center'), filters.get('box'))
+    if table is None or location is None:
+        return None
+
+    return index_rows(table, slices, (location['level'], location['circle'], location['center'], location['box']))
+
+def get_reach_column(table, degree):
+    return f"reach_{min(int(degree), max(int(c.split('_')[1]) for c in table.column_names if c.startswith('reach_')))}"
+
+def get_family_index(filters, by='family_id', limit=50):
+    table, slices = get_location_index(load_family_index, FAMILY_INDEX_FILE)
+    data = get_location_rows(table, slices, filters)
+    if data is None or data.empty:
+        return pd.DataFrame()
+
+    reach_column = get_reach_column(table, filters.get('degree', '1'))
+    # family indexes written before election history was packed have no turnout columns
+    has_turnout = 'turnout' in table.column_names and get_turnout() is not None
+
+    if by == 'family_name':
+        # components are disjoint, so their voters and reach simply add up per family name
+        data = (
+            data.groupby('family_name', as_index=False)
+            .agg(
+                family_ids=('family_id', list),
+                num_families=('family_id', 'count'),
+                num_voters=('num_voters', 'sum'),
+                location_voters=('location_voters', 'first'),
+                reach=(reach_column, 'sum'),
+                num_covered=('num_covered', 'sum'),
+                **({'num_votes': ('num_votes', 'sum'), 'num_records': ('num_records', 'sum')} if has_turnout else {}),
+            )
+            .assign(
+                voter_share=lambda x: x['num_voters'] / x['location_voters'],
+                coverage=lambda x: x['num_covered'] / x['num_voters'],
+            )
+            .sort_values('num_voters', ascending=False)
+        )
+        if has_turnout:
+            # pooled records of the families sharing the name, smoothed like a single family
+            data['turnout'] = smoothed_rate(data['num_votes'], data['num_records'], get_turnout()[0])
+        columns = ['family_name', 'num_families', 'num_voters', 'voter_share', 'reach', 'num_covered', 'coverage', 'family_ids']
+    else:
+        data = data.assign(reach=data[reach_column], family_ids=data['family_id'].map(lambda x: [x]))
+        columns = ['family_id', 'family_name', 'family_size', 'num_voters', 'voter_share', 'reach', 'num_covered', 'coverage', 'num_principal_coordinators', 'family_ids']
+
+    if has_turnout:
+        columns.insert(columns.index('num_covered'), 'turnout')
+    return data[columns].head(limit).reset_index(drop=True)
+
+# coordinator coverage (rebuilt with every snapshot, so cached per build)
+@st.cache_resource
+def load_coordinator_index(build_id):
+    return load_location_index(os.path.join(load_snapshot(build_id).path, COORDINATOR_INDEX_FILE))
+
+@st.cache_resource
+def load_uncovered_index(build_id):
+    return load_location_index(os.path.join(load_snapshot(build_id).path, UNCOVERED_INDEX_FILE))
+
+def get_coordinator_coverage(filters, role='principal', limit=50):
+    table, slices = get_location_index(load_coordinator_index, COORDINATOR_INDEX_FILE)
+    data = get_location_rows(table, slices, filters)
+    if data is None:
+        return {}, pd.DataFrame()
+
+    columns = ['coordinator', 'num_voters', 'voter_share', 'num_families', 'reach', 'total_voters', 'total_reach']
+    if data.empty:
+        # rows only exist per (location, coordinator): a location nobody coordinates is uncovered
+        snapshot = get_snapshot()
+        members = snapshot.location_members(filters.get('circle'), filters.get('center'), filters.get('box'))
+        summary = {
+            'location_voters': int((~np.asarray(snapshot.arrays['is_missing'])[members]).sum()),
+            **{f'{r}_covered': 0 for r in ['principal', 'sub']},
+            **{f'num_{r}s': 0 for r in ['principal', 'sub']},
+        }
+        return summary, pd.DataFrame(columns=columns)
+
+    reach_column = get_reach_column(table, filters.get('degree', '1'))
+    location_voters = int(data['location_voters'].iloc[0])
+    summary = {
+        'location_voters': location_voters,
+        **{
+            f'{r}_covered': int(data.loc[data['role'] == r, 'num_voters'].sum())
+            for r in ['principal', 'sub']
+        },
+        **{f'num_{r}s': int((data['role'] == r).sum()) for r in ['principal', 'sub']},
+    }
+
+    # each coordinator's slice of this location next to their whole network
+    totals = index_rows(table, slices, ('all', '', '', ''))
+    totals = totals[totals['role'] == role].set_index('coordinator')
+    data = data[data['role'] == role]
+    data = data.assign(
+        reach=data[reach_column],
+        total_voters=data['coordinator'].map(totals['num_voters']),
+        total_reach=data['coordinator'].map(totals[reach_column]),
+    )
+
+    return summary, data[columns].head(limit).reset_index(drop=True)
+
+def get_uncovered_influencers(filters, limit=50):
+    table, slices = get_location_index(load_uncovered_index, UNCOVERED_INDEX_FILE)
+    data = get_location_rows(table, slices, filters)
+    if data is None:
+        return pd.DataFrame()
+
+    columns = ['rank', 'full_name', 'family_name', 'national_no', 'phone_number', 'family_size'] + [c for c in table.column_names if c.startswith('reach_')]
+    return data[columns].head(limit).reset_index(drop=True)
+
+def get_family_members(filters, family_ids):
+    location = get_location_names(filters.get('circle'), filters.get('center'), filters.get('box'))
+    if location is None:
+        return pd.DataFrame()
+
+    q = """
+        UNWIND $family_ids AS family_id
+        MATCH (person:Person {family_id: family_id})
+        WHERE person.circle = $circle
+            AND ($center = '' OR person.center = $center)
+            AND ($box = '' OR person.box = $box)
+        RETURN
+            person.first_name + ' ' + person.father_name + ' ' + person.grand_name + ' ' + person.family_name as full_name,
+            person.center as center,
+            person.box as box,
+            person.national_no as national_no,
+            person.phone_number as phone_number,
+            person.principal_coordinator as principal_coordinator,
+            person.sub_coordinator as sub_coordinator,
+            person.primary_key as primary_key
+        ORDER BY full_name
+    """
+
+    return pd.DataFrame(run_query(q, family_ids=list(family_ids), circle=location['circle'], center=location['center'], box=location['box']))
 # --------------------------------------------------------------------------------------------------
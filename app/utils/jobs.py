@@ -0,0 +1,248 @@
+import json
+import os
+import pickle
+import queue
+import threading
+import time
+import traceback
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+from uuid import uuid4
+
+import streamlit as st
+
+JOBS_DIR = os.path.join(os.path.dirname(__file__), 'db', 'jobs')
+JOBS_WORKERS = int(os.getenv('JOBS__WORKERS', 2))
+JOBS_TIMEOUT = float(os.getenv('JOBS__TIMEOUT', 900))
+JOBS_KEEP = int(os.getenv('JOBS__KEEP', 200))
+JOBS_POLL_INTERVAL = float(os.getenv('JOBS__POLL_INTERVAL', 1.0))
+
+ACTIVE = ('queued', 'running')
+
+
+def job_key(name, params):
+    # same page + same filters = same job, whatever order the filters were built in
+    return f"{name}:{json.dumps(params, sort_keys=True, default=str, ensure_ascii=False)}"
+
+
+@dataclass
+class Job:
+    job_id: str
+    name: str
+    key: str
+    params: dict
+    timeout: float = JOBS_TIMEOUT
+    status: str = 'queued'                 # queued | running | done | failed | cancelled
+    progress: float = 0.0
+    message: str = ''
+    error: str = ''
+    over_budget: bool = False              # finished, but only after its timeout ran out
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def __post_init__(self):
+        self.cancel_requested = threading.Event()
+
+    # handed to the job function: progress reporting and cooperative stop checks
+    # ----------------------------------------------------------------------------------------------
+    def report(self, progress, message=''):
+        self.progress = min(max(float(progress), 0.0), 1.0)
+        self.message = message
+
+    def stage(self, message, start=0.0, stop=1.0):
+        # a traversal progress callback (level, max_degree) mapped onto [start, stop]
+        def callback(level, max_degree):
+            self.report(start + (stop - start) * level / max(max_degree, 1), f"{message} ({level}/{max_degree})")
+        return callback
+
+    def cancelled(self):
+        return self.cancel_requested.is_set()
+
+    def remaining(self):
+        started = self.started_at or time.time()
+        return max(self.timeout - (time.time() - started), 0.0)
+    # ----------------------------------------------------------------------------------------------
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class JobManager:
+    def __init__(self, jobs_dir=JOBS_DIR, workers=JOBS_WORKERS, keep=JOBS_KEEP):
+        self.jobs_dir = jobs_dir
+        self.keep = keep
+        self.jobs = {}
+        self.functions = {}
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+
+        os.makedirs(jobs_dir, exist_ok=True)
+        self._load()
+
+        self.workers = [threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True) for i in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+    # persistence
+    # ----------------------------------------------------------------------------------------------
+    def _path(self, job_id, ext):
+        return os.path.join(self.jobs_dir, f'{job_id}.{ext}')
+
+    def _save(self, job):
+        tmp_path = self._path(job.job_id, 'json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(job.to_dict(), f, default=str, ensure_ascii=False)
+        os.replace(tmp_path, self._path(job.job_id, 'json'))
+
+    def _load(self):
+        for name in os.listdir(self.jobs_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.jobs_dir, name)) as f:
+                    job = Job(**json.load(f))
+            except Exception:
+                continue
+
+            # whatever was in flight when the previous process died will never finish
+            if job.status in ACTIVE:
+                job.status, job.error, job.finished_at = 'failed', 'interrupted by a restart', time.time()
+                self._save(job)
+            self.jobs[job.job_id] = job
+
+    def _prune(self):
+        finished = sorted((j for j in self.jobs.values() if j.status not in ACTIVE), key=lambda j: j.submitted_at)
+        for job in finished[:max(len(finished) - self.keep, 0)]:
+            del self.jobs[job.job_id]
+            for ext in ('json', 'pkl'):
+                if os.path.exists(self._path(job.job_id, ext)):
+                    os.remove(self._path(job.job_id, ext))
+    # ----------------------------------------------------------------------------------------------
+
+    def submit(self, name, fn, params, timeout=JOBS_TIMEOUT):
+        # fn(params, job=job) -> picklable result
+        key = job_key(name, params)
+        with self.lock:
+            # a second click (or a second user) on the same search joins the run already going
+            for job in self.jobs.values():
+                if job.key == key and job.status in ACTIVE:
+                    return job.job_id
+
+            job = Job(job_id=uuid4().hex, name=name, key=key, params=params, timeout=timeout)
+            self.jobs[job.job_id] = job
+            self.functions[job.job_id] = fn
+            self._save(job)
+            self._prune()
+
+        self.queue.put(job.job_id)
+        return job.job_id
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def list(self, name=None):
+        jobs = [j for j in self.jobs.values() if name is None or j.name == name]
+        return sorted(jobs, key=lambda j: j.submitted_at, reverse=True)
+
+    def position(self, job_id):
+        queued = sorted((j for j in self.jobs.values() if j.status == 'queued'), key=lambda j: j.submitted_at)
+        return next((i for i, j in enumerate(queued) if j.job_id == job_id), None)
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None or job.status not in ACTIVE:
+            return False
+        job.cancel_requested.set()
+        if job.status == 'queued':
+            job.status, job.finished_at = 'cancelled', time.time()
+            self._save(job)
+        return True
+
+    def result(self, job_id):
+        path = self._path(job_id, 'pkl')
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def _work(self):
+        while True:
+            job_id = self.queue.get()
+            job, fn = self.jobs.get(job_id), self.functions.pop(job_id, None)
+            if job is None or fn is None or job.status != 'queued':
+                continue
+
+            job.status, job.started_at = 'running', time.time()
+            self._save(job)
+
+            try:
+                result = fn(job.params, job=job)
+                if job.cancelled():
+                    job.status = 'cancelled'
+                else:
+                    # the budget is cooperative: whatever ran out of it is already flagged truncated
+                    # in the result, so a run that returned late is kept, just marked
+                    tmp_path = self._path(job.job_id, 'pkl.tmp')
+                    with open(tmp_path, 'wb') as f:
+                        pickle.dump(result, f)
+                    os.replace(tmp_path, self._path(job.job_id, 'pkl'))
+                    job.status, job.progress, job.over_budget = 'done', 1.0, job.remaining() <= 0
+            except Exception as e:
+                traceback.print_exc()
+                job.status, job.error = 'failed', f'{type(e).__name__}: {e}'
+
+            job.finished_at = time.time()
+            self._save(job)
+
+
+@st.cache_resource
+def get_job_manager():
+    # one queue and worker pool per server process, shared by every session
+    return JobManager()
+
+
+def job_label(job):
+    return f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(job.submitted_at))} | {job.status} | {job.job_id[:8]}"
+
+
+@st.fragment(run_every=JOBS_POLL_INTERVAL)
+def job_status(job_id):
+    # only this block re-runs while the job is queued or running; once it is over the whole page
+    # re-runs a last time to show the result
+    manager = get_job_manager()
+    job = manager.get(job_id)
+    if job is None or job.status not in ACTIVE:
+        st.rerun()
+
+    if job.status == 'queued':
+        st.info(f"Queued, {manager.position(job_id) or 0} searches ahead of this one.")
+    else:
+        st.progress(job.progress, text=f"{job.message or 'Running'} ... {job.elapsed:.0f}s")
+    if st.button('Cancel', key=f'cancel_{job_id}'):
+        manager.cancel(job_id)
+
+
+def watch_job(job_id):
+    manager = get_job_manager()
+    job = manager.get(job_id)
+    if job is None:
+        st.warning('This search is no longer available, run it again.')
+        return None
+
+    if job.status in ACTIVE:
+        job_status(job_id)
+    elif job.status == 'done' and job.over_budget:
+        st.warning(f"Search ran past its {job.timeout:g}s budget ({job.elapsed:.0f}s), parts of it may have been cut short.")
+    elif job.status == 'failed':
+        st.error(f"Search failed: {job.error}")
+    elif job.status == 'cancelled':
+        st.warning('Search cancelled.')
+
+    return job
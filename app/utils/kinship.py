@@ -0,0 +1,108 @@
+import numpy as np
+
+
+def connected_components(n, src, dst):
+    # array union-find: hook the larger root under the smaller one, then compress paths until
+    # every node points at its root; the label of a component is its smallest node index
+    parent = np.arange(n, dtype=np.int64)
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+
+    while True:
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+
+        root_src, root_dst = parent[src], parent[dst]
+        mask = root_src != root_dst
+        if not mask.any():
+            return parent
+
+        # edges already inside a single set never matter again
+        src, dst = src[mask], dst[mask]
+        root_src, root_dst = root_src[mask], root_dst[mask]
+        np.minimum.at(parent, np.maximum(root_src, root_dst), np.minimum(root_src, root_dst))
+
+
+def to_index(node_ids, values):
+    # node_ids must be sorted; maps neo4j ids onto dense 0..n-1 positions (-1 when absent)
+    values = np.asarray(values, dtype=np.int64)
+    if len(node_ids) == 0:
+        return np.full(len(values), -1, dtype=np.int64)
+    pos = np.searchsorted(node_ids, values)
+    pos = np.minimum(pos, len(node_ids) - 1)
+    return np.where(node_ids[pos] == values, pos, -1)
+
+
+def build_csr(n, src, dst, symmetric=False):
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    if symmetric:
+        src, dst = np.concatenate([src, dst]), np.concatenate([dst, src])
+
+    order = np.argsort(src, kind='stable')
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=offsets[1:])
+
+    return offsets, dst[order]
+
+
+def gather_edges(offsets, nodes):
+    # positions of all edges out of `nodes` in the CSR target array, with the position in `nodes` of each owner
+    nodes = np.asarray(nodes, dtype=np.int64)
+    starts = offsets[nodes]
+    degrees = offsets[nodes + 1] - starts
+    owner = np.repeat(np.arange(len(nodes)), degrees)
+    pos = np.arange(int(degrees.sum())) - np.repeat(np.cumsum(degrees) - degrees - starts, degrees)
+
+    return owner, pos
+
+
+def gather_neighbors(offsets, targets, nodes):
+    # all neighbours of `nodes` in one shot: owner[i] is the position in `nodes` that neighbour i came from
+    owner, pos = gather_edges(offsets, nodes)
+    return owner, targets[pos]
+
+
+def sorted_unique(values):
+    # sort-based unique; cheaper than np.unique for the large int64 key arrays used here
+    values = np.sort(values)
+    if len(values) == 0:
+        return values
+    keep = np.empty(len(values), dtype=bool)
+    keep[0] = True
+    np.not_equal(values[1:], values[:-1], out=keep[1:])
+    return values[keep]
+
+
+def sorted_contains(sorted_values, values):
+    pos = np.minimum(np.searchsorted(sorted_values, values), max(len(sorted_values) - 1, 0))
+    return (sorted_values[pos] == values) if len(sorted_values) else np.zeros(len(values), dtype=bool)
+
+
+def grouped_reach(offsets, targets, groups, nodes, max_degree, counted=None):
+    # one BFS per group of seed nodes, all groups expanded together as (group, node) keys;
+    # reach[g, k] is the number of distinct non-seed nodes within k + 1 hops of group g
+    # (only those flagged in `counted`, when given)
+    n = len(offsets) - 1
+    groups = np.asarray(groups, dtype=np.int64)
+    n_groups = int(groups.max()) + 1 if len(groups) else 0
+    reach = np.zeros((n_groups, max_degree), dtype=np.int64)
+
+    visited = sorted_unique(groups * n + np.asarray(nodes, dtype=np.int64))
+    frontier_group, frontier_node = visited // n, visited % n
+
+    for k in range(max_degree):
+        if len(frontier_node):
+            owner, neighbors = gather_neighbors(offsets, targets, frontier_node)
+            keys = sorted_unique(frontier_group[owner] * n + neighbors)
+            new = keys[~sorted_contains(visited, keys)]
+            visited = np.sort(np.concatenate([visited, new]))
+            frontier_group, frontier_node = new // n, new % n
+
+        found = frontier_group if counted is None else frontier_group[counted[frontier_node]]
+        reach[:, k] = (reach[:, k - 1] if k else 0) + np.bincount(found, minlength=n_groups)
+
+    return reach
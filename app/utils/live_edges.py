@@ -0,0 +1,174 @@
+import json
+import os
+import shutil
+import time
+from uuid import uuid4
+
+import numpy as np
+
+from utils.kinship import gather_edges, sorted_unique
+from utils.sketches import hash64
+
+# banks kept on disk, least recently used dropped first; a projection whose bank alone would not
+# fit is simulated from the hashed coins directly instead
+LIVE_EDGES_MAX_BYTES = int(os.getenv('LIVE_EDGES__MAX_BYTES', 2_000_000_000))
+LIVE_EDGES_BATCH_EDGES = int(os.getenv('LIVE_EDGES__BATCH_EDGES', 8_000_000))       # (sample, edge) coins per batch
+
+
+def coin_salts(samples):
+    return hash64(np.arange(samples))
+
+
+def coin_threshold(probability):
+    return np.uint64(min(int(probability * 2 ** 64), 2 ** 64 - 1))
+
+
+def coins(edge_hash, salts, threshold):
+    # is the edge live in the sample: the same coin for the same (edge, sample) in every projection
+    return hash64(edge_hash ^ salts) < threshold
+
+
+def bits(packed, rows, cols):
+    return ((packed[rows, cols >> 3] >> (cols & 7)) & 1).astype(bool)
+
+
+class LiveEdgeBank:
+    # pre-sampled live-edge graphs of one projection: masks[s] is sample s as a bitmask over the CSR
+    # edge array; spreads[v] is v's own spread, the mean size of what v reaches over the samples.
+    # Per sample it also keeps one reachability component, around a hub: reach[s] = what the hub
+    # reaches, upstream[s] = what reaches the hub. Anything upstream reaches all of reach[s], so a
+    # cascade from there takes it whole and only walks what lies outside it.
+    def __init__(self, path, masks, spreads, hub=None, reach=None, upstream=None):
+        self.path = path
+        self.masks = masks
+        self.spreads = spreads
+        self.hub = hub
+        self.reach = reach
+        self.upstream = upstream
+        self.reach_sizes = None if reach is None else popcount_rows(reach)
+
+    def live(self, samples, pos):
+        return bits(self.masks, samples, pos)
+
+    def in_reach(self, samples, nodes):
+        return bits(self.reach, samples, nodes)
+
+    def in_upstream(self, samples, nodes):
+        return bits(self.upstream, samples, nodes)
+
+    def upstream_counts(self, n):
+        # per node, the samples in which it reaches the hub
+        counts = np.zeros(n, dtype=np.int64)
+        batch = max(LIVE_EDGES_BATCH_EDGES // max(n, 1), 1)
+        for start in range(0, len(self.upstream), batch):
+            rows = np.unpackbits(self.upstream[start:start + batch], axis=1, count=n, bitorder='little')
+            counts += rows.sum(axis=0, dtype=np.int64)
+        return counts
+
+
+def popcount_rows(packed):
+    return np.unpackbits(packed, axis=1).sum(axis=1, dtype=np.int64)
+
+
+def bank_key(edge_hash, n, probability, samples):
+    # the projection by its edge set (ids, not positions), so any run producing it finds the bank
+    signature = np.bitwise_xor.reduce(hash64(edge_hash)) if len(edge_hash) else 0
+    return f'{int(signature):016x}-{n}-{len(edge_hash)}-p{probability:g}-s{samples}'
+
+
+def bank_bytes(n_edges, n, samples):
+    return samples * ((n_edges + 7) // 8) + 2 * samples * ((n + 7) // 8) + 8 * n
+
+
+def sample_masks(edge_hash, probability, samples):
+    salts, threshold = coin_salts(samples), coin_threshold(probability)
+    masks = np.zeros((samples, (len(edge_hash) + 7) // 8), dtype=np.uint8)
+    batch = max(LIVE_EDGES_BATCH_EDGES // max(len(edge_hash), 1), 1)
+    for start in range(0, samples, batch):
+        stop = min(start + batch, samples)
+        live = coins(edge_hash[None, :], salts[start:stop, None], threshold)
+        masks[start:stop] = np.packbits(live, axis=1, bitorder='little')
+    return masks
+
+
+def sample_reach(offsets, targets, masks, node, positions=None):
+    # what `node` reaches over the live edges of every sample, packed one bit per node; on the
+    # reversed CSR, with positions mapping its edges back onto the mask bits, what reaches `node`
+    samples, n = len(masks), len(offsets) - 1
+    out = np.zeros((samples, (n + 7) // 8), dtype=np.uint8)
+    batch = max(LIVE_EDGES_BATCH_EDGES // max(n, 1), 1)
+    for start in range(0, samples, batch):
+        stop = min(start + batch, samples)
+        reached = np.zeros((stop - start, n), dtype=bool)
+        reached[:, node] = True
+        sample, frontier = np.arange(stop - start), np.full(stop - start, node, dtype=np.int64)
+        while len(frontier):
+            owner, pos = gather_edges(offsets, frontier)
+            live = bits(masks, start + sample[owner], pos if positions is None else positions[pos])
+            found_sample, found = sample[owner[live]], targets[pos[live]]
+            new = ~reached[found_sample, found]
+            keys = sorted_unique(found_sample[new] * n + found[new])
+            sample, frontier = keys // n, keys % n
+            reached[sample, frontier] = True
+        out[start:stop] = np.packbits(reached, axis=1, bitorder='little')
+    return out
+
+
+def load_bank(bank_dir, key):
+    path = os.path.join(bank_dir, key)
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        bank = LiveEdgeBank(
+            path,
+            np.load(os.path.join(path, 'masks.npy'), mmap_mode='r'),
+            np.load(os.path.join(path, 'spreads.npy'), mmap_mode='r'),
+            meta['hub'],
+            np.load(os.path.join(path, 'reach.npy'), mmap_mode='r'),
+            np.load(os.path.join(path, 'upstream.npy'), mmap_mode='r'),
+        )
+    except (FileNotFoundError, KeyError):
+        return None
+
+    # mapped, so every run on the projection shares the same pages; touched for the LRU
+    os.utime(path)
+    return bank
+
+
+def save_bank(bank_dir, key, bank, spreads, max_bytes=LIVE_EDGES_MAX_BYTES, **meta):
+    # written aside and renamed in, so readers never see half a bank; a concurrent writer of the
+    # same bank simply wins
+    os.makedirs(bank_dir, exist_ok=True)
+    tmp_path = os.path.join(bank_dir, f'.{key}.{uuid4().hex}')
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, 'masks.npy'), bank.masks)
+    np.save(os.path.join(tmp_path, 'spreads.npy'), spreads)
+    np.save(os.path.join(tmp_path, 'reach.npy'), bank.reach)
+    np.save(os.path.join(tmp_path, 'upstream.npy'), bank.upstream)
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump(meta | {'hub': bank.hub, 'created_at': time.time()}, f)
+    try:
+        os.rename(tmp_path, os.path.join(bank_dir, key))
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    evict(bank_dir, max_bytes, keep=(key,))
+    return load_bank(bank_dir, key)
+
+
+def evict(bank_dir, max_bytes=LIVE_EDGES_MAX_BYTES, keep=()):
+    banks = []
+    for name in os.listdir(bank_dir):
+        path = os.path.join(bank_dir, name)
+        if os.path.isdir(path) and not name.startswith('.'):
+            size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+            banks.append((os.path.getmtime(path), size, name))
+
+    total = sum(size for _, size, _ in banks)
+    for _, size, name in sorted(banks):
+        if total <= max_bytes:
+            break
+        if name in keep:
+            continue
+        shutil.rmtree(os.path.join(bank_dir, name), ignore_errors=True)
+        total -= size
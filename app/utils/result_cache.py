@@ -0,0 +1,102 @@
+import os
+import pickle
+import sqlite3
+import time
+
+# results survive restarts and are shared by every app process and the post-build warmer; entries
+# belong to one snapshot build, so a rebuild can never serve stale answers
+CACHE_FILE = 'result_cache.sqlite'
+
+# the warmer turns this off so its own calls don't count as user demand
+recording = True
+# off: every lookup misses and nothing is stored (the benchmark times the traversal itself)
+enabled = True
+
+
+def connect(db_dir):
+    con = sqlite3.connect(os.path.join(db_dir, CACHE_FILE), timeout=30)
+    con.execute('PRAGMA journal_mode=WAL')
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS results (
+            build_id TEXT, name TEXT, key TEXT, value BLOB, seconds REAL, created_at REAL,
+            PRIMARY KEY (build_id, name, key)
+        )
+    """)
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS access (
+            name TEXT, location TEXT, hits INTEGER, last_access REAL,
+            PRIMARY KEY (name, location)
+        )
+    """)
+    return con
+
+
+def get(db_dir, build_id, name, key):
+    if not enabled:
+        return False, None
+    con = connect(db_dir)
+    try:
+        row = con.execute(
+            "SELECT value FROM results WHERE build_id = ? AND name = ? AND key = ?", (build_id, name, key)
+        ).fetchone()
+    finally:
+        con.close()
+    return (True, pickle.loads(row[0])) if row else (False, None)
+
+
+def put(db_dir, build_id, name, key, value, seconds):
+    if not enabled:
+        return
+    con = connect(db_dir)
+    try:
+        with con:
+            con.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                (build_id, name, key, pickle.dumps(value), seconds, time.time()),
+            )
+    finally:
+        con.close()
+
+
+def location_key(names):
+    # access counts go by location names (as in get_location_names), which a rebuild keeps; the
+    # neo4j element ids in the filters change every time the nodes are recreated
+    if names is None:
+        return None
+    return '|'.join(names[k] for k in ['circle', 'center', 'box'])
+
+
+def record_access(db_dir, name, location):
+    if not recording or not location:
+        return
+    con = connect(db_dir)
+    try:
+        with con:
+            con.execute(
+                """
+                    INSERT INTO access VALUES (?, ?, 1, ?)
+                    ON CONFLICT (name, location) DO UPDATE SET hits = hits + 1, last_access = excluded.last_access
+                """,
+                (name, location, time.time()),
+            )
+    finally:
+        con.close()
+
+
+def access_counts(db_dir, name):
+    con = connect(db_dir)
+    try:
+        return dict(con.execute("SELECT location, hits FROM access WHERE name = ?", (name,)).fetchall())
+    finally:
+        con.close()
+
+
+def prune(db_dir, build_id):
+    # results of any other build can never be served again
+    con = connect(db_dir)
+    try:
+        with con:
+            deleted = con.execute("DELETE FROM results WHERE build_id != ?", (build_id,)).rowcount
+    finally:
+        con.close()
+    return deleted
@@ -0,0 +1,154 @@
+import os
+import re
+import shutil
+from uuid import uuid4
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc
+
+SEARCH_DIR = 'search'
+GRAM_SIZE = 3
+MAX_TOKEN_LENGTH = 24
+MAX_GRAM_POSTINGS = 250_000       # grams this common say almost nothing about who is meant
+CANDIDATE_POOL = 500
+
+# the build script applies the same rules as polars expressions, keep the two in step
+DIACRITICS_PATTERN = '[\u0610-\u061a\u064b-\u065f\u0670\u0640]'
+CHAR_MAP = {
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي',
+    'ؤ': 'و',
+    'ة': 'ه',
+}
+NON_NAME_PATTERN = '[^0-9a-z\u0621-\u064a]+'
+JOINS = {'عبد ال': 'عبدال', 'ابو ': 'ابو', 'ابن ': 'ابن'}
+
+
+# normalization
+# --------------------------------------------------------------------------------------------------
+def normalize_name(text):
+    text = re.sub(DIACRITICS_PATTERN, '', str(text or '').lower())
+    for a, b in CHAR_MAP.items():
+        text = text.replace(a, b)
+    text = re.sub(NON_NAME_PATTERN, ' ', text)
+    for a, b in JOINS.items():
+        text = text.replace(a, b)
+    return re.sub(' +', ' ', text).strip()
+
+
+def name_grams(text):
+    # padded character trigrams of every token: 'محمد' -> ' مح', 'محم', 'حمد', 'مد '
+    grams = set()
+    for token in normalize_name(text).split(' '):
+        if not token:
+            continue
+        padded = f' {token[:MAX_TOKEN_LENGTH]} '
+        grams.update(padded[i:i + GRAM_SIZE] for i in range(len(padded) - GRAM_SIZE + 1))
+    return grams
+# --------------------------------------------------------------------------------------------------
+
+
+# writer
+# --------------------------------------------------------------------------------------------------
+def write_search_index(snapshot_path, national_nos, national_no_idx, grams, gram_offsets, gram_postings, gram_counts):
+    """
+    national_nos / national_no_idx: numbers sorted as bytes and the snapshot node index of each.
+    grams: sorted gram strings; gram_offsets / gram_postings: CSR of node indices per gram.
+    gram_counts: distinct grams per snapshot node, used to prefer tighter matches.
+    """
+    tmp_path = os.path.join(snapshot_path, f'{SEARCH_DIR}.tmp-{uuid4().hex[:8]}')
+    os.makedirs(tmp_path)
+
+    np.save(os.path.join(tmp_path, 'national_nos.npy'), np.asarray(national_nos, dtype=np.bytes_))
+    np.save(os.path.join(tmp_path, 'national_no_idx.npy'), np.asarray(national_no_idx, dtype=np.int32))
+    np.save(os.path.join(tmp_path, 'gram_offsets.npy'), np.asarray(gram_offsets, dtype=np.int64))
+    np.save(os.path.join(tmp_path, 'gram_postings.npy'), np.asarray(gram_postings, dtype=np.int32))
+    np.save(os.path.join(tmp_path, 'gram_counts.npy'), np.asarray(gram_counts, dtype=np.uint16))
+
+    table = pa.table({'gram': pa.array(grams, pa.string())})
+    with pa.OSFile(os.path.join(tmp_path, 'grams.arrow'), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    path = os.path.join(snapshot_path, SEARCH_DIR)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return path
+# --------------------------------------------------------------------------------------------------
+
+
+# reader
+# --------------------------------------------------------------------------------------------------
+class SearchIndex:
+    def __init__(self, path):
+        self.path = path
+        self.national_nos = self._load('national_nos')
+        self.national_no_idx = self._load('national_no_idx')
+        self.gram_offsets = self._load('gram_offsets')
+        self.gram_postings = self._load('gram_postings')
+        self.gram_counts = self._load('gram_counts')
+
+        grams = pa.ipc.open_file(pa.memory_map(os.path.join(path, 'grams.arrow'))).read_all().column('gram').to_pylist()
+        self.grams = {gram: i for i, gram in enumerate(grams)}
+        self.num_people = len(self.national_nos)
+
+    def _load(self, name):
+        return np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode='r')
+
+    def search_national_no(self, prefix, limit=20):
+        prefix = prefix.strip().encode('utf-8')
+        lo = np.searchsorted(self.national_nos, prefix, side='left')
+        hi = np.searchsorted(self.national_nos, prefix + b'\xff', side='left')
+        idx = np.asarray(self.national_no_idx[lo:min(hi, lo + limit)], dtype=np.int64)
+
+        # an exact number outranks the longer numbers it prefixes
+        exact = np.asarray(self.national_nos[lo:lo + len(idx)]) == prefix
+        return idx, np.where(exact, 1.0, 0.9)
+
+    def search_name(self, text, limit=20):
+        grams = name_grams(text)
+        gram_ids = sorted(self.grams[g] for g in grams if g in self.grams)
+        if not gram_ids:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        gram_ids = np.asarray(gram_ids, dtype=np.int64)
+        df = self.gram_offsets[gram_ids + 1] - self.gram_offsets[gram_ids]
+        idf = np.log((self.num_people + 1) / (df + 1)) + 1.0
+        # grams nobody has still count against every candidate, at the weight of the rarest gram
+        total = idf.sum() + (np.log(self.num_people + 1) + 1.0) * (len(grams) - len(gram_ids))
+
+        # skip the very common grams unless nothing else is left to go on
+        rare = df <= MAX_GRAM_POSTINGS
+        if rare.any():
+            gram_ids, df, idf = gram_ids[rare], df[rare], idf[rare]
+
+        starts = self.gram_offsets[gram_ids]
+        postings = np.concatenate([self.gram_postings[s:s + d] for s, d in zip(starts, df)]).astype(np.int64)
+        weights = np.repeat(idf, df)
+
+        order = np.argsort(postings, kind='stable')
+        postings, weights = postings[order], weights[order]
+        first = np.flatnonzero(np.r_[True, postings[1:] != postings[:-1]])
+        people = postings[first]
+        scores = np.add.reduceat(weights, first) / total if len(first) else np.empty(0)
+
+        # best coverage of the query first, then the shortest names among equals
+        pool = np.argsort(-scores, kind='stable')[:CANDIDATE_POOL]
+        people, scores = people[pool], scores[pool]
+        order = np.lexsort((np.asarray(self.gram_counts)[people], -np.round(scores, 6)))[:limit]
+        return people[order], scores[order]
+
+    def search(self, text, limit=20):
+        text = (text or '').strip()
+        if not text:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        if text.isdigit():
+            return self.search_national_no(text, limit)
+        return self.search_name(text, limit)
+
+
+def open_search_index(snapshot_path):
+    path = os.path.join(snapshot_path, SEARCH_DIR)
+    return SearchIndex(path) if os.path.isdir(path) else None
+# --------------------------------------------------------------------------------------------------
@@ -0,0 +1,186 @@
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import numpy as np
+import pyarrow as pa
+
+from utils.kinship import build_csr, sorted_contains, sorted_unique
+from utils.snapshot import GraphSnapshot, open_snapshot
+
+SHARD_RETRIES = int(os.getenv('SHARDING__RETRIES', 2))
+
+
+# task registry
+# --------------------------------------------------------------------------------------------------
+@dataclass
+class Task:
+    name: str
+    fn: Callable                           # fn(shard) -> picklable per-shard result
+    max_degree: int = 0                    # hops from a core node the task may walk
+    relationships: Optional[list] = None   # None = every type in the snapshot
+    merge: Optional[Callable] = None       # merge(results in shard order) -> final result
+
+
+TASKS = {}
+
+
+def register_task(name, max_degree=0, relationships=None, merge=None):
+    def decorator(fn):
+        TASKS[name] = Task(name, fn, max_degree, relationships, merge)
+        return fn
+    return decorator
+# --------------------------------------------------------------------------------------------------
+
+
+# shards
+# --------------------------------------------------------------------------------------------------
+@dataclass
+class ShardSpec:
+    key: str                               # circle name, fixes the merge order
+    circle_id: str
+    num_voters: int = 0
+
+
+@dataclass
+class Shard:
+    # one circle's voters (core) plus every node within `halo_degree` hops of them, with the
+    # kinship edges induced on that set: any walk of up to halo_degree hops from a core node
+    # stays inside the shard, so per-core results are exact
+    spec: ShardSpec
+    snapshot: GraphSnapshot
+    nodes: np.ndarray                      # global snapshot indices, sorted
+    is_core: np.ndarray
+    offsets: np.ndarray                    # local CSR over positions in `nodes`
+    targets: np.ndarray
+    halo_degree: int
+    stats: dict = field(default_factory=dict)
+
+    @property
+    def key(self):
+        return self.spec.key
+
+    @property
+    def core(self):
+        return np.flatnonzero(self.is_core)
+
+    def array(self, name):
+        return np.asarray(self.snapshot.arrays[name])[self.nodes]
+
+    def persons(self, columns):
+        return self.snapshot.persons.select(columns).take(pa.array(self.nodes, pa.int64()))
+
+
+def plan_shards(snapshot):
+    counts = np.diff(snapshot.box_offsets)
+    boxes = snapshot.boxes.assign(num_voters=counts)
+    circles = boxes.groupby(['circle', 'circle_id'], as_index=False)['num_voters'].sum().sort_values(['circle', 'circle_id'])
+    return [ShardSpec(r['circle'], r['circle_id'], int(r['num_voters'])) for r in circles.to_dict('records')]
+
+
+def build_shard(snapshot, spec, relationships, halo_degree):
+    core = np.sort(snapshot.location_members(circle_id=spec.circle_id))
+
+    nodes, frontier = core, core
+    for _ in range(halo_degree):
+        if not len(frontier):
+            break
+        _, neighbors = snapshot.neighbors(frontier, relationships, 'both')
+        neighbors = sorted_unique(neighbors)
+        frontier = neighbors[~sorted_contains(nodes, neighbors)]
+        nodes = np.sort(np.concatenate([nodes, frontier]))
+
+    owner, neighbors = snapshot.neighbors(nodes, relationships, 'both')
+    inside = sorted_contains(nodes, neighbors)
+    offsets, targets = build_csr(len(nodes), owner[inside], np.searchsorted(nodes, neighbors[inside]))
+
+    return Shard(
+        spec=spec,
+        snapshot=snapshot,
+        nodes=nodes,
+        is_core=sorted_contains(core, nodes),
+        offsets=offsets,
+        targets=targets,
+        halo_degree=halo_degree,
+        stats={'core': len(core), 'halo': len(nodes) - len(core), 'edges': len(targets)},
+    )
+# --------------------------------------------------------------------------------------------------
+
+
+# runner
+# --------------------------------------------------------------------------------------------------
+_snapshots = {}
+
+
+def run_shard(snapshot_path, spec, tasks, relationships, halo_degree):
+    # worker side: the snapshot is memory-mapped once per process and shared through the page cache
+    if snapshot_path not in _snapshots:
+        _snapshots[snapshot_path] = GraphSnapshot(snapshot_path)
+    started = time.perf_counter()
+    shard = build_shard(_snapshots[snapshot_path], spec, relationships, halo_degree)
+
+    out, timings = {}, {'build': time.perf_counter() - started}
+    for name, fn in tasks:
+        started = time.perf_counter()
+        out[name] = fn(shard)
+        timings[name] = time.perf_counter() - started
+
+    return out, shard.stats | {'seconds': timings}
+
+
+def run_tasks(db_dir, names=None, workers=None, retries=SHARD_RETRIES, build_id=None):
+    # the current build by default; the build script passes the one it has not published yet
+    snapshot = open_snapshot(db_dir, build_id)
+    if snapshot is None:
+        raise FileNotFoundError(f"No graph snapshot in {db_dir}")
+
+    tasks = [TASKS[name] for name in (names or sorted(TASKS))]
+    halo_degree = max(task.max_degree for task in tasks)
+    relationships = sorted({r for task in tasks for r in (task.relationships or snapshot.relationships)})
+
+    # biggest circles first so the slowest shards do not start last
+    specs = plan_shards(snapshot)
+    remaining = sorted(specs, key=lambda s: -s.num_voters)
+    results, attempts = {}, {}
+    workers = workers or os.cpu_count()
+    # spawned workers read this at import time: each gets its share of the cores instead of every
+    # worker's polars pool claiming all of them
+    os.environ.setdefault('POLARS_MAX_THREADS', str(max(1, os.cpu_count() // workers)))
+    print(f"Running {[t.name for t in tasks]} over {len(specs)} shards (halo {halo_degree}) with {workers} workers ...")
+
+    # a crashed worker breaks the whole pool, so every retry round gets a fresh one
+    while remaining:
+        failed = []
+        # spawned, not forked: forking after polars/arrow started their thread pools can deadlock
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            pending = {
+                pool.submit(run_shard, snapshot.path, spec, [(t.name, t.fn) for t in tasks], relationships, halo_degree): spec
+                for spec in remaining
+            }
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    spec = pending.pop(future)
+                    try:
+                        results[spec.circle_id], stats = future.result()
+                        print(f"> {spec.key}: {stats['core']} core + {stats['halo']} halo nodes, {sum(stats['seconds'].values()):.1f}s")
+                    except Exception:
+                        attempts[spec.circle_id] = attempts.get(spec.circle_id, 0) + 1
+                        traceback.print_exc()
+                        if attempts[spec.circle_id] > retries:
+                            raise RuntimeError(f"Shard {spec.key} failed {attempts[spec.circle_id]} times")
+                        print(f"> {spec.key}: failed, retrying ({attempts[spec.circle_id]}/{retries})")
+                        failed.append(spec)
+        remaining = failed
+
+    # shard order comes from the plan, never from completion order
+    merged = {}
+    for task in tasks:
+        values = [results[spec.circle_id][task.name] for spec in specs]
+        merged[task.name] = task.merge(values) if task.merge else values
+    return merged
+# --------------------------------------------------------------------------------------------------
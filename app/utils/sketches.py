@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+
+# HyperLogLog registers per node: 2 ** precision bytes each, relative standard error 1.04 / sqrt(m)
+HLL_PRECISION = int(os.getenv('HLL__PRECISION', 7))
+HLL_CHUNK_BYTES = int(os.getenv('HLL__CHUNK_BYTES', 256_000_000))     # estimate() scratch space
+
+
+def relative_error(precision=HLL_PRECISION):
+    return 1.04 / np.sqrt(2 ** precision)
+
+
+def hash64(values):
+    # splitmix64 finalizer, so sketches of a node are the same across runs and processes
+    x = np.asarray(values, dtype=np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def init_registers(n, members, precision=HLL_PRECISION):
+    # one sketch row per node; each member is added to its own row only
+    m = 2 ** precision
+    registers = np.zeros((n, m), dtype=np.uint8)
+
+    members = np.asarray(members, dtype=np.int64)
+    h = hash64(members)
+    bucket = (h & np.uint64(m - 1)).astype(np.int64)
+    w = h >> np.uint64(precision)
+    # rank = position of the lowest set bit; w & -w isolates it as an exact power of two
+    lowest = w & (~w + np.uint64(1))
+    rank = np.where(w == 0, 64 - precision + 1, np.log2(np.maximum(lowest, 1).astype(np.float64)) + 1)
+    np.maximum.at(registers, (members, bucket), rank.astype(np.uint8))
+
+    return registers
+
+
+def propagate(registers, offsets, targets):
+    # one ANF step: every node's sketch becomes the union (register max) of its own and its
+    # neighbours' sketches from the previous step, so after k steps it covers its k-hop ball
+    out = registers.copy()
+    degrees = np.diff(offsets)
+    by_degree = np.argsort(-degrees, kind='stable')
+    sorted_degrees = degrees[by_degree]
+
+    # neighbour slot j of every node that has one, as whole register rows at a time
+    for j in range(int(sorted_degrees[0]) if len(sorted_degrees) else 0):
+        nodes = by_degree[:np.searchsorted(-sorted_degrees, -j, side='left')]
+        out[nodes] = np.maximum(out[nodes], registers[targets[offsets[nodes] + j]])
+
+    return out
+
+
+def estimate(registers, chunk_bytes=HLL_CHUNK_BYTES):
+    n, m = registers.shape
+    alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+    powers = 2.0 ** -np.arange(256, dtype=np.float64)
+    rows_per_chunk = max(chunk_bytes // (8 * m), 1)
+
+    out = np.empty(n, dtype=np.float64)
+    for start in range(0, n, rows_per_chunk):
+        chunk = registers[start:start + rows_per_chunk]
+        raw = alpha * m * m / powers[chunk].sum(axis=1)
+        zeros = (chunk == 0).sum(axis=1)
+        # linear counting while the sketch is still mostly empty
+        small = (raw <= 2.5 * m) & (zeros > 0)
+        raw[small] = m * np.log(m / zeros[small])
+        out[start:start + len(chunk)] = raw
+
+    return out
@@ -0,0 +1,323 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from uuid import uuid4
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc
+
+from utils.kinship import build_csr, gather_neighbors, to_index
+
+FORMAT_VERSION = 2
+SNAPSHOT_DIR = 'snapshot'
+CURRENT_FILE = 'CURRENT'
+LEASES_DIR = 'leases'
+KEEP_SNAPSHOTS = 2
+# per-location rollups the build writes next to the snapshot arrays (scripts/build_graph.py)
+FAMILY_INDEX_FILE = 'family_index.arrow'
+COORDINATOR_INDEX_FILE = 'coordinator_index.arrow'
+UNCOVERED_INDEX_FILE = 'uncovered_index.arrow'
+
+_EMPTY = np.uint64(np.iinfo(np.uint64).max)
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+# national_no hash index
+# --------------------------------------------------------------------------------------------------
+def national_no_keys(national_nos):
+    # 10-digit numbers are their own key; anything else (shorter numbers too, or '0123' would meet
+    # '123') is hashed into the other half of the 64-bit space
+    keys = np.empty(len(national_nos), dtype=np.uint64)
+    for i, value in enumerate(national_nos):
+        value = '' if value is None else str(value)
+        if len(value) == 10 and value.isascii() and value.isdigit():
+            keys[i] = int(value)
+        else:
+            keys[i] = int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'little') | (1 << 63)
+    return keys
+
+
+def _slots(keys, bits):
+    with np.errstate(over='ignore'):
+        return ((keys * _GOLDEN) >> np.uint64(64 - bits)).astype(np.int64)
+
+
+def build_hash_index(keys):
+    # open addressing with linear probing, built a whole probe round at a time
+    keys = np.asarray(keys, dtype=np.uint64)
+    bits = max(4, int(np.ceil(np.log2(max(len(keys), 1) * 2))))
+    size = 1 << bits
+    table_keys = np.full(size, _EMPTY, dtype=np.uint64)
+    table_values = np.full(size, -1, dtype=np.int64)
+
+    pending = np.arange(len(keys))
+    pos = _slots(keys, bits)
+    while len(pending):
+        p = pos[pending]
+        free = table_keys[p] == _EMPTY
+        slots, first = np.unique(p[free], return_index=True)
+        winners = pending[free][first]
+        table_keys[slots] = keys[winners]
+        table_values[slots] = winners
+
+        won = np.zeros(len(keys), dtype=bool)
+        won[winners] = True
+        pending = pending[~won[pending]]
+        pos[pending] = (pos[pending] + 1) & (size - 1)
+
+    return table_keys, table_values
+
+
+def lookup_hash_index(table_keys, table_values, keys):
+    keys = np.asarray(keys, dtype=np.uint64)
+    bits = int(np.log2(len(table_keys)))
+    out = np.full(len(keys), -1, dtype=np.int64)
+
+    pending = np.arange(len(keys))
+    pos = _slots(keys, bits)
+    while len(pending):
+        found = np.asarray(table_keys[pos[pending]])
+        hit = found == keys[pending]
+        out[pending[hit]] = table_values[pos[pending[hit]]]
+        pending = pending[~hit & (found != _EMPTY)]
+        pos[pending] = (pos[pending] + 1) & (len(table_keys) - 1)
+
+    return out
+# --------------------------------------------------------------------------------------------------
+
+
+# leases: one empty file per process (named by pid) that opened a build; pruning skips builds
+# with a live lease, since their files (CSRs, search, indexes) are opened lazily
+# --------------------------------------------------------------------------------------------------
+def take_lease(path):
+    try:
+        os.makedirs(os.path.join(path, LEASES_DIR), exist_ok=True)
+        open(os.path.join(path, LEASES_DIR, str(os.getpid())), 'a').close()
+    except OSError:
+        pass
+
+
+def is_leased(path):
+    # any process on this host still alive that opened the build; dead ones' leases are cleared
+    leases = os.path.join(path, LEASES_DIR)
+    alive = False
+    for name in os.listdir(leases) if os.path.isdir(leases) else []:
+        try:
+            os.kill(int(name), 0)
+            alive = True
+        except PermissionError:
+            alive = True
+        except (ProcessLookupError, ValueError):
+            try:
+                os.remove(os.path.join(leases, name))
+            except OSError:
+                pass
+    return alive
+# --------------------------------------------------------------------------------------------------
+
+
+# writer
+# --------------------------------------------------------------------------------------------------
+def _write_table(table, path):
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def write_snapshot(db_dir, node_ids, persons, edges, boxes, box_idx, arrays=None, publish=True, keep=KEEP_SNAPSHOTS):
+    """
+    node_ids: sorted neo4j ids, one per Person; every other per-node input is aligned with it.
+    persons: pa.Table of display columns. edges: {type: (src_idx, dst_idx)}.
+    boxes: pa.Table with one row per box (box_id, box, center_id, center, circle_id, circle).
+    box_idx: row in `boxes` each person votes at, -1 for none.
+    publish: False leaves the build unpublished, to add its indexes before publish_snapshot.
+    """
+    root = os.path.join(db_dir, SNAPSHOT_DIR)
+    build_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid4().hex[:8]}"
+    path = os.path.join(root, build_id)
+    os.makedirs(path)
+
+    n = len(node_ids)
+    np.save(os.path.join(path, 'node_ids.npy'), np.asarray(node_ids, dtype=np.int64))
+
+    # CSR per relationship type, both directions
+    for rel_type, (src, dst) in edges.items():
+        for direction, (a, b) in {'out': (src, dst), 'in': (dst, src)}.items():
+            offsets, targets = build_csr(n, a, b)
+            np.save(os.path.join(path, f'csr_{rel_type}_{direction}_offsets.npy'), offsets)
+            np.save(os.path.join(path, f'csr_{rel_type}_{direction}_targets.npy'), targets.astype(np.int32))
+
+    # location membership: the box each person votes at and the members of every box
+    box_idx = np.asarray(box_idx, dtype=np.int32)
+    voting = np.flatnonzero(box_idx >= 0)
+    box_offsets, box_members = build_csr(boxes.num_rows, box_idx[voting], voting)
+    np.save(os.path.join(path, 'box_idx.npy'), box_idx)
+    np.save(os.path.join(path, 'box_offsets.npy'), box_offsets)
+    np.save(os.path.join(path, 'box_members.npy'), box_members.astype(np.int32))
+    _write_table(boxes, os.path.join(path, 'boxes.arrow'))
+
+    table_keys, table_values = build_hash_index(national_no_keys(persons.column('national_no').to_pylist()))
+    np.save(os.path.join(path, 'national_no_keys.npy'), table_keys)
+    np.save(os.path.join(path, 'national_no_values.npy'), table_values.astype(np.int32))
+
+    for name, values in (arrays or {}).items():
+        np.save(os.path.join(path, f'{name}.npy'), np.asarray(values))
+    _write_table(persons, os.path.join(path, 'persons.arrow'))
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'build_id': build_id,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'num_nodes': n,
+        'num_boxes': boxes.num_rows,
+        'relationships': sorted(edges),
+        'num_edges': {rel_type: int(len(src)) for rel_type, (src, _) in edges.items()},
+        'arrays': sorted(arrays or {}),
+    }
+    with open(os.path.join(path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    if publish:
+        publish_snapshot(db_dir, build_id, keep)
+
+    return path
+
+
+def publish_snapshot(db_dir, build_id, keep=KEEP_SNAPSHOTS):
+    # point CURRENT at the build, then drop old builds nobody has open; a leased one goes with a
+    # later build
+    root = os.path.join(db_dir, SNAPSHOT_DIR)
+    tmp_current = os.path.join(root, f'{CURRENT_FILE}.tmp')
+    with open(tmp_current, 'w') as f:
+        f.write(build_id)
+    os.replace(tmp_current, os.path.join(root, CURRENT_FILE))
+
+    builds = sorted(d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d)))
+    for old in builds[:-keep]:
+        if old != build_id and not is_leased(os.path.join(root, old)):
+            shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+# --------------------------------------------------------------------------------------------------
+
+
+# reader
+# --------------------------------------------------------------------------------------------------
+def current_build_id(db_dir):
+    try:
+        with open(os.path.join(db_dir, SNAPSHOT_DIR, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+class GraphSnapshot:
+    def __init__(self, path):
+        with open(os.path.join(path, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        if self.manifest['format_version'] != FORMAT_VERSION:
+            raise ValueError(f"snapshot format {self.manifest['format_version']} != {FORMAT_VERSION}")
+
+        self.path = path
+        self.build_id = self.manifest['build_id']
+        take_lease(path)
+        self.relationships = self.manifest['relationships']
+        self.node_ids = self._load('node_ids')
+        self.box_idx = self._load('box_idx')
+        self.box_offsets = self._load('box_offsets')
+        self.box_members = self._load('box_members')
+        self.national_no_keys = self._load('national_no_keys')
+        self.national_no_values = self._load('national_no_values')
+        self.arrays = {name: self._load(name) for name in self.manifest['arrays']}
+        self._csr = {}
+
+        self.persons = pa.ipc.open_file(pa.memory_map(os.path.join(path, 'persons.arrow'))).read_all()
+        self.boxes = pa.ipc.open_file(pa.memory_map(os.path.join(path, 'boxes.arrow'))).read_all().to_pandas()
+        self.box_rows = {box_id: i for i, box_id in enumerate(self.boxes['box_id'])}
+        self.center_rows = self.boxes.groupby('center_id').indices
+        self.circle_rows = self.boxes.groupby('circle_id').indices
+
+    def _load(self, name):
+        return np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode='r')
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    def csr(self, rel_type, direction):
+        key = (rel_type, direction)
+        if key not in self._csr:
+            self._csr[key] = (
+                self._load(f'csr_{rel_type}_{direction}_offsets'),
+                self._load(f'csr_{rel_type}_{direction}_targets'),
+            )
+        return self._csr[key]
+
+    def csrs(self, relationships, direction='both'):
+        directions = ['out', 'in'] if direction == 'both' else [direction]
+        return [self.csr(r, d) for r in relationships if r in self.relationships for d in directions]
+
+    def adjacency(self, relationships, direction='both'):
+        # the selected types merged into one in-memory CSR, for whole-graph passes
+        owners, targets = [], []
+        for offsets, tgt in self.csrs(relationships, direction):
+            owners.append(np.repeat(np.arange(self.num_nodes), np.diff(offsets)))
+            targets.append(np.asarray(tgt, dtype=np.int64))
+        if not owners:
+            return np.zeros(self.num_nodes + 1, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return build_csr(self.num_nodes, np.concatenate(owners), np.concatenate(targets))
+
+    def neighbors(self, idx, relationships, direction='both'):
+        # (owner, neighbour) over every selected relationship type and direction
+        owners, targets = [], []
+        for offsets, tgt in self.csrs(relationships, direction):
+            owner, neighbors = gather_neighbors(offsets, tgt, idx)
+            owners.append(owner)
+            targets.append(neighbors.astype(np.int64))
+        if not owners:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(owners), np.concatenate(targets)
+
+    def neighbors_fn(self, relationships, direction='both'):
+        # traversal.NeighborsFn over neo4j ids, served from the mapped CSR
+        def fn(ids):
+            ids = np.asarray(ids, dtype=np.int64)
+            idx = self.index_of(ids)
+            valid = idx >= 0
+            ids, idx = ids[valid], idx[valid]
+
+            owner, neighbors = self.neighbors(idx, relationships, direction)
+            order = np.argsort(owner, kind='stable')
+            counts = np.bincount(owner, minlength=len(idx))
+            chunks = np.split(np.asarray(self.node_ids)[neighbors[order]], np.cumsum(counts)[:-1])
+
+            return {int(i): chunk.tolist() for i, chunk in zip(ids, chunks)}
+
+        return fn
+
+    def index_of(self, node_ids):
+        return to_index(self.node_ids, node_ids)
+
+    def lookup_national_no(self, national_nos):
+        return lookup_hash_index(self.national_no_keys, self.national_no_values, national_no_keys(national_nos))
+
+    def location_boxes(self, circle_id=None, center_id=None, box_id=None):
+        if box_id:
+            return np.array([self.box_rows[box_id]] if box_id in self.box_rows else [], dtype=np.int64)
+        if center_id:
+            return np.asarray(self.center_rows.get(center_id, []), dtype=np.int64)
+        return np.asarray(self.circle_rows.get(circle_id, []), dtype=np.int64)
+
+    def location_members(self, circle_id=None, center_id=None, box_id=None):
+        boxes = self.location_boxes(circle_id, center_id, box_id)
+        _, members = gather_neighbors(self.box_offsets, self.box_members, boxes)
+        return members.astype(np.int64)
+
+
+def open_snapshot(db_dir, build_id=None):
+    build_id = build_id or current_build_id(db_dir)
+    if build_id is None:
+        return None
+    return GraphSnapshot(os.path.join(db_dir, SNAPSHOT_DIR, build_id))
+# --------------------------------------------------------------------------------------------------
@@ -0,0 +1,214 @@
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+# neighbours(ids) -> {id: [neighbour ids]}; ids missing from the result have no neighbours
+NeighborsFn = Callable[[list], dict]
+
+
+@dataclass
+class TraversalBudget:
+    max_frontier: int = 2_000_000          # (source, node) entries allowed in a single level
+    time_budget: float = 60.0              # seconds
+    should_stop: Optional[Callable[[], bool]] = None
+
+    def __post_init__(self):
+        self.started = time.monotonic()
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def exceeded(self):
+        if self.should_stop is not None and self.should_stop():
+            return 'cancelled'
+        if self.elapsed() > self.time_budget:
+            return 'time_budget'
+        return None
+
+
+@dataclass
+class TraversalResult:
+    counts: Counter                        # node -> number of distinct sources that reached it
+    reached: dict                          # source -> set of nodes reached (source excluded)
+    levels_done: int = 0
+    truncated: bool = False
+    reason: Optional[str] = None
+    elapsed: float = 0.0
+    fetched: int = 0                       # adjacency lists pulled from the backend
+    stats: list = field(default_factory=list)
+
+    def pairs(self):
+        for source, nodes in self.reached.items():
+            for node in nodes:
+                yield node, source
+
+    def info(self):
+        return {
+            'truncated': self.truncated,
+            'reason': self.reason,
+            'levels_done': self.levels_done,
+            'elapsed': round(self.elapsed, 3),
+            'fetched': self.fetched,
+            'levels': self.stats,
+        }
+
+
+class AdjacencyCache:
+    # every node's adjacency is fetched at most once per traversal, however many sources reach it
+    def __init__(self, neighbors: NeighborsFn):
+        self.neighbors = neighbors
+        self.adjacency = {}
+
+    def fetch(self, nodes):
+        missing = [n for n in nodes if n not in self.adjacency]
+        if missing:
+            found = self.neighbors(missing)
+            for n in missing:
+                self.adjacency[n] = found.get(n, ())
+        return self.adjacency
+
+    def degree(self, node):
+        return len(self.adjacency.get(node, ()))
+
+
+def expand_from_sources(
+    sources,
+    neighbors: NeighborsFn,
+    max_degree: int,
+    budget: Optional[TraversalBudget] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+):
+    # level-synchronous BFS from every source at once: one visited set per source so each node is
+    # reached once per source, and one neighbour fetch per level for the union of all frontiers
+    budget = budget or TraversalBudget()
+    cache = AdjacencyCache(neighbors)
+    sources = list(dict.fromkeys(sources))
+
+    visited = {s: {s} for s in sources}
+    frontiers = {s: [s] for s in sources}
+    result = TraversalResult(counts=Counter(), reached={})
+
+    for level in range(1, int(max_degree) + 1):
+        if not frontiers:
+            break
+
+        width = sum(len(f) for f in frontiers.values())
+        if width > budget.max_frontier:
+            result.truncated, result.reason = True, 'max_frontier'
+            break
+
+        reason = budget.exceeded()
+        if reason:
+            result.truncated, result.reason = True, reason
+            break
+
+        active = list({n for f in frontiers.values() for n in f})
+        before = len(cache.adjacency)
+        adjacency = cache.fetch(active)
+        result.fetched += len(cache.adjacency) - before
+
+        next_frontiers = {}
+        for i, (source, frontier) in enumerate(frontiers.items()):
+            seen = visited[source]
+            nxt = []
+            for u in frontier:
+                for v in adjacency[u]:
+                    if v not in seen:
+                        seen.add(v)
+                        nxt.append(v)
+            if nxt:
+                next_frontiers[source] = nxt
+
+            if i % 1_000 == 999:
+                reason = budget.exceeded()
+                if reason:
+                    result.truncated, result.reason = True, reason
+                    break
+
+        result.stats.append({'level': level, 'frontier': width, 'active': len(active), 'elapsed': round(budget.elapsed(), 3)})
+        frontiers = next_frontiers
+
+        if result.truncated:
+            break
+
+        result.levels_done = level
+        if progress is not None:
+            progress(level, int(max_degree))
+
+    for source, seen in visited.items():
+        seen.discard(source)
+        result.reached[source] = seen
+        result.counts.update(seen)
+
+    result.elapsed = budget.elapsed()
+    return result
+
+
+def find_path(
+    source,
+    target,
+    neighbors: NeighborsFn,
+    max_degree: int,
+    reverse_neighbors: Optional[NeighborsFn] = None,
+    budget: Optional[TraversalBudget] = None,
+):
+    # bidirectional BFS: grow whichever side currently has the cheaper frontier (fewest edges to
+    # scan) until the two visited sets meet or the combined depth reaches max_degree
+    budget = budget or TraversalBudget()
+    if source == target:
+        return [source], False, None
+
+    sides = [
+        {'cache': AdjacencyCache(neighbors), 'parents': {source: None}, 'frontier': [source], 'depth': 0},
+        {'cache': AdjacencyCache(reverse_neighbors or neighbors), 'parents': {target: None}, 'frontier': [target], 'depth': 0},
+    ]
+
+    def cost(side):
+        return sum(max(side['cache'].degree(n), 1) for n in side['frontier'])
+
+    while sides[0]['depth'] + sides[1]['depth'] < int(max_degree):
+        if not sides[0]['frontier'] or not sides[1]['frontier']:
+            return None, False, None
+
+        reason = budget.exceeded()
+        if reason is None and len(sides[0]['frontier']) + len(sides[1]['frontier']) > budget.max_frontier:
+            reason = 'max_frontier'
+        if reason:
+            return None, True, reason
+
+        i = 0 if cost(sides[0]) <= cost(sides[1]) else 1
+        side, other = sides[i], sides[1 - i]
+        adjacency = side['cache'].fetch(side['frontier'])
+
+        nxt = []
+        meet = None
+        for u in side['frontier']:
+            for v in adjacency[u]:
+                if v in side['parents']:
+                    continue
+                side['parents'][v] = u
+                nxt.append(v)
+                if v in other['parents']:
+                    meet = v
+                    break
+            if meet is not None:
+                break
+
+        side['frontier'] = nxt
+        side['depth'] += 1
+
+        if meet is not None:
+            path = []
+            node = meet
+            while node is not None:
+                path.append(node)
+                node = sides[0]['parents'][node]
+            path.reverse()
+            node = sides[1]['parents'][meet]
+            while node is not None:
+                path.append(node)
+                node = sides[1]['parents'][node]
+            return path, False, None
+
+    return None, False, None
@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+
+from utils.kinship import sorted_contains, sorted_unique
+
+# bit i of a person's masks is ELECTION_YEARS[i]: voted_mask = took part, known_mask = has a record;
+# the build script packs the campaign columns with these rules, keep the two in step
+ELECTION_YEARS = ['Y_2013', 'Y_2016', 'Y_2020', 'Y_2021', 'Y_2024']
+VOTED_VALUES = ['1', 'yes', 'y', 'true']
+NOT_VOTED_VALUES = ['0', 'no', 'n', 'false']
+
+# people with a short (or no) record lean towards the roll-wide rate, worth this many elections
+TURNOUT_PRIOR_WEIGHT = float(os.getenv('TURNOUT__PRIOR_WEIGHT', 2))
+
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(masks):
+    return _POPCOUNT[np.asarray(masks, dtype=np.uint8)]
+
+
+def turnout_rate(voted, known):
+    known_total = int(popcount(known).sum(dtype=np.int64))
+    return int(popcount(voted).sum(dtype=np.int64)) / known_total if known_total else 0.0
+
+
+def smoothed_rate(votes, records, prior, weight=TURNOUT_PRIOR_WEIGHT):
+    # share of known elections voted in, pulled towards the prior; works on arrays and polars exprs
+    return (votes + weight * prior) / (records + weight)
+
+
+def propensity(voted, known, prior=None, weight=TURNOUT_PRIOR_WEIGHT):
+    prior = turnout_rate(voted, known) if prior is None else prior
+    return smoothed_rate(popcount(voted), popcount(known), prior, weight).astype(np.float32)
+
+
+def group_turnout(groups, n_groups, voted, known, prior, weight=TURNOUT_PRIOR_WEIGHT):
+    # groups[i] is the group of person i (-1 = none): smoothed propensity of every group's pooled
+    # record, plus voted / known counts per group and election year
+    groups = np.asarray(groups, dtype=np.int64)
+    valid = groups >= 0
+    groups, voted, known = groups[valid], np.asarray(voted)[valid], np.asarray(known)[valid]
+
+    votes = np.bincount(groups, weights=popcount(voted), minlength=n_groups)
+    records = np.bincount(groups, weights=popcount(known), minlength=n_groups)
+    by_year = np.stack([
+        np.stack([
+            np.bincount(groups, weights=(mask >> i) & 1, minlength=n_groups)
+            for mask in (voted, known)
+        ], axis=-1)
+        for i in range(len(ELECTION_YEARS))
+    ], axis=1)
+
+    return smoothed_rate(votes, records, prior, weight), by_year
+
+
+def weighted_reach(neighbors, nodes, max_degree, weights):
+    # for every node: the summed weight of the distinct other nodes within max_degree hops;
+    # neighbors(idx) -> (owner, neighbour idx), as GraphSnapshot.neighbors with the types bound
+    nodes = np.asarray(nodes, dtype=np.int64)
+    n = len(weights)
+    out = np.zeros(len(nodes), dtype=np.float64)
+
+    visited = sorted_unique(np.arange(len(nodes)) * n + nodes)
+    frontier_group, frontier_node = visited // n, visited % n
+    for _ in range(max_degree):
+        if not len(frontier_node):
+            break
+        owner, found = neighbors(frontier_node)
+        keys = sorted_unique(frontier_group[owner] * n + found)
+        new = keys[~sorted_contains(visited, keys)]
+        visited = np.sort(np.concatenate([visited, new]))
+        frontier_group, frontier_node = new // n, new % n
+        out += np.bincount(frontier_group, weights=weights[frontier_node], minlength=len(nodes))
+
+    return out
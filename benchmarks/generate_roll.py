@@ -0,0 +1,435 @@
+"""
+Synthetic voter-roll generator.
+
+Writes a raw roll CSV in the schema `scripts/build_graph.py:load_from_raw` expects, plus a matching
+campaign CSV for `update_campaign_data`.
+
+    python benchmarks/generate_roll.py <scale> <out_dir> [seed]
+
+`scale` is one of SCALES (10k, 100k, 1m, 10m) or a plain number of people.
+"""
+import math
+import os
+import sys
+
+import numpy as np
+import polars as pl
+
+SCALES = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000,
+}
+
+# people are generated in independent blocks of family forests so memory stays flat at 10M
+BLOCK_SIZE = 250_000
+
+# location hierarchy
+BOX_SIZE = 400
+BOXES_PER_CENTER = 8
+CENTERS_PER_CIRCLE = 12
+MIN_CIRCLES = 3
+MAX_CIRCLES = 25                    # circles are electoral districts, they don't grow with the roll
+
+# family structure
+NUM_CLANS_PER_PERSON = 1 / 150      # size of the family-name pool relative to the roll
+CLAN_ZIPF_S = 0.9                   # big clans dominate, long tail of small ones
+CLAN_LOCALITY = 0.8                 # share of people living in their clan's home circle
+COUPLES_PER_VILLAGE = 15            # people marry within their village, so villages bound family components
+VILLAGE_ZIPF_S = 0.6                # ... and a few big villages become the very large (hotspot) families
+MEAN_CHILDREN = 4.0
+MAX_CHILDREN = 15
+MARRIAGE_RATE = 0.7
+FOUNDER_IN_ROLL_RATE = 0.75         # founders that are not in the roll become missing parents
+FOUNDER_PARENT_KNOWN_RATE = 0.6     # founders whose parents have a national_no at all
+
+# data quality noise
+MISSING_NATIONAL_NO_RATE = 0.005
+NOT_UNIQUE_SHRINK_NAME_RATE = 0.01
+UNMATCHED_RATE = 0.01
+DUPLICATE_RATE = 0.002
+
+# campaign data
+CAMPAIGN_COVERAGE = 0.3
+PEOPLE_PER_PRINCIPAL = 5_000
+PEOPLE_PER_SUB = 500
+ELECTION_YEARS = ['Y_2013', 'Y_2016', 'Y_2020', 'Y_2021', 'Y_2024']
+
+MALE_NAMES = [
+    'محمد', 'أحمد', 'عبدالله', 'خالد', 'عمر', 'علي', 'يوسف', 'إبراهيم', 'حسن', 'حسين',
+    'سليمان', 'عبدالرحمن', 'مصطفى', 'محمود', 'سامي', 'زياد', 'فيصل', 'ماجد', 'نايف', 'طارق',
+    'عيسى', 'موسى', 'يحيى', 'صالح', 'راشد', 'سعيد', 'هاني', 'وليد', 'باسل', 'عادل',
+    'جمال', 'كمال', 'منصور', 'ناصر', 'عماد', 'غازي', 'رائد', 'قاسم', 'عودة', 'سالم',
+]
+FEMALE_NAMES = [
+    'فاطمة', 'عائشة', 'مريم', 'خديجة', 'زينب', 'سارة', 'نور', 'هدى', 'ليلى', 'رنا',
+    'سلمى', 'آمنة', 'رقية', 'حنان', 'منى', 'دعاء', 'إيمان', 'أسماء', 'رهف', 'لينا',
+    'رغد', 'ياسمين', 'هبة', 'نادية', 'سميرة', 'وفاء', 'عبير', 'غادة', 'ملك', 'جنى',
+]
+FAMILY_ROOTS = [
+    'العبادي', 'الزعبي', 'المجالي', 'الخصاونة', 'العدوان', 'الحياري', 'الطراونة', 'الروسان',
+    'القضاة', 'البطاينة', 'الشرع', 'العمري', 'الرفاعي', 'الدعجة', 'الحديد', 'الفايز',
+    'الخوالدة', 'النعيمات', 'الرواشدة', 'السرحان', 'الشمايلة', 'الحمود', 'العتوم', 'المومني',
+    'الجبور', 'الكساسبة', 'الهباهبة', 'المعايطة', 'الصرايرة', 'النسور', 'الحوامدة', 'البدور',
+]
+FAMILY_SUFFIXES = ['', 'ات', 'ية', 'ين']
+CITIES = ['عمان', 'إربد', 'الزرقاء', 'السلط', 'الكرك', 'مادبا', 'جرش', 'عجلون', 'المفرق', 'الطفيلة', 'معان', 'العقبة']
+RELIGIONS = ['مسلم', 'مسيحي']
+CREDIBILITY = ['high', 'medium', 'low']
+VOTER_TYPES = ['supporter', 'undecided', 'opponent']
+
+# serial -> national_no is a bijection on [0, 1e9) so numbers never collide
+_NO_MUL = 387_420_489
+_NO_ADD = 123_456_789
+_NO_MOD = 1_000_000_000
+
+
+RAW_COLUMNS = [
+    'full_name',
+    'first_name',
+    'father_name',
+    'grand_name',
+    'family_name',
+    'national_no',
+    'father_national_no',
+    'mother_national_no',
+    'new_big_key',
+    'dob',
+    'age',
+    'religion',
+    'address',
+    'circle',
+    'center',
+    'box',
+    'primary_key',
+    'is_unique_shrink_name',
+    'unmatched',
+]
+
+CAMPAIGN_COLUMNS = [
+    'primary_key',
+    'phone_number',
+    'credibility',
+    'type',
+    'principal_coordinator',
+    'sub_coordinator',
+    *ELECTION_YEARS,
+]
+
+
+def resolve_scale(scale):
+    if str(scale).lower() in SCALES:
+        return SCALES[str(scale).lower()]
+
+    return int(float(scale))
+
+
+def build_hierarchy(n_people):
+    n_boxes = max(1, math.ceil(n_people / BOX_SIZE))
+    n_centers = max(1, math.ceil(n_boxes / BOXES_PER_CENTER))
+    n_circles = min(n_centers, max(MIN_CIRCLES, min(MAX_CIRCLES, math.ceil(n_centers / CENTERS_PER_CIRCLE))))
+
+    center_circle = np.arange(n_centers) % n_circles
+    box_center = np.arange(n_boxes) % n_centers
+    box_no = np.arange(n_boxes) // n_centers + 1
+
+    circles = pl.Series([f'{CITIES[i % len(CITIES)]} {i // len(CITIES) + 1}' for i in range(n_circles)])
+    centers = pl.Series([f'مدرسة {i + 1}' for i in range(n_centers)])
+
+    return {
+        'circles': circles,
+        'centers': centers,
+        'center_circle': center_circle,
+        'box_center': box_center,
+        'box_no': box_no,
+        'circle_boxes': [np.flatnonzero(center_circle[box_center] == c) for c in range(n_circles)],
+    }
+
+
+def national_numbers(serials, is_male):
+    prefix = np.where(is_male, 9_000_000_000, 2_000_000_000)
+    return prefix + (serials * _NO_MUL + _NO_ADD) % _NO_MOD
+
+
+def _clan_names(n_clans):
+    roots = len(FAMILY_ROOTS)
+    return pl.Series([
+        FAMILY_ROOTS[i % roots] + FAMILY_SUFFIXES[(i // roots) % len(FAMILY_SUFFIXES)]
+        + ('' if i < roots * len(FAMILY_SUFFIXES) else f' {i // (roots * len(FAMILY_SUFFIXES))}')
+        for i in range(n_clans)
+    ])
+
+
+def _zipf_choice(rng, size, n, s):
+    weights = 1.0 / np.arange(1, n + 1) ** s
+    return rng.choice(n, size, p=weights / weights.sum())
+
+
+def _pair_within(rng, village, sons, daughters):
+    # match sons to daughters of the same village, in random order within the village
+    def ranked(idx):
+        idx = idx[np.lexsort((rng.random(len(idx)), village[idx]))]
+        v = village[idx]
+        first = np.searchsorted(v, v)
+        return idx, v * (len(village) + 1) + (np.arange(len(idx)) - first)
+
+    sons, son_keys = ranked(sons)
+    daughters, daughter_keys = ranked(daughters)
+    _, i, j = np.intersect1d(son_keys, daughter_keys, assume_unique=True, return_indices=True)
+    keep = rng.random(len(i)) < MARRIAGE_RATE
+    return sons[i[keep]], daughters[j[keep]]
+
+
+def _people(rng, serial_start, n, is_male):
+    names = MALE_NAMES if is_male else FEMALE_NAMES
+    serials = np.arange(serial_start, serial_start + n, dtype=np.int64)
+    return {
+        'serial': serials,
+        'national_no': national_numbers(serials, np.full(n, is_male)),
+        'is_male': np.full(n, is_male),
+        'first_idx': rng.integers(0, len(names), n),
+    }
+
+
+def _generate_block(rng, n_people, serial_start, n_clans):
+    # every person is a row of parallel arrays; parent columns hold national numbers or -1 ('missing')
+    cols = ['serial', 'national_no', 'is_male', 'first_idx', 'father_no', 'mother_no',
+            'father_first_idx', 'grand_first_idx', 'clan', 'village', 'generation', 'in_roll']
+    out = {c: [] for c in cols}
+    serial = serial_start
+
+    def emit(people):
+        for c in cols:
+            out[c].append(people[c])
+
+    produced = 0
+    while produced < n_people:
+        n_couples = max(1, (n_people - produced) // 12)
+
+        # founders: husbands and wives come in sibling groups that share an out-of-roll parent
+        husbands = _people(rng, serial, n_couples, True)
+        serial += n_couples
+        wives = _people(rng, serial, n_couples, False)
+        serial += n_couples
+
+        n_villages = max(1, n_couples // COUPLES_PER_VILLAGE)
+        village = _zipf_choice(rng, n_couples, n_villages, VILLAGE_ZIPF_S)
+        husbands['village'] = village
+        wives['village'] = village
+
+        for founders in (husbands, wives):
+            # a handful of sibling groups per village
+            _, group = np.unique(village * 4 + rng.integers(0, 4, n_couples), return_inverse=True)
+            n_groups = int(group.max()) + 1
+            group_fathers = national_numbers(serial + np.arange(n_groups), np.ones(n_groups, bool))
+            group_mothers = national_numbers(serial + n_groups + np.arange(n_groups), np.zeros(n_groups, bool))
+            serial += 2 * n_groups
+
+            known = rng.random(n_groups) < FOUNDER_PARENT_KNOWN_RATE
+            founders['father_no'] = np.where(known[group], group_fathers[group], -1)
+            founders['mother_no'] = np.where(known[group], group_mothers[group], -1)
+            founders['father_first_idx'] = rng.integers(0, len(MALE_NAMES), n_couples)
+            founders['grand_first_idx'] = rng.integers(0, len(MALE_NAMES), n_couples)
+            founders['generation'] = np.zeros(n_couples, np.int8)
+            founders['in_roll'] = rng.random(n_couples) < FOUNDER_IN_ROLL_RATE
+
+        husbands['clan'] = _zipf_choice(rng, n_couples, n_clans, CLAN_ZIPF_S)
+        wives['clan'] = _zipf_choice(rng, n_couples, n_clans, CLAN_ZIPF_S)
+        emit(husbands)
+        emit(wives)
+        produced += int(husbands['in_roll'].sum() + wives['in_roll'].sum())
+
+        generation = 0
+        while produced < n_people and len(husbands['serial']) > 0:
+            generation += 1
+
+            # heavy-tailed family sizes: gamma-mixed poisson gives a few very large families
+            lam = rng.gamma(2.0, MEAN_CHILDREN / 2.0, len(husbands['serial']))
+            n_children = np.minimum(rng.poisson(lam), MAX_CHILDREN)
+            parent = np.repeat(np.arange(len(husbands['serial'])), n_children)
+            n = len(parent)
+            if n == 0:
+                break
+
+            is_male = rng.random(n) < 0.5
+            serials = np.arange(serial, serial + n, dtype=np.int64)
+            serial += n
+            children = {
+                'serial': serials,
+                'national_no': national_numbers(serials, is_male),
+                'is_male': is_male,
+                'first_idx': np.where(
+                    is_male, rng.integers(0, len(MALE_NAMES), n), rng.integers(0, len(FEMALE_NAMES), n)
+                ),
+                'father_no': husbands['national_no'][parent],
+                'mother_no': wives['national_no'][parent],
+                'father_first_idx': husbands['first_idx'][parent],
+                'grand_first_idx': husbands['father_first_idx'][parent],
+                'clan': husbands['clan'][parent],
+                'village': husbands['village'][parent],
+                'generation': np.full(n, generation, np.int8),
+                'in_roll': np.ones(n, bool),
+            }
+            emit(children)
+            produced += n
+
+            # marry sons to daughters of other households in the same village for the next generation
+            sons, daughters = _pair_within(rng, children['village'], np.flatnonzero(is_male), np.flatnonzero(~is_male))
+            husbands = {c: children[c][sons] for c in children}
+            wives = {c: children[c][daughters] for c in children}
+
+    block = {c: np.concatenate(v) for c, v in out.items()}
+    keep = np.flatnonzero(block['in_roll'])[:n_people]
+    return {c: v[keep] for c, v in block.items()}, serial
+
+
+def generate_roll(n_people, seed=0, block_size=BLOCK_SIZE):
+    """Yields raw-roll DataFrames of at most `block_size` rows until `n_people` rows are produced."""
+    rng = np.random.default_rng(seed)
+    hierarchy = build_hierarchy(n_people)
+    n_circles = len(hierarchy['circles'])
+    n_clans = max(1, int(n_people * NUM_CLANS_PER_PERSON))
+    clan_names = _clan_names(n_clans)
+    clan_home = rng.integers(0, n_circles, n_clans)
+
+    male_names = pl.Series(MALE_NAMES)
+    first_names = pl.Series(MALE_NAMES + FEMALE_NAMES)
+    religions = pl.Series(RELIGIONS)
+    cities = pl.Series(CITIES)
+
+    serial = 0
+    row = 0
+    while row < n_people:
+        n = min(block_size, n_people - row)
+        block, serial = _generate_block(rng, n, serial, n_clans)
+        n = len(block['serial'])
+
+        # location: clan home circle most of the time, any box within the circle
+        circle = np.where(rng.random(n) < CLAN_LOCALITY, clan_home[block['clan']], rng.integers(0, n_circles, n))
+        box = np.empty(n, dtype=np.int64)
+        for c in np.unique(circle):
+            mask = circle == c
+            boxes = hierarchy['circle_boxes'][c]
+            box[mask] = boxes[rng.integers(0, len(boxes), mask.sum())]
+        center = hierarchy['box_center'][box]
+
+        age = np.clip(
+            np.select(
+                [block['generation'] == 0, block['generation'] == 1],
+                [rng.integers(60, 95, n), rng.integers(35, 65, n)],
+                rng.integers(18, 40, n),
+            ),
+            18, 100,
+        )
+
+        first_idx = np.where(block['is_male'], block['first_idx'], block['first_idx'] + len(MALE_NAMES))
+        dob_month = rng.integers(1, 13, n)
+        dob_day = rng.integers(1, 29, n)
+        df = (
+            pl.DataFrame({
+                'first_name': first_names.gather(first_idx),
+                'father_name': male_names.gather(block['father_first_idx']),
+                'grand_name': male_names.gather(block['grand_first_idx']),
+                'family_name': clan_names.gather(block['clan']),
+                'national_no': block['national_no'],
+                'father_national_no': block['father_no'],
+                'mother_national_no': block['mother_no'],
+                'new_big_key': block['clan'],
+                'age': age,
+                'dob_month': dob_month,
+                'dob_day': dob_day,
+                'religion': religions.gather((rng.random(n) < 0.04).astype(np.int64)),
+                'address': cities.gather(rng.integers(0, len(CITIES), n)),
+                'circle': hierarchy['circles'].gather(circle),
+                'center': hierarchy['centers'].gather(center),
+                'box': hierarchy['box_no'][box],
+                'serial': block['serial'],
+                'is_unique_shrink_name': (rng.random(n) >= NOT_UNIQUE_SHRINK_NAME_RATE).astype(np.int64),
+                'unmatched': (rng.random(n) < UNMATCHED_RATE).astype(np.int64),
+                'national_no_missing': rng.random(n) < MISSING_NATIONAL_NO_RATE,
+            })
+            .with_columns(
+                full_name=pl.concat_str(['first_name', 'father_name', 'grand_name', 'family_name'], separator=' '),
+                national_no=pl.when(pl.col('national_no_missing')).then(pl.lit('missing'))
+                    .otherwise(pl.col('national_no').cast(pl.Utf8)),
+                father_national_no=pl.when(pl.col('father_national_no') < 0).then(pl.lit('missing'))
+                    .otherwise(pl.col('father_national_no').cast(pl.Utf8)),
+                mother_national_no=pl.when(pl.col('mother_national_no') < 0).then(pl.lit('missing'))
+                    .otherwise(pl.col('mother_national_no').cast(pl.Utf8)),
+                new_big_key=pl.format('K{}', pl.col('new_big_key')),
+                primary_key=pl.format('P{}', pl.col('serial').cast(pl.Utf8).str.zfill(10)),
+                dob=pl.format(
+                    '{}-{}-{}',
+                    (2024 - pl.col('age')).cast(pl.Utf8),
+                    pl.col('dob_month').cast(pl.Utf8).str.zfill(2),
+                    pl.col('dob_day').cast(pl.Utf8).str.zfill(2),
+                ),
+            )
+        )
+
+        # a few rows appear twice, as they do in the real roll
+        duplicates = df.sample(fraction=DUPLICATE_RATE, seed=seed + row) if n > 1 else df.clear()
+        df = pl.concat([df, duplicates])
+
+        yield df.select(RAW_COLUMNS)
+        row += n
+
+
+def generate_campaign(raw_df, seed=0):
+    rng = np.random.default_rng(seed)
+    df = raw_df.filter(pl.lit(rng.random(len(raw_df))) < CAMPAIGN_COVERAGE).unique('primary_key')
+    n = len(df)
+    n_total = max(1, len(raw_df))
+    n_principals = max(1, n_total // PEOPLE_PER_PRINCIPAL)
+    n_subs = max(1, n_total // PEOPLE_PER_SUB)
+
+    sub = rng.integers(0, n_subs, n)
+    propensity = rng.beta(2.0, 1.5, n)
+    years = {
+        y: np.where(
+            rng.random(n) < 0.1, 'missing', np.where(rng.random(n) < propensity, '1', '0')
+        )
+        for y in ELECTION_YEARS
+    }
+
+    return (
+        df.select('primary_key')
+        .with_columns(
+            phone_number=pl.Series((790_000_000 + rng.integers(0, 10_000_000, n)).astype(str)).str.zfill(10),
+            credibility=pl.Series(CREDIBILITY).gather(rng.integers(0, len(CREDIBILITY), n)),
+            type=pl.Series(VOTER_TYPES).gather(rng.integers(0, len(VOTER_TYPES), n)),
+            # every sub coordinator reports to exactly one principal
+            principal_coordinator=pl.Series([f'principal_{i}' for i in sub % n_principals]),
+            sub_coordinator=pl.Series([f'sub_{i}' for i in sub]),
+            **{y: pl.Series(v) for y, v in years.items()},
+        )
+        .select(CAMPAIGN_COLUMNS)
+    )
+
+
+def write_roll(n_people, out_dir, seed=0, block_size=BLOCK_SIZE):
+    os.makedirs(out_dir, exist_ok=True)
+    raw_path = os.path.join(out_dir, 'raw.csv')
+    campaign_path = os.path.join(out_dir, 'campaign.csv')
+
+    n_rows = 0
+    with open(raw_path, 'w', encoding='utf-8') as raw_f, open(campaign_path, 'w', encoding='utf-8') as campaign_f:
+        for i, df in enumerate(generate_roll(n_people, seed=seed, block_size=block_size)):
+            df.write_csv(raw_f, include_header=i == 0)
+            generate_campaign(df, seed=seed + i).write_csv(campaign_f, include_header=i == 0)
+            n_rows += len(df)
+            print(f"> {n_rows} rows written ...")
+
+    return raw_path, campaign_path
+
+
+if __name__ == '__main__':
+    n_people = resolve_scale(sys.argv[1])
+    out_dir = sys.argv[2]
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+
+    print(f"Generating synthetic roll: {n_people} people -> {out_dir}")
+    raw_path, campaign_path = write_roll(n_people, out_dir, seed=seed)
+    print(f"> raw: {raw_path}")
+    print(f"> campaign: {campaign_path}")
@@ -0,0 +1,383 @@
+"""
+Benchmark harness for the build script and the page query functions.
+
+Generates (or reuses) a synthetic roll, times every `build_graph.py` phase and every page query
+function against a local Neo4j stand-in (NEO4J__URI / NEO4J__USER / NEO4J__PASSWORD, same .env as
+the app), and appends the timings to benchmarks/results/history.{jsonl,csv}.
+
+    python benchmarks/run_benchmarks.py <scale> [--seed 0] [--repeat 3] [--skip-build] [--restart]
+"""
+import argparse
+import csv
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import time
+import traceback
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from dotenv import load_dotenv
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+DATA_DIR = os.path.join(BENCH_DIR, 'data')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+HISTORY_JSONL = os.path.join(RESULTS_DIR, 'history.jsonl')
+HISTORY_CSV = os.path.join(RESULTS_DIR, 'history.csv')
+
+sys.path.insert(0, os.path.join(ROOT_DIR, 'app'))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts'))
+
+from generate_roll import resolve_scale, write_roll  # noqa: E402
+
+RELATIONSHIPS = ['FATHER', 'MOTHER', 'SPOUSE', 'SIBLING']
+# prepare_raw holds one raw block and one national_no partition at a time, so its peak RSS must
+# stay under this at every roll size; checked on the roll and on one a quarter of its size
+INGEST_RSS_BUDGET_MB = float(os.getenv('BENCHMARK__INGEST_RSS_BUDGET_MB', 512))
+INGEST_SMALL_ROLL = 4
+HISTORY_FIELDS = [
+    'run_id', 'timestamp', 'git_commit', 'scale', 'n_people', 'seed',
+    'group', 'name', 'params', 'repeat', 'seconds', 'peak_rss_mb', 'ok', 'error',
+]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Recorder:
+    def __init__(self, scale, n_people, seed):
+        self.base = {
+            'run_id': str(uuid4()),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'scale': scale,
+            'n_people': n_people,
+            'seed': seed,
+        }
+        self.records = []
+
+    def time(self, group, name, fn, params=None, repeat=1, clear=(), rss=peak_rss_mb):
+        for i in range(repeat):
+            # st.cache_data would otherwise turn every repeat after the first into a dict lookup
+            for cached in clear:
+                if hasattr(cached, 'clear'):
+                    cached.clear()
+
+            record = self.base | {
+                'group': group,
+                'name': name,
+                'params': json.dumps(params or {}, ensure_ascii=False, sort_keys=True),
+                'repeat': i,
+                'ok': True,
+                'error': '',
+            }
+            start = time.perf_counter()
+            try:
+                fn()
+            except Exception as e:
+                traceback.print_exc()
+                record['ok'] = False
+                record['error'] = f'{type(e).__name__}: {e}'
+            record['seconds'] = round(time.perf_counter() - start, 6)
+            record['peak_rss_mb'] = round(rss(), 1)
+
+            print(f"> [{group}] {name} {record['params']} #{i}: {record['seconds']:.3f}s {'' if record['ok'] else 'FAILED'}")
+            self.records.append(record)
+
+            if not record['ok']:
+                break
+
+    def save(self):
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+
+        with open(HISTORY_JSONL, 'a', encoding='utf-8') as f:
+            for record in self.records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+        new_file = not os.path.exists(HISTORY_CSV)
+        with open(HISTORY_CSV, 'a', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=HISTORY_FIELDS)
+            if new_file:
+                writer.writeheader()
+            writer.writerows(self.records)
+
+
+def load_history():
+    if not os.path.exists(HISTORY_JSONL):
+        return []
+
+    with open(HISTORY_JSONL, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def best_times(records):
+    out = {}
+    for r in records:
+        if not r['ok']:
+            continue
+        key = (r['group'], r['name'], r['params'])
+        out[key] = min(out.get(key, float('inf')), r['seconds'])
+    return out
+
+
+def compare_with_previous(recorder, threshold=0.2):
+    # best-of-repeats against the most recent earlier run at the same scale
+    previous = [r for r in load_history() if r['scale'] == recorder.base['scale'] and r['run_id'] != recorder.base['run_id']]
+    if not previous:
+        print("No previous run at this scale to compare against.")
+        return
+
+    last_run = previous[-1]['run_id']
+    before = best_times([r for r in previous if r['run_id'] == last_run])
+    after = best_times(recorder.records)
+
+    print('-' * 50)
+    print(f"Comparison with run {last_run} ({previous[-1]['git_commit']}):")
+    for key, seconds in after.items():
+        if key not in before:
+            continue
+        change = (seconds - before[key]) / before[key] if before[key] > 0 else 0.0
+        flag = 'REGRESSION' if change > threshold else ''
+        print(f"> [{key[0]}] {key[1]} {key[2]}: {before[key]:.3f}s -> {seconds:.3f}s ({change:+.0%}) {flag}")
+
+
+# --------------------------------------------------------------------------------------------------
+def ensure_roll(n_people, seed):
+    out_dir = os.path.join(DATA_DIR, f'{n_people}-{seed}')
+    raw_path = os.path.join(out_dir, 'raw.csv')
+    campaign_path = os.path.join(out_dir, 'campaign.csv')
+
+    if not (os.path.exists(raw_path) and os.path.exists(campaign_path)):
+        write_roll(n_people, out_dir, seed=seed)
+
+    return raw_path, campaign_path
+
+
+def run_ingest(recorder, raw_paths):
+    # a fresh interpreter per roll that reports its own peak RSS, so each ingest is measured alone
+    script = (
+        'import resource, sys, build_graph; build_graph.prepare_raw(sys.argv[1], sys.argv[2]); '
+        'print(round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1))'
+    )
+    paths = [os.path.join(ROOT_DIR, 'scripts'), os.path.join(ROOT_DIR, 'app'), os.getenv('PYTHONPATH', '')]
+    env = os.environ | {'PYTHONPATH': os.pathsep.join(p for p in paths if p)}
+
+    for raw_path in raw_paths:
+        peak = {'mb': 0.0}
+
+        def ingest(raw_path=raw_path, peak=peak):
+            ingest_dir = os.path.join(os.path.dirname(raw_path), 'ingest')
+            result = subprocess.run([sys.executable, '-c', script, raw_path, ingest_dir], env=env, check=True, capture_output=True, text=True)
+            print(result.stdout, end='')
+            peak['mb'] = float(result.stdout.split()[-1])
+            if peak['mb'] > INGEST_RSS_BUDGET_MB:
+                raise AssertionError(f"peak RSS {peak['mb']:.0f} MB over the {INGEST_RSS_BUDGET_MB:.0f} MB budget")
+
+        recorder.time(
+            'ingest', 'prepare_raw', ingest,
+            {'raw_mb': round(os.path.getsize(raw_path) / 2 ** 20, 1)},
+            rss=lambda peak=peak: peak['mb'],
+        )
+
+
+def reset_database(uri, user, password):
+    from utils.connections import get_connection_manager
+
+    get_connection_manager(uri, user, password).run("MATCH (n) CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 50000 ROWS")
+
+
+def run_build(recorder, raw_path, campaign_path, restart):
+    import build_graph
+
+    if not restart:
+        # a local stand-in has no systemd unit to bounce; phases run back to back
+        build_graph.restart_neo4j = lambda: None
+
+    uri = os.getenv('NEO4J__URI')
+    user = os.getenv('NEO4J__USER')
+    password = os.getenv('NEO4J__PASSWORD')
+
+    reset_database(uri, user, password)
+
+    recorder.time('build', 'init_constraints', lambda: build_graph.init_constraints(uri, user, password))
+    recorder.time('build', 'load_from_raw', lambda: build_graph.load_from_raw(raw_path, uri, user, password))
+    recorder.time('build', 'create_relationships', lambda: build_graph.create_relationships(uri, user, password))
+    recorder.time('build', 'compute_family_components', lambda: build_graph.compute_family_components(uri, user, password))
+    recorder.time('build', 'update_campaign_data', lambda: build_graph.update_campaign_data(campaign_path, uri, user, password))
+    recorder.time('build', 'build_snapshot', lambda: build_graph.build_snapshot(uri, user, password))
+    # sharded by circle: one worker against all cores shows how the precompute scales
+    for workers in sorted({1, os.cpu_count()}):
+        recorder.time('build', 'build_family_index', lambda w=workers: build_graph.build_family_index(workers=w), {'workers': workers})
+    recorder.time('build', 'build_coordinator_index', lambda: build_graph.build_coordinator_index())
+    recorder.time('build', 'build_search_index', lambda: build_graph.build_search_index())
+    recorder.time('build', 'warm_cache', lambda: build_graph.warm_cache(uri, user, password))
+
+
+def sample_locations(graph):
+    circles = graph.get_circles()
+    circle = circles[0]['circle_id']
+    centers = graph.get_centers(circle)
+    center = centers[0]['center_id']
+    boxes = graph.get_boxes(circle, center)
+    box = boxes[0]['box_id']
+
+    person = graph.run_query("""
+        MATCH (p:Person {is_missing: false})-[:FATHER|MOTHER|SPOUSE|SIBLING]-()
+        RETURN p.national_no AS national_no, p.first_name + ' ' + p.family_name AS name
+        LIMIT 1
+    """)[0]
+
+    return {'circle': circle, 'center': center, 'box': box, 'national_no': person['national_no'], 'name': person['name']}
+
+
+def query_cases(graph, result_cache, sample):
+    circle, center, box = sample['circle'], sample['center'], sample['box']
+    locations = {
+        'box': {'circle': circle, 'center': center, 'box': box},
+        'center': {'circle': circle, 'center': center, 'box': None},
+        'circle': {'circle': circle, 'center': None, 'box': None},
+    }
+
+    cases = [
+        ('get_circles', graph.get_circles, (), {}),
+        ('get_centers', graph.get_centers, (circle,), {'circle': circle}),
+        ('get_boxes', graph.get_boxes, (circle, center), {'circle': circle, 'center': center}),
+    ]
+
+    for level, location in locations.items():
+        cases.append(('get_counts_by_location', graph.get_counts_by_location, (location,), {'level': level}))
+        cases.append(('get_location_turnout', graph.get_location_turnout, (location,), {'level': level}))
+
+    for level, location in locations.items():
+        for degree in (1, 2, 3):
+            filters = location | {'relationship': RELATIONSHIPS, 'degree': degree}
+            cases.append(('get_relative_counts', graph.get_relative_counts, (filters,), {'level': level, 'degree': degree}))
+
+    for level in ('center', 'circle'):
+        for degree in (2, 3):
+            filters = locations[level] | {'relationship': RELATIONSHIPS, 'degree': degree, 'approximate': True}
+            cases.append(('get_relative_counts', graph.get_relative_counts, (filters,), {'level': level, 'degree': degree, 'approximate': True}))
+
+    # the persistent result cache on its own: filled once here, outside the timings, then every
+    # repeat is a sqlite hit (the traversal cases above run with the cache off)
+    def cache_hit(f):
+        result_cache.enabled = True
+        try:
+            return graph.get_relative_counts(f)
+        finally:
+            result_cache.enabled = False
+
+    for level in ('box', 'circle'):
+        filters = locations[level] | {'relationship': RELATIONSHIPS, 'degree': 2}
+        cache_hit(filters)
+        cases.append(('get_relative_counts', lambda f=filters: cache_hit(f), (), {'level': level, 'degree': 2, 'cache': 'hit'}))
+
+    for level, location in locations.items():
+        for by in ('family_id', 'family_name'):
+            filters = location | {'degree': 2}
+            cases.append(('get_family_index', lambda f=filters, b=by: graph.get_family_index(f, by=b), (), {'level': level, 'by': by}))
+
+    for level, location in locations.items():
+        for role in ('principal', 'sub'):
+            filters = location | {'degree': 2}
+            cases.append(('get_coordinator_coverage', lambda f=filters, r=role: graph.get_coordinator_coverage(f, role=r), (), {'level': level, 'role': role}))
+        cases.append(('get_uncovered_influencers', graph.get_uncovered_influencers, (location,), {'level': level}))
+
+    for kind, text in {'national_no': sample['national_no'][:5], 'name': sample['name']}.items():
+        cases.append(('search_people', graph.search_people, (text,), {'kind': kind}))
+
+    for degree in (1, 2, 3):
+        filters = {'national_no': sample['national_no'], 'relationship': RELATIONSHIPS, 'degree': degree}
+        cases.append(('get_person_influence', graph.get_person_influence, (filters,), {'degree': degree}))
+
+    # the in-process engine keeps its state between calls, so a cold run forgets it (and the
+    # live-edge bank) before every repeat, not just the first
+    def forget(f, states=True):
+        if states:
+            graph.celf.clear_states()
+        shutil.rmtree(graph.LIVE_EDGES_DIR, ignore_errors=True)
+        return graph.run_clef(f)
+
+    for level in ('box', 'center'):
+        filters = locations[level] | {
+            'relationship': RELATIONSHIPS,
+            'degree': 2,
+            'seedSetSize': 10,
+            'monteCarloSimulations': 100,
+            'probability': 0.1,
+        }
+        cases.append(('run_clef', lambda f=filters: forget(f), (), {'level': level, 'degree': 2}))
+
+    # warm starts: a cold box, the box again from its live-edge bank only (as a fresh process
+    # would), the same box with more seeds, then its center seeded from the box's spreads
+    filters = locations['box'] | {'relationship': RELATIONSHIPS, 'degree': 2, 'seedSetSize': 10, 'monteCarloSimulations': 100, 'probability': 0.1}
+    cases.append(('run_clef', lambda f=filters: forget(f), (), {'level': 'box', 'degree': 2, 'warm_start': 'cold'}))
+    cases.append(('run_clef', lambda f=filters: (graph.celf.clear_states(), graph.run_clef(f)), (), {'level': 'box', 'degree': 2, 'warm_start': 'banked'}))
+    cases.append(('run_clef', graph.run_clef, (filters | {'seedSetSize': 20},), {'level': 'box', 'degree': 2, 'seeds': 20, 'warm_start': 'resumed'}))
+    filters = locations['center'] | {k: v for k, v in filters.items() if k not in locations['box']}
+    cases.append(('run_clef', lambda f=filters: forget(f, states=False), (), {'level': 'center', 'degree': 2, 'warm_start': 'seeded'}))
+
+    return cases
+
+
+def run_queries(recorder, repeat):
+    from utils import graph, result_cache
+
+    # run_build's warmer pre-fills the result cache: with it on, the timed traversals would be
+    # sqlite lookups and a regression would go unnoticed; the benchmark's calls are no demand either
+    result_cache.recording = False
+    result_cache.enabled = False
+
+    sample = sample_locations(graph)
+    cached = [graph.get_circles, graph.get_centers, graph.get_boxes, graph.get_location_names]
+
+    # cold open of the mapped snapshot, what a fresh worker pays on its first query
+    recorder.time('query', 'load_snapshot', graph.get_snapshot, repeat=repeat, clear=[graph.load_snapshot])
+
+    for name, fn, args, params in query_cases(graph, result_cache, sample):
+        recorder.time('query', name, lambda: fn(*args), params=params, repeat=repeat, clear=cached)
+
+
+# --------------------------------------------------------------------------------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('scale', help='10k, 100k, 1m, 10m or a number of people')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--skip-build', action='store_true', help='time queries against the graph already loaded')
+    parser.add_argument('--restart', action='store_true', help='keep the build script restarting neo4j between phases')
+    args = parser.parse_args()
+
+    load_dotenv()
+    n_people = resolve_scale(args.scale)
+    recorder = Recorder(args.scale, n_people, args.seed)
+
+    print(f"Benchmark run {recorder.base['run_id']} @ {recorder.base['git_commit']}: {n_people} people")
+    print('-' * 50)
+
+    raw_path, campaign_path = ensure_roll(n_people, args.seed)
+
+    try:
+        if not args.skip_build:
+            small_path, _ = ensure_roll(max(n_people // INGEST_SMALL_ROLL, 1), args.seed)
+            run_ingest(recorder, [small_path, raw_path])
+            run_build(recorder, raw_path, campaign_path, args.restart)
+        run_queries(recorder, args.repeat)
+    finally:
+        recorder.save()
+        compare_with_previous(recorder)
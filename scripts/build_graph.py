@@ -1,36 +1,156 @@
+import os
+import shutil
 import sys
+import numpy as np
 import polars as pl
-from neo4j import GraphDatabase
+import pyarrow as pa
 import subprocess
-import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from utils.connections import get_connection_manager, reset_connections
+from utils.kinship import connected_components, grouped_reach, to_index
+from utils.search import CHAR_MAP, DIACRITICS_PATTERN, GRAM_SIZE, JOINS, MAX_TOKEN_LENGTH, NON_NAME_PATTERN, write_search_index
+from utils.sharding import Shard, register_task, run_tasks
+from utils.snapshot import COORDINATOR_INDEX_FILE, FAMILY_INDEX_FILE, UNCOVERED_INDEX_FILE, open_snapshot, publish_snapshot, write_snapshot
+from utils.turnout import ELECTION_YEARS, NOT_VOTED_VALUES, VOTED_VALUES, popcount, smoothed_rate, turnout_rate
+
+DEFAULT_DB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'utils', 'db')
+WARM_CACHE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'warm_cache.py')
+KINSHIP_RELATIONSHIPS = ['FATHER', 'MOTHER', 'SPOUSE', 'SIBLING']
+EXPORT_CHUNK_SIZE = 1_000_000
+WRITE_BATCH_SIZE = 50_000
+HOTSPOT_MIN_SIZE = 1_000
+MAX_DEGREE = 3
+REACH_CHUNK_SEEDS = 200_000
+COORDINATOR_ROLES = {'principal': 'principal_coordinator', 'sub': 'sub_coordinator'}
+UNCOVERED_DEGREE = 2
+UNCOVERED_PER_LOCATION = 50
+SEARCH_CHUNK_SIZE = 1_000_000
+SEARCH_NAME_COLUMNS = ['full_name', 'first_name', 'father_name', 'grand_name', 'family_name']
+
+INGEST_DIR = os.path.join(DEFAULT_DB_DIR, 'ingest')
+# the raw roll is parsed a block of bytes at a time, then deduplicated one national_no hash
+# partition at a time; between them they set the ingest's peak memory, whatever the roll's size
+INGEST_BLOCK_BYTES = int(os.getenv('INGEST__BLOCK_BYTES', 4 * 2 ** 20))
+INGEST_PARTITION_ROWS = int(os.getenv('INGEST__PARTITION_ROWS', 100_000))
+
+# raw roll columns the build reads, with the types they are parsed as; anything else is ignored
+RAW_SCHEMA = {
+    'full_name': pl.Utf8,
+    'first_name': pl.Utf8,
+    'father_name': pl.Utf8,
+    'grand_name': pl.Utf8,
+    'family_name': pl.Utf8,
+    'national_no': pl.Utf8,
+    'father_national_no': pl.Utf8,
+    'mother_national_no': pl.Utf8,
+    'new_big_key': pl.Utf8,
+    'dob': pl.Utf8,
+    'age': pl.Utf8,
+    'religion': pl.Utf8,
+    'address': pl.Utf8,
+    'circle': pl.Utf8,
+    'center': pl.Utf8,
+    'box': pl.Utf8,
+    'primary_key': pl.Utf8,
+    'is_unique_shrink_name': pl.Int64,
+    'unmatched': pl.Int64,
+}
+RAW_PERSON_COLUMNS = [c for c in RAW_SCHEMA if c not in ('is_unique_shrink_name', 'unmatched')]
+
+LOCATION_LEVELS = {
+    'circle': ['circle'],
+    'center': ['circle', 'center'],
+    'box': ['circle', 'center', 'box'],
+}
+PERSON_LOCATION_SCHEMA = {
+    'is_missing': pl.Boolean,
+    'circle': pl.Utf8,
+    'center': pl.Utf8,
+    'box': pl.Utf8,
+}
+PERSON_FAMILY_SCHEMA = PERSON_LOCATION_SCHEMA | {
+    'family_id': pl.Int64,
+    'family_size': pl.Int64,
+    'family_name': pl.Utf8,
+    'principal_coordinator': pl.Utf8,
+    'sub_coordinator': pl.Utf8,
+}
+PERSON_SNAPSHOT_SCHEMA = {
+    'national_no': pl.Utf8,
+    'full_name': pl.Utf8,
+    'first_name': pl.Utf8,
+    'father_name': pl.Utf8,
+    'grand_name': pl.Utf8,
+    'family_name': pl.Utf8,
+    'primary_key': pl.Utf8,
+    'phone_number': pl.Utf8,
+    'principal_coordinator': pl.Utf8,
+    'sub_coordinator': pl.Utf8,
+    'circle': pl.Utf8,
+    'center': pl.Utf8,
+    'box': pl.Utf8,
+    'is_missing': pl.Boolean,
+    'family_id': pl.Int64,
+    'family_size': pl.Int64,
+    'voted_mask': pl.Int64,
+    'known_mask': pl.Int64,
+}
+SNAPSHOT_ARRAY_COLUMNS = ['is_missing', 'family_id', 'family_size', 'voted_mask', 'known_mask']
 
 def restart_neo4j():
     print("Restarting Neo4j ...")
     # command = ['sudo', 'neo4j', 'restart']
     command = ['sudo', 'systemctl', 'restart', 'neo4j.service']
     subprocess.run(command, check=True)
-    time.sleep(30)
+
+    # pooled connections died with the old server; block until the new one answers
+    reset_connections()
 
 def init_constraints(n4j__uri: str, n4j__user: str, n4j__password: str):
-    driver = GraphDatabase.driver(n4j__uri, auth=(n4j__user, n4j__password))
+    driver = get_connection_manager(n4j__uri, n4j__user, n4j__password).driver()
 
     # # Define the Cypher queries for constraints
     with driver.session() as session: # type: ignore
         result = session.run("CREATE CONSTRAINT IF NOT EXISTS FOR (b:Box) REQUIRE (b.name, b.center, b.circle) IS UNIQUE")
 
 
+def pack_election_history(campaign: pl.DataFrame):
+    # one bit per ELECTION_YEARS entry: voted_mask = voted that year, known_mask = has a record at all;
+    # anything that is not a clear yes / no (e.g. 'missing') is left unknown
+    values = {y: pl.col(y).str.strip_chars().str.to_lowercase() for y in ELECTION_YEARS}
+    return campaign.with_columns(
+        voted_mask=pl.sum_horizontal(
+            v.is_in(VOTED_VALUES).fill_null(False).cast(pl.Int64) * (1 << i) for i, v in enumerate(values.values())
+        ),
+        known_mask=pl.sum_horizontal(
+            v.is_in(VOTED_VALUES + NOT_VOTED_VALUES).fill_null(False).cast(pl.Int64) * (1 << i) for i, v in enumerate(values.values())
+        ),
+    )
+
 def update_campaign_data(
     src_file: str,
     n4j__uri: str,
     n4j__user: str,
     n4j__password: str,
+    ingest_dir: str = INGEST_DIR,
 ):
     print(f"Updating campaign data from {src_file} ...")
-    driver = GraphDatabase.driver(n4j__uri, auth=(n4j__user, n4j__password))
+    driver = get_connection_manager(n4j__uri, n4j__user, n4j__password).driver()
+
+    # election history is packed into two small ints per person here, once, so turnout analytics
+    # never have to read or parse the per-year strings again
+    os.makedirs(ingest_dir, exist_ok=True)
+    campaign = pl.read_csv(src_file, infer_schema=False)
+    campaign = campaign.with_columns(pl.lit(None, dtype=pl.Utf8).alias(y) for y in ELECTION_YEARS if y not in campaign.columns)
+    campaign = pack_election_history(campaign)
+    staged_file = os.path.join(ingest_dir, 'campaign.csv')
+    campaign.write_csv(staged_file)
+    print(f"> turnout over {len(ELECTION_YEARS)} elections: {turnout_rate(campaign['voted_mask'].to_numpy(), campaign['known_mask'].to_numpy()):.1%}")
 
     dest_file = f'/var/lib/neo4j/import/staged.csv'
     
-    command = ['sudo', 'cp', src_file, dest_file]
+    command = ['sudo', 'cp', staged_file, dest_file]
     subprocess.run(command, check=True)
 
     with driver.session() as session: # type: ignore
@@ -47,82 +167,177 @@ def update_campaign_data(
                 p.Y_2016 = row.Y_2016,
                 p.Y_2020 = row.Y_2020,
                 p.Y_2021 = row.Y_2021,
-                p.Y_2024 = row.Y_2024
+                p.Y_2024 = row.Y_2024,
+                p.voted_mask = toInteger(row.voted_mask),
+                p.known_mask = toInteger(row.known_mask)
         """)
         
     command = ['sudo', 'rm', dest_file]
     subprocess.run(command, check=True)
+    os.remove(staged_file)
+
+def csv_blocks(path: str, block_bytes: int):
+    # whole records only: a block ends at the last newline outside quotes, the rest carries over;
+    # scan_csv would map the whole file, and its pages count against the build's memory
+    with open(path, 'rb') as f:
+        header, rest = f.readline(), b''
+        while True:
+            data = f.read(block_bytes)
+            buffer = rest + data
+            if not data:
+                if buffer.strip():
+                    yield header + buffer
+                return
+            cut = buffer.rfind(b'\n')
+            while cut >= 0 and buffer.count(b'"', 0, cut) % 2:
+                cut = buffer.rfind(b'\n', 0, cut)
+            if cut < 0:
+                rest = buffer
+                continue
+            yield header + buffer[:cut + 1]
+            rest = buffer[cut + 1:]
+
+def count_lines(path: str, block_bytes: int):
+    with open(path, 'rb') as f:
+        return sum(block.count(b'\n') for block in iter(lambda: f.read(block_bytes), b''))
+
+class PartitionWriter:
+    # rows spilled to one arrow file per national_no hash partition, a piece at a time, so each
+    # partition can later be read back on its own
+    def __init__(self, directory: str, num_partitions: int, schema: dict):
+        os.makedirs(directory)
+        self.paths = [os.path.join(directory, f'part-{i:05d}.arrow') for i in range(num_partitions)]
+        arrow_schema = pl.DataFrame(schema=schema).to_arrow().schema
+        self.writers = [pa.ipc.new_file(path, arrow_schema) for path in self.paths]
+
+    def write(self, df: pl.DataFrame, column: str = 'national_no'):
+        df = df.with_columns(partition=pl.col(column).hash() % len(self.writers))
+        for (i,), piece in df.partition_by('partition', as_dict=True, include_key=False).items():
+            self.writers[i].write_table(piece.to_arrow())
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+        return self.paths
+
+def prepare_raw(
+    raw_df_path: str,
+    ingest_dir: str = INGEST_DIR,
+    block_bytes: int = INGEST_BLOCK_BYTES,
+    partition_rows: int = INGEST_PARTITION_ROWS,
+):
+    # a block of the roll at a time into national_no hash partitions, then one partition at a
+    # time: neither the roll nor its dedup keys ever sit in memory as a whole, so block_bytes and
+    # partition_rows set the peak memory, not the size of the roll
+    print(f"Preparing data from {raw_df_path} ...")
+    os.makedirs(ingest_dir, exist_ok=True)
+
+    with open(raw_df_path, 'rb') as f:
+        header = pl.read_csv(f.readline(), infer_schema=False).columns
+    missing_columns = [c for c in RAW_SCHEMA if c not in header]
+    if missing_columns:
+        raise ValueError(f"{raw_df_path} is missing columns {missing_columns}")
+
+    # a row is dropped when any check fails; nulls fail
+    checks = {
+        'not_unique_shrink_name': pl.col('is_unique_shrink_name') != 1,
+        'unmatched': pl.col('unmatched') != 0,
+        'missing_national_no': pl.col('national_no') == 'missing',
+    }
+    passed = ~pl.any_horizontal([check.fill_null(True) for check in checks.values()])
+
+    # every output is a directory of partition files, read back with pl.scan_parquet(path)
+    paths = {name: os.path.join(ingest_dir, name) for name in ['persons', 'missing_fathers', 'missing_mothers']}
+    spill_dir = os.path.join(ingest_dir, 'spill')
+    for path in [*paths.values(), spill_dir]:
+        shutil.rmtree(path, ignore_errors=True)
+    for path in paths.values():
+        os.makedirs(path)
+    num_partitions = max(1, -(-count_lines(raw_df_path, block_bytes) // partition_rows))
+    part_file = lambda i: f'part-{i:05d}.parquet'
+
+    # the rows that pass, in file order within each partition
+    counts = dict.fromkeys(['rows', *checks, 'passed'], 0)
+    spill = PartitionWriter(os.path.join(spill_dir, 'passed'), num_partitions, {'row': pl.get_index_type()} | {c: RAW_SCHEMA[c] for c in RAW_PERSON_COLUMNS})
+    for block in csv_blocks(raw_df_path, block_bytes):
+        rows = (
+            pl.read_csv(block, columns=list(RAW_SCHEMA), schema_overrides=RAW_SCHEMA, infer_schema=False)
+            .with_row_index('row', offset=counts['rows'])
+        )
+        del block
+        counts['rows'] += len(rows)
+        for name, value in rows.select(**{name: check.fill_null(True).sum() for name, check in checks.items()}).row(0, named=True).items():
+            counts[name] += value
+        rows = rows.filter(passed).select('row', *RAW_PERSON_COLUMNS)
+        counts['passed'] += len(rows)
+        spill.write(rows)
+    passed_paths = spill.close()
+
+    # drop duplicate national_no keep first (in file order): every copy of a number is in the same
+    # partition; the parents each partition references are spilled by their own number
+    parents = {parent: PartitionWriter(os.path.join(spill_dir, parent), num_partitions, {'national_no': pl.Utf8}) for parent in ['father', 'mother']}
+    for i, path in enumerate(passed_paths):
+        persons = pl.read_ipc(path).unique('national_no', keep='first', maintain_order=True).select(RAW_PERSON_COLUMNS)
+        persons.write_parquet(os.path.join(paths['persons'], part_file(i)))
+        for parent, spill in parents.items():
+            spill.write(
+                persons.select(national_no=pl.col(f'{parent}_national_no'))
+                .filter((pl.col('national_no') != 'missing') & (pl.col('national_no').str.len_chars() == 10))
+                .unique()
+            )
+        del persons
+    parent_paths = {parent: spill.close() for parent, spill in parents.items()}
+
+    # parents referenced by someone but not in the roll themselves, partition by partition
+    for i in range(num_partitions):
+        in_roll = pl.read_parquet(os.path.join(paths['persons'], part_file(i)), columns=['national_no'])
+        for parent in ['father', 'mother']:
+            (
+                pl.read_ipc(parent_paths[parent][i])
+                .unique()
+                .join(in_roll, on='national_no', how='anti')
+                .write_parquet(os.path.join(paths[f'missing_{parent}s'], part_file(i)))
+            )
+    shutil.rmtree(spill_dir)
+
+    for name in paths:
+        counts[name] = pl.scan_parquet(paths[name]).select(pl.len()).collect().item()
+    counts['duplicate_national_no'] = counts['passed'] - counts['persons']
+
+    print(f"Rows read: {counts['rows']} ({num_partitions} partitions)")
+    for name in [*checks, 'duplicate_national_no']:
+        print(f"> dropped {name}: {counts[name]}")
+    print(f"Data loaded: {counts['persons']} records")
+    print(f"Missing fathers: {counts['missing_fathers']}")
+    print(f"Missing mothers: {counts['missing_mothers']}")
+
+    return paths, counts
+
+def staged_chunks(path: str, chunk_size: int):
+    total = pl.scan_parquet(path).select(pl.len()).collect().item()
+    for start in range(0, total, chunk_size):
+        yield start, min(start + chunk_size, total), pl.scan_parquet(path).slice(start, chunk_size).collect()
 
 def load_from_raw(
   raw_df_path: str,
   n4j__uri: str,
   n4j__user: str,
   n4j__password: str,
-  csv_chunk_size: int = 100_000      
+  csv_chunk_size: int = 100_000,
+  ingest_dir: str = INGEST_DIR,
 ):
-    driver = GraphDatabase.driver(n4j__uri, auth=(n4j__user, n4j__password))
+    driver = get_connection_manager(n4j__uri, n4j__user, n4j__password).driver()
     CHUNK_SIZE = csv_chunk_size
 
     # load data
     # ----------------------------------------------------------------------------------------------
-    print(f"Loading data from {raw_df_path} ...")
-    df = (
-        pl.read_csv(raw_df_path)
-        .filter(pl.col('is_unique_shrink_name') & pl.col('unmatched') == 0)
-        .filter((pl.col('national_no') != 'missing'))
-        .select([
-            'full_name',
-            'first_name',
-            'father_name',
-            'grand_name',
-            'family_name',
-            'national_no',
-            'father_national_no',
-            'mother_national_no',
-            'new_big_key',
-            'dob',
-            'age',
-            'religion',
-            'address',
-            'circle',
-            'center',
-            'box',
-            'primary_key',
-        ])
-        # drop duplicate national_no keep first
-        .unique('national_no', keep='first')
-    )
-    print(f"Data loaded: {len(df)} records")
-
-    print(f"Checking for missing fathers and mothers ...")
-
-    father_nos = df['father_national_no'].drop_nulls().unique().to_list()
-    mother_nos = df['mother_national_no'].drop_nulls().unique().to_list()
-    nos = df['national_no'].drop_nulls().unique().to_list()
-
-    missing_fathers = list(set(father_nos) - set(nos))
-    missing_mothers = list(set(mother_nos) - set(nos))
-
-    # create dataframe with national_no for missing fathers and mothers
-    missing_fathers_df = (
-        pl.DataFrame({ 'national_no': missing_fathers})
-        .filter(pl.col('national_no') != 'missing')
-        .filter(pl.col('national_no').cast(pl.Utf8).str.len_chars() == 10)
-    )
-    missing_mothers_df = (
-        pl.DataFrame({'national_no': missing_mothers})
-        .filter(pl.col('national_no') != 'missing')
-        .filter(pl.col('national_no').cast(pl.Utf8).str.len_chars() == 10)
-    )
-    print(f"Missing fathers: {len(missing_fathers_df)}")
-    print(f"Missing mothers: {len(missing_mothers_df)}")
+    paths, counts = prepare_raw(raw_df_path, ingest_dir)
 
-
-    df_cirlce_center_box = df.select(['center','box', 'circle']).unique()
+    df_cirlce_center_box = pl.scan_parquet(paths['persons']).select(['center','box', 'circle']).unique().collect()
     # ----------------------------------------------------------------------------------------------
 
     total_nodes = (
-        len(df) + len(missing_fathers_df) + len(missing_mothers_df)
+        counts['persons'] + counts['missing_fathers'] + counts['missing_mothers']
         + df_cirlce_center_box.select(['circle']).n_unique()
         + df_cirlce_center_box.select(['center', 'circle']).n_unique()
         + df_cirlce_center_box.select(['box', 'center', 'circle']).n_unique()
@@ -157,17 +372,16 @@ def load_from_raw(
     # build person nodes
     # ----------------------------------------------------------------------------------------------
     restart_neo4j()
-    driver = GraphDatabase.driver(n4j__uri, auth=(n4j__user, n4j__password))
+    driver = get_connection_manager(n4j__uri, n4j__user, n4j__password).driver()
 
     print(f"Building person nodes ...")
-    for start in range(0, len(df), CHUNK_SIZE):
-        stop = start + CHUNK_SIZE if start + CHUNK_SIZE < len(df) else len(df)
+    for start, stop, chunk in staged_chunks(paths['persons'], CHUNK_SIZE):
         print(f"> Processing {start}:{stop} ...")
 
         src_file = f'staged.csv'
         dest_file = f'/var/lib/neo4j/import/staged.csv'
         
-        df[start:stop].write_csv(src_file)
+        chunk.write_csv(src_file)
         command = ['sudo', 'mv', src_file, dest_file]
         subprocess.run(command, check=True)
         
@@ -215,18 +429,17 @@ def load_from_raw(
     # handle non-matching fathers and mothers
     # ----------------------------------------------------------------------------------------------
     restart_neo4j()
-    driver = GraphDatabase.driver(n4j__uri, auth=(n4j__user, n4j__password))
+    driver = get_connection_manager(n4j__uri, n4j__user, n4j__password).driver()
     
     print(f"Handling non-matching fathers and mothers ...")
-    for target_df in [missing_fathers_df, missing_mothers_df]:
-        for start in range(0, len(target_df), CHUNK_SIZE):
-            stop = start + CHUNK_SIZE if start + CHUNK_SIZE < len(target_df) else len(target_df)
+    for target_path in [paths['missing_fathers'], paths['missing_mothers']]:
+        for start, stop, chunk in staged_chunks(target_path, CHUNK_SIZE):
             print(f"> Processing {start}:{stop} ...")
 
             src_file = f'staged.csv'
             dest_file = f'/var/lib/neo4j/import/staged.csv'
             
-            target_df[start:stop].write_csv(src_file)
+            chunk.write_csv(src_file)
             command = ['sudo', 'mv', src_file, dest_file]
             subprocess.run(command, check=True)
             
@@ -273,7 +486,7 @@ def load_from_raw(
     # build indexes
     # ----------------------------------------------------------------------------------------------
     restart_neo4j()
-    driver = GraphDatabase.driver(n4j__uri, auth=(n4j__user, n4j__password))
+    driver = get_connection_manager(n4j__uri, n4j__user, n4j__password).driver()
 
     with driver.session() as session: # type: ignore
         result = session.run("CREATE INDEX box__name_index IF NOT EXISTS FOR (b:Box) ON (b.name)")
@@ -293,7 +506,7 @@ def create_relationships(n4j__uri: str, n4j__user: str, n4j__password: str):
 
     # create father relationships
     restart_neo4j()
-    driver = GraphDatabase.driver(n4j__uri, auth=(n4j__user, n4j__password))
+    driver = get_connection_manager(n4j__uri, n4j__user, n4j__password).driver()
 
     print(f"Creating father relationships ...")
     with driver.session() as session: # type: ignore
@@ -312,7 +525,7 @@ def create_relationships(n4j__uri: str, n4j__user: str, n4j__password: str):
         
     # create mother relationships
     restart_neo4j()
-    driver = GraphDatabase.driver(n4j__uri, auth=(n4j__user, n4j__password))
+    driver = get_connection_manager(n4j__uri, n4j__user, n4j__password).driver()
     
     print(f"Creating mother relationships ...")
     with driver.session() as session: # type: ignore
@@ -334,7 +547,7 @@ def create_relationships(n4j__uri: str, n4j__user: str, n4j__password: str):
     restart_neo4j()
     
     print(f"Creating spouse relationships ...")
-    driver = GraphDatabase.driver(n4j__uri, auth=(n4j__user, n4j__password))
+    driver = get_connection_manager(n4j__uri, n4j__user, n4j__password).driver()
     with driver.session() as session: # type: ignore
         result = session.run("""
             CALL apoc.periodic.iterate(
@@ -352,7 +565,7 @@ def create_relationships(n4j__uri: str, n4j__user: str, n4j__password: str):
 
     # create sibling relationships
     restart_neo4j()
-    driver = GraphDatabase.driver(n4j__uri, auth=(n4j__user, n4j__password))
+    driver = get_connection_manager(n4j__uri, n4j__user, n4j__password).driver()
     print(f"Creating sibling relationships ...")
     with driver.session() as session: # type: ignore
         result = session.run("""
@@ -372,7 +585,7 @@ def create_relationships(n4j__uri: str, n4j__user: str, n4j__password: str):
     # create votes at box level
     restart_neo4j()
     print(f"Creating vote at box relationships ...")
-    driver = GraphDatabase.driver(n4j__uri, auth=(n4j__user, n4j__password))
+    driver = get_connection_manager(n4j__uri, n4j__user, n4j__password).driver()
     with driver.session() as session: # type: ignore
         result = session.run("""
             CALL apoc.periodic.iterate(
@@ -390,12 +603,591 @@ def create_relationships(n4j__uri: str, n4j__user: str, n4j__password: str):
     # ----------------------------------------------------------------------------------------------
     restart_neo4j()
     
+def export_rows(driver, query: str, schema: dict, **params):
+    # stream a query into a polars frame without holding every record as a python object
+    chunks = []
+    rows = []
+    with driver.session() as session: # type: ignore
+        for record in session.run(query, **params):
+            rows.append(record.values())
+            if len(rows) >= EXPORT_CHUNK_SIZE:
+                chunks.append(pl.DataFrame(rows, schema=schema, orient='row'))
+                rows = []
+    chunks.append(pl.DataFrame(rows, schema=schema, orient='row'))
+
+    return pl.concat(chunks)
+
+def export_persons(driver, schema: dict = PERSON_LOCATION_SCHEMA):
+    return export_rows(
+        driver,
+        f"""
+            MATCH (p:Person)
+            RETURN id(p), {', '.join(f'p.{c}' for c in schema)}
+        """,
+        {'node_id': pl.Int64} | schema,
+    ).sort('node_id')
+
+def export_kinship_edges(driver, relationships=KINSHIP_RELATIONSHIPS):
+    return export_rows(
+        driver,
+        f"""
+            MATCH (a:Person)-[r:{'|'.join(relationships)}]->(b:Person)
+            RETURN id(a), id(b), type(r)
+        """,
+        {'src': pl.Int64, 'dst': pl.Int64, 'type': pl.Utf8},
+    )
+
+def write_rows(driver, query: str, df: pl.DataFrame, batch_size: int = WRITE_BATCH_SIZE):
+    with driver.session() as session: # type: ignore
+        for start in range(0, len(df), batch_size):
+            session.run(query, rows=df[start:start + batch_size].to_dicts()).consume()
+
+def compute_family_components(
+    n4j__uri: str,
+    n4j__user: str,
+    n4j__password: str,
+    hotspot_min_size: int = HOTSPOT_MIN_SIZE,
+):
+    driver = get_connection_manager(n4j__uri, n4j__user, n4j__password).driver()
+
+    # export the person and kinship edge tables
+    # ----------------------------------------------------------------------------------------------
+    print(f"Exporting persons and kinship edges ...")
+    persons = export_persons(driver)
+    edges = export_kinship_edges(driver)
+    print(f"Persons: {len(persons)}, kinship edges: {len(edges)}")
+    # ----------------------------------------------------------------------------------------------
+
+    # union-find over FATHER / MOTHER / SPOUSE / SIBLING
+    # ----------------------------------------------------------------------------------------------
+    print(f"Computing family components ...")
+    node_ids = persons['node_id'].to_numpy()
+    labels = connected_components(
+        len(node_ids),
+        to_index(node_ids, edges['src'].to_numpy()),
+        to_index(node_ids, edges['dst'].to_numpy()),
+    )
+
+    # a family is identified by the neo4j id of its smallest member
+    persons = persons.with_columns(family_id=pl.Series(node_ids[labels]))
+
+    voters = persons.filter(~pl.col('is_missing').fill_null(False))
+    families = (
+        persons.group_by('family_id').agg(size=pl.len())
+        .join(
+            voters.group_by('family_id').agg(
+                num_voters=pl.len(),
+                num_circles=pl.col('circle').n_unique(),
+                num_centers=pl.struct('circle', 'center').n_unique(),
+                num_boxes=pl.struct('circle', 'center', 'box').n_unique(),
+                main_circle=pl.col('circle').mode().sort().first(),
+            ),
+            on='family_id',
+            how='left',
+        )
+        .with_columns(
+            pl.col('num_voters', 'num_circles', 'num_centers', 'num_boxes').fill_null(0),
+            is_hotspot=pl.col('size') >= hotspot_min_size,
+        )
+        .sort('size', descending=True)
+    )
+    persons = persons.join(families.select('family_id', 'size'), on='family_id')
+
+    print(f"Families: {len(families)} ({families.filter(pl.col('size') > 1).height} with more than one member)")
+    print(f"Largest families: {families['size'].head(5).to_list()}")
+    print(f"Hotspots (size >= {hotspot_min_size}): {families['is_hotspot'].sum()}")
+    # ----------------------------------------------------------------------------------------------
+
+    # persist family_id on every person and a Family node per multi-member component
+    # ----------------------------------------------------------------------------------------------
+    print(f"Writing family ids ...")
+    with driver.session() as session: # type: ignore
+        session.run("MATCH (f:Family) CALL { WITH f DELETE f } IN TRANSACTIONS OF 50000 ROWS").consume()
+        session.run("CREATE CONSTRAINT family__family_id IF NOT EXISTS FOR (f:Family) REQUIRE f.family_id IS UNIQUE").consume()
+        session.run("CREATE INDEX person__family_id_index IF NOT EXISTS FOR (n:Person) ON (n.family_id)").consume()
+
+    write_rows(
+        driver,
+        """
+            UNWIND $rows AS row
+            MATCH (p) WHERE id(p) = row.node_id
+            SET p.family_id = row.family_id, p.family_size = row.size
+        """,
+        persons.select('node_id', 'family_id', 'size'),
+    )
+    write_rows(
+        driver,
+        """
+            UNWIND $rows AS row
+            CREATE (f:Family)
+            SET f = row
+        """,
+        families.filter(pl.col('size') > 1),
+    )
+    print(f"Family components written ...")
+    # ----------------------------------------------------------------------------------------------
+
+    return families
+
+def write_ipc(df: pl.DataFrame, path: str):
+    # readers memory-map these files, so swap the new one in atomically
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    df.write_ipc(tmp_path)
+    os.replace(tmp_path, path)
+
+def build_snapshot(
+    n4j__uri: str,
+    n4j__user: str,
+    n4j__password: str,
+    db_dir: str = DEFAULT_DB_DIR,
+    hotspot_min_size: int = HOTSPOT_MIN_SIZE,
+    publish: bool = True,
+):
+    driver = get_connection_manager(n4j__uri, n4j__user, n4j__password).driver()
+
+    # export persons (with the box they vote at), boxes and kinship edges
+    # ----------------------------------------------------------------------------------------------
+    print(f"Exporting snapshot tables ...")
+    persons = export_rows(
+        driver,
+        f"""
+            MATCH (p:Person)
+            OPTIONAL MATCH (p)-[:VOTES_AT]->(b:Box)
+            RETURN id(p), {', '.join(f'p.{c}' for c in PERSON_SNAPSHOT_SCHEMA)}, elementId(b)
+        """,
+        {'node_id': pl.Int64} | PERSON_SNAPSHOT_SCHEMA | {'box_id': pl.Utf8},
+    ).sort('node_id')
+    boxes = export_rows(
+        driver,
+        """
+            MATCH (c:Circle)-[:HAS_CENTER]->(ce:Center)-[:HAS_BOX]->(b:Box)
+            RETURN elementId(b), b.name, elementId(ce), ce.name, elementId(c), c.name
+        """,
+        {'box_id': pl.Utf8, 'box': pl.Utf8, 'center_id': pl.Utf8, 'center': pl.Utf8, 'circle_id': pl.Utf8, 'circle': pl.Utf8},
+    ).sort('circle', 'center', 'box').with_row_index('box_idx')
+    edges = export_kinship_edges(driver)
+    print(f"Persons: {len(persons)}, boxes: {len(boxes)}, kinship edges: {len(edges)}")
+    # ----------------------------------------------------------------------------------------------
+
+    # dense node indices, then hand everything to the snapshot writer
+    # ----------------------------------------------------------------------------------------------
+    node_ids = persons['node_id'].to_numpy()
+    src = to_index(node_ids, edges['src'].to_numpy())
+    dst = to_index(node_ids, edges['dst'].to_numpy())
+    types = edges['type'].to_numpy()
+
+    box_idx = (
+        persons.select('box_id')
+        .join(boxes.select('box_id', 'box_idx'), on='box_id', how='left', maintain_order='left')
+        ['box_idx'].fill_null(-1).to_numpy()
+    )
+    family_size = persons['family_size'].fill_null(1).to_numpy()
+
+    path = write_snapshot(
+        db_dir,
+        node_ids,
+        persons.select(c for c in PERSON_SNAPSHOT_SCHEMA if c not in SNAPSHOT_ARRAY_COLUMNS).to_arrow(),
+        {r: (src[types == r], dst[types == r]) for r in KINSHIP_RELATIONSHIPS},
+        boxes.drop('box_idx').to_arrow(),
+        box_idx,
+        arrays={
+            'is_missing': persons['is_missing'].fill_null(False).to_numpy(),
+            'family_id': persons['family_id'].fill_null(-1).to_numpy(),
+            'family_size': family_size,
+            'is_hotspot': family_size >= hotspot_min_size,
+            # election history bitmasks, see utils.turnout; 0 = no record (e.g. no campaign data yet)
+            'voted_mask': persons['voted_mask'].fill_null(0).cast(pl.UInt8).to_numpy(),
+            'known_mask': persons['known_mask'].fill_null(0).cast(pl.UInt8).to_numpy(),
+        },
+        publish=publish,
+    )
+    print(f"Snapshot written: {path}{'' if publish else ' (not published yet)'}")
+    # ----------------------------------------------------------------------------------------------
+
+    return path
+
+def merge_family_index(frames: list):
+    return (
+        pl.concat(frames, how='vertical_relaxed')
+        .sort(
+            ['level', 'circle', 'center', 'box', 'num_voters', 'family_id'],
+            descending=[False, False, False, False, True, False],
+        )
+    )
+
+def shard_frame(shard: Shard, columns: list):
+    return pl.from_arrow(shard.persons(columns)).with_columns(
+        is_missing=pl.Series(shard.array('is_missing')),
+        family_id=pl.Series(shard.array('family_id')),
+        family_size=pl.Series(shard.array('family_size')),
+        votes=pl.Series(popcount(shard.array('voted_mask'))),
+        records=pl.Series(popcount(shard.array('known_mask'))),
+        is_core=pl.Series(shard.is_core),
+    )
+
+def location_voters(persons: pl.DataFrame, keys: list):
+    return (
+        persons.filter(pl.col('is_core') & ~pl.col('is_missing').fill_null(False))
+        .group_by(keys).agg(location_voters=pl.len())
+    )
+
+def chunked_reach(offsets, targets, member_groups, member_nodes, n_groups: int, max_degree: int, counted=None):
+    # grouped_reach over whole groups, about REACH_CHUNK_SEEDS seeds at a time to bound memory;
+    # members must be sorted by group
+    reach = np.zeros((n_groups, max_degree), dtype=np.int64)
+    lo = 0
+    while lo < len(member_groups):
+        first = member_groups[lo]
+        last = member_groups[min(lo + REACH_CHUNK_SEEDS, len(member_groups)) - 1]
+        hi = int(np.searchsorted(member_groups, last, side='right'))
+        chunk = grouped_reach(offsets, targets, member_groups[lo:hi] - first, member_nodes[lo:hi], max_degree, counted)
+        reach[first:first + len(chunk)] = chunk
+        lo = hi
+    return reach
+
+@register_task('family_index', max_degree=MAX_DEGREE, relationships=KINSHIP_RELATIONSHIPS, merge=merge_family_index)
+def family_index_shard(shard: Shard, max_degree: int = MAX_DEGREE):
+    persons = shard_frame(shard, ['circle', 'center', 'box', 'family_name', 'principal_coordinator', 'sub_coordinator'])
+    # families are smoothed towards the whole roll's turnout, not this circle's
+    prior = turnout_rate(shard.snapshot.arrays['voted_mask'], shard.snapshot.arrays['known_mask'])
+
+    # voters of this circle in multi-member families; a family of one never dominates anything,
+    # and halo nodes are only there to be reached
+    voters = (
+        persons.with_row_index('idx')
+        .filter(pl.col('is_core') & ~pl.col('is_missing').fill_null(False) & (pl.col('family_size') > 1))
+        .with_columns(
+            is_covered=(pl.col('principal_coordinator') != 'missing') | (pl.col('sub_coordinator') != 'missing'),
+        )
+    )
+
+    frames = []
+    for level, keys in LOCATION_LEVELS.items():
+        groups = (
+            voters.group_by(keys + ['family_id'])
+            .agg(
+                family_name=pl.col('family_name').mode().sort().first(),
+                family_size=pl.col('family_size').first(),
+                num_voters=pl.len(),
+                num_covered=pl.col('is_covered').sum(),
+                num_principal_coordinators=pl.col('principal_coordinator').filter(pl.col('principal_coordinator') != 'missing').n_unique(),
+                num_votes=pl.col('votes').sum(),
+                num_records=pl.col('records').sum(),
+            )
+            .sort(keys + ['family_id'])
+            .with_row_index('group')
+        )
+        members = voters.join(groups.select(keys + ['family_id', 'group']), on=keys + ['family_id']).sort('group')
+
+        # k-hop reach of each (location, family)
+        reach = chunked_reach(
+            shard.offsets, shard.targets,
+            members['group'].to_numpy().astype(np.int64), members['idx'].to_numpy().astype(np.int64),
+            len(groups), max_degree,
+        )
+
+        frames.append(
+            groups
+            .with_columns(
+                level=pl.lit(level),
+                **{c: pl.lit('') for c in ['center', 'box'] if c not in keys},
+                **{f'reach_{k + 1}': pl.Series(reach[:, k]) for k in range(max_degree)},
+            )
+            .join(location_voters(persons, keys), on=keys)
+            .with_columns(
+                voter_share=pl.col('num_voters') / pl.col('location_voters'),
+                coverage=pl.col('num_covered') / pl.col('num_voters'),
+                turnout=smoothed_rate(pl.col('num_votes'), pl.col('num_records'), prior),
+            )
+            .select(
+                'level', 'circle', 'center', 'box', 'family_id', 'family_name', 'family_size',
+                'num_voters', 'location_voters', 'voter_share',
+                *[f'reach_{k + 1}' for k in range(max_degree)],
+                'num_covered', 'coverage', 'num_principal_coordinators',
+                'num_votes', 'num_records', 'turnout',
+            )
+        )
+
+    return pl.concat(frames, how='vertical_relaxed')
+
+def build_family_index(
+    db_dir: str = DEFAULT_DB_DIR,
+    workers: int = None,
+    build_id: str = None,
+):
+    # one shard per circle, read from the snapshot just written, no second export from neo4j; the
+    # index is written into that snapshot, so the app always reads the one matching its build
+    print(f"Building family index ...")
+    index = run_tasks(db_dir, ['family_index'], workers, build_id=build_id)['family_index']
+    write_ipc(index, os.path.join(open_snapshot(db_dir, build_id).path, FAMILY_INDEX_FILE))
+    for level, rows in index.group_by('level', maintain_order=True).len().iter_rows():
+        print(f"> {level}: {rows} (location, family) rows")
+    print(f"Family index written: {len(index)} rows")
+
+    return index
+
+def coordinator_groups(voters: pl.DataFrame, keys: list):
+    # one group per (location, coordinator); members sorted by group for chunked_reach
+    groups = (
+        voters.group_by(keys + ['role', 'coordinator'])
+        .agg(num_voters=pl.len(), num_families=pl.col('family_id').n_unique())
+        .sort(keys + ['role', 'coordinator'])
+        .with_row_index('group')
+    )
+    members = voters.join(groups.select(keys + ['role', 'coordinator', 'group']), on=keys + ['role', 'coordinator']).sort('group')
+    return groups, members['group'].to_numpy().astype(np.int64), members['idx'].to_numpy().astype(np.int64)
+
+def assigned_voters(persons: pl.DataFrame):
+    # a voter counts once for their principal and once for their sub coordinator
+    voters = persons.with_row_index('idx').filter(pl.col('is_core') & ~pl.col('is_missing').fill_null(False))
+    return pl.concat([
+        voters.filter(pl.col(column).is_not_null() & (pl.col(column) != 'missing'))
+        .with_columns(role=pl.lit(role), coordinator=pl.col(column))
+        for role, column in COORDINATOR_ROLES.items()
+    ])
+
+def merge_coordinator_index(frames: list):
+    return (
+        pl.concat(frames, how='vertical_relaxed')
+        .sort(
+            ['level', 'circle', 'center', 'box', 'role', 'num_voters', 'coordinator'],
+            descending=[False, False, False, False, False, True, False],
+        )
+    )
+
+@register_task('coordinator_coverage', max_degree=MAX_DEGREE, relationships=KINSHIP_RELATIONSHIPS, merge=merge_coordinator_index)
+def coordinator_coverage_shard(shard: Shard, max_degree: int = MAX_DEGREE):
+    persons = shard_frame(shard, ['circle', 'center', 'box', 'principal_coordinator', 'sub_coordinator'])
+    voters = assigned_voters(persons)
+
+    frames = []
+    for level, keys in LOCATION_LEVELS.items():
+        groups, member_groups, member_nodes = coordinator_groups(voters, keys)
+        reach = chunked_reach(shard.offsets, shard.targets, member_groups, member_nodes, len(groups), max_degree)
+        frames.append(
+            groups
+            .with_columns(
+                level=pl.lit(level),
+                **{c: pl.lit('') for c in ['center', 'box'] if c not in keys},
+                **{f'reach_{k + 1}': pl.Series(reach[:, k]) for k in range(max_degree)},
+            )
+            .join(location_voters(persons, keys), on=keys)
+            .with_columns(voter_share=pl.col('num_voters') / pl.col('location_voters'))
+            .select(
+                'level', 'circle', 'center', 'box', 'role', 'coordinator',
+                'num_voters', 'num_families', 'location_voters', 'voter_share',
+                *[f'reach_{k + 1}' for k in range(max_degree)],
+            )
+        )
+
+    return pl.concat(frames, how='vertical_relaxed')
+
+def merge_uncovered_index(frames: list):
+    return pl.concat(frames, how='vertical_relaxed').sort(['level', 'circle', 'center', 'box', 'rank'])
+
+@register_task('uncovered_influence', max_degree=UNCOVERED_DEGREE, relationships=KINSHIP_RELATIONSHIPS, merge=merge_uncovered_index)
+def uncovered_influence_shard(shard: Shard, max_degree: int = UNCOVERED_DEGREE, limit: int = UNCOVERED_PER_LOCATION):
+    persons = shard_frame(
+        shard,
+        ['national_no', 'full_name', 'family_name', 'phone_number', 'circle', 'center', 'box', 'principal_coordinator', 'sub_coordinator'],
+    )
+
+    # voters nobody coordinates, with the number of other voters within 1..k hops of each
+    uncovered = (
+        persons.with_row_index('idx')
+        .filter(
+            pl.col('is_core') & ~pl.col('is_missing').fill_null(False)
+            & pl.all_horizontal([pl.col(c).fill_null('missing') == 'missing' for c in COORDINATOR_ROLES.values()])
+        )
+    )
+    nodes = uncovered['idx'].to_numpy().astype(np.int64)
+    reach = chunked_reach(
+        shard.offsets, shard.targets, np.arange(len(nodes)), nodes, len(nodes), max_degree,
+        counted=~shard.array('is_missing').astype(bool),
+    )
+    uncovered = uncovered.with_columns(**{f'reach_{k + 1}': pl.Series(reach[:, k]) for k in range(max_degree)})
+
+    frames = []
+    for level, keys in LOCATION_LEVELS.items():
+        frames.append(
+            uncovered
+            .sort(keys + [f'reach_{max_degree}', 'national_no'], descending=[False] * len(keys) + [True, False])
+            .group_by(keys, maintain_order=True).head(limit)
+            .with_columns(
+                level=pl.lit(level),
+                rank=pl.int_range(1, pl.len() + 1).over(keys),
+                **{c: pl.lit('') for c in ['center', 'box'] if c not in keys},
+            )
+            .select(
+                'level', 'circle', 'center', 'box', 'rank', 'national_no', 'full_name', 'family_name', 'phone_number',
+                'family_id', 'family_size', *[f'reach_{k + 1}' for k in range(max_degree)],
+            )
+        )
+
+    return pl.concat(frames, how='vertical_relaxed')
+
+def coordinator_totals(db_dir: str, max_degree: int = MAX_DEGREE, build_id: str = None):
+    # coordinators can span circles, so their roll-wide reach is one whole-graph pass
+    snapshot = open_snapshot(db_dir, build_id)
+    persons = pl.from_arrow(snapshot.persons.select(['principal_coordinator', 'sub_coordinator'])).with_columns(
+        is_missing=pl.Series(np.asarray(snapshot.arrays['is_missing'])),
+        family_id=pl.Series(np.asarray(snapshot.arrays['family_id'])),
+        is_core=pl.lit(True),
+    )
+    offsets, targets = snapshot.adjacency(KINSHIP_RELATIONSHIPS)
+
+    groups, member_groups, member_nodes = coordinator_groups(assigned_voters(persons), [])
+    reach = chunked_reach(offsets, targets, member_groups, member_nodes, len(groups), max_degree)
+    num_voters = int((~np.asarray(snapshot.arrays['is_missing'])).sum())
+
+    return (
+        groups
+        .with_columns(
+            level=pl.lit('all'),
+            circle=pl.lit(''),
+            center=pl.lit(''),
+            box=pl.lit(''),
+            location_voters=pl.lit(num_voters, dtype=pl.UInt32),
+            **{f'reach_{k + 1}': pl.Series(reach[:, k]) for k in range(max_degree)},
+        )
+        .with_columns(voter_share=pl.col('num_voters') / pl.col('location_voters'))
+        .select(
+            'level', 'circle', 'center', 'box', 'role', 'coordinator',
+            'num_voters', 'num_families', 'location_voters', 'voter_share',
+            *[f'reach_{k + 1}' for k in range(max_degree)],
+        )
+    )
+
+def build_coordinator_index(
+    db_dir: str = DEFAULT_DB_DIR,
+    workers: int = None,
+    build_id: str = None,
+):
+    # after every campaign update: coordinator rollups per location and the uncovered voters with
+    # the most relatives, both from the snapshot's circle shards and written into that snapshot
+    print(f"Building coordinator coverage ...")
+    out = run_tasks(db_dir, ['coordinator_coverage', 'uncovered_influence'], workers, build_id=build_id)
+
+    path = open_snapshot(db_dir, build_id).path
+    coordinators = merge_coordinator_index([coordinator_totals(db_dir, build_id=build_id), out['coordinator_coverage']])
+    write_ipc(coordinators, os.path.join(path, COORDINATOR_INDEX_FILE))
+    write_ipc(out['uncovered_influence'], os.path.join(path, UNCOVERED_INDEX_FILE))
+    print(f"Coordinator index written: {len(coordinators)} rows, {coordinators.filter(pl.col('level') == 'all').height} coordinators")
+    print(f"Uncovered index written: {len(out['uncovered_influence'])} rows")
+
+    return coordinators, out['uncovered_influence']
+
+def normalize_names(expr: pl.Expr):
+    # polars twin of utils.search.normalize_name
+    expr = expr.str.to_lowercase().str.replace_all(DIACRITICS_PATTERN, '')
+    for a, b in CHAR_MAP.items():
+        expr = expr.str.replace_all(a, b, literal=True)
+    expr = expr.str.replace_all(NON_NAME_PATTERN, ' ')
+    for a, b in JOINS.items():
+        expr = expr.str.replace_all(a, b, literal=True)
+    return expr.str.replace_all(' +', ' ').str.strip_chars()
+
+def name_tokens(persons: pl.DataFrame):
+    # (idx, token) for every distinct normalized name token of every person
+    return (
+        persons.select(
+            'idx',
+            token=normalize_names(pl.concat_str(SEARCH_NAME_COLUMNS, separator=' ', ignore_nulls=True)).str.split(' '),
+        )
+        .explode('token')
+        .filter(pl.col('token') != '')
+        .with_columns(pl.col('token').str.slice(0, MAX_TOKEN_LENGTH))
+        .unique()
+    )
+
+def token_grams(tokens: pl.DataFrame):
+    # padded trigrams of each distinct token: 'محمد' -> ' مح', 'محم', 'حمد', 'مد '
+    padded = pl.lit(' ') + pl.col('token') + pl.lit(' ')
+    return pl.concat([
+        tokens.select('token_id', gram=padded.str.slice(i, GRAM_SIZE))
+        for i in range(MAX_TOKEN_LENGTH + 3 - GRAM_SIZE)
+    ]).filter(pl.col('gram').str.len_chars() == GRAM_SIZE).unique()
+
+def build_search_index(db_dir: str = DEFAULT_DB_DIR, build_id: str = None):
+    snapshot = open_snapshot(db_dir, build_id)
+    if snapshot is None:
+        raise FileNotFoundError(f"No graph snapshot in {db_dir}, run build_snapshot first")
+
+    # people in the roll only; placeholder parents have no names to find
+    persons = (
+        pl.from_arrow(snapshot.persons.select(['national_no'] + SEARCH_NAME_COLUMNS))
+        .with_row_index('idx')
+        .filter(~pl.Series(np.asarray(snapshot.arrays['is_missing'])))
+    )
+
+    print(f"Building search index over {len(persons)} people ...")
+    numbers = persons.select('national_no', 'idx').drop_nulls().sort('national_no')
+
+    # names repeat endlessly, so grams are cut once per distinct token and people are joined
+    # to them as integer ids, a chunk of people at a time
+    vocabulary = set()
+    for start in range(0, len(persons), SEARCH_CHUNK_SIZE):
+        vocabulary.update(name_tokens(persons[start:start + SEARCH_CHUNK_SIZE])['token'].unique().to_list())
+    tokens = pl.DataFrame({'token': sorted(vocabulary)}, schema={'token': pl.Utf8}).with_row_index('token_id')
+    gram_table = token_grams(tokens)
+    grams = gram_table.select('gram').unique().sort('gram').with_row_index('gram_id')
+    gram_table = gram_table.join(grams, on='gram').select('token_id', 'gram_id')
+
+    gram_ids, postings = [], []
+    for start in range(0, len(persons), SEARCH_CHUNK_SIZE):
+        rows = (
+            name_tokens(persons[start:start + SEARCH_CHUNK_SIZE])
+            .join(tokens, on='token')
+            .join(gram_table, on='token_id')
+            .select('idx', 'gram_id')
+            .unique()
+            .sort('idx', 'gram_id')
+        )
+        gram_ids.append(rows['gram_id'].to_numpy().astype(np.int64))
+        postings.append(rows['idx'].to_numpy().astype(np.int64))
+    gram_ids, postings = np.concatenate(gram_ids), np.concatenate(postings)
+
+    # chunks come in person order, so a stable sort by gram keeps each posting list sorted
+    order = np.argsort(gram_ids, kind='stable')
+    gram_offsets = np.zeros(len(grams) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(gram_ids, minlength=len(grams)), out=gram_offsets[1:])
+    gram_counts = np.minimum(np.bincount(postings, minlength=snapshot.num_nodes), np.iinfo(np.uint16).max)
+
+    path = write_search_index(
+        snapshot.path,
+        numbers['national_no'].to_numpy().astype(np.bytes_),
+        numbers['idx'].to_numpy(),
+        grams['gram'].to_list(),
+        gram_offsets,
+        postings[order],
+        gram_counts,
+    )
+    print(f"Search index written: {path} ({len(tokens)} tokens, {len(grams)} grams, {len(postings)} postings)")
+
+    return path
+
+def warm_cache(
+    n4j__uri: str,
+    n4j__user: str,
+    n4j__password: str,
+    db_dir: str = DEFAULT_DB_DIR,
+):
+    # the warmer runs the app's own query functions, so it gets its own interpreter and settings;
+    # a cold cache only costs the first users time, it never fails the build
+    print(f"Warming the app result cache ...")
+    env = os.environ | {'NEO4J__URI': n4j__uri, 'NEO4J__USER': n4j__user, 'NEO4J__PASSWORD': n4j__password}
+    result = subprocess.run([sys.executable, WARM_CACHE_SCRIPT, '--db-dir', db_dir], env=env)
+    if result.returncode != 0:
+        print(f"Cache warm-up failed with exit code {result.returncode}, the app will start cold.")
+
 if __name__ == '__main__':
     raw_df_path = sys.argv[1]
     campaign_df_path = sys.argv[2]
     n4j__uri = sys.argv[3]
     n4j__user = sys.argv[4]
     n4j__password = sys.argv[5]
+    db_dir = sys.argv[6] if len(sys.argv) > 6 else DEFAULT_DB_DIR
 
     print("Running build_graph.py with the following arguments:")
     print(f"> raw_df_path: {raw_df_path}")
@@ -403,6 +1195,7 @@ if __name__ == '__main__':
     print(f"> n4j__uri: {n4j__uri}")
     print(f"> n4j__user: {n4j__user}")
     print(f"> n4j__password: {n4j__password}")
+    print(f"> db_dir: {db_dir}")
     print('-'*50)
 
     init_constraints(n4j__uri, n4j__user, n4j__password)
@@ -421,9 +1214,40 @@ if __name__ == '__main__':
         n4j__password,
     )
 
+    compute_family_components(
+        n4j__uri,
+        n4j__user,
+        n4j__password,
+    )
+
     update_campaign_data(
         campaign_df_path,
         n4j__uri,
         n4j__user,
         n4j__password,
     )
+
+    # the app only switches to the new build once all of its indexes are in place
+    build_id = os.path.basename(build_snapshot(
+        n4j__uri,
+        n4j__user,
+        n4j__password,
+        db_dir,
+        publish=False,
+    ))
+
+    build_family_index(db_dir, build_id=build_id)
+
+    build_coordinator_index(db_dir, build_id=build_id)
+
+    build_search_index(db_dir, build_id=build_id)
+
+    publish_snapshot(db_dir, build_id)
+    print(f"Snapshot published: {build_id}")
+
+    warm_cache(
+        n4j__uri,
+        n4j__user,
+        n4j__password,
+        db_dir,
+    )
@@ -0,0 +1,122 @@
+"""
+Pre-compute the app's default queries for every location of a freshly built snapshot.
+
+Walks Circle -> Center -> Box, most requested locations first, and runs the default Relative Rank
+search (all relationships, degree 2) with bounded concurrency so the results land in the app's
+on-disk result cache before the first user asks. Run by build_graph.py at the end of a build.
+
+    python scripts/warm_cache.py [--db-dir DIR] [--workers 4] [--levels circle center box] [--time-budget 1800]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from utils import graph, result_cache  # noqa: E402
+
+DEFAULT_RELATIONSHIPS = ['FATHER', 'MOTHER', 'SPOUSE', 'SIBLING']
+DEFAULT_DEGREE = 2
+WARM_WORKERS = 4
+WARM_TIME_BUDGET = 1800
+LEVELS = ['circle', 'center', 'box']
+
+
+def location_filters(snapshot, levels):
+    # straight from the snapshot's box table (sorted by circle, center, box): the app's own
+    # get_circles / get_centers / get_boxes caches live per process and would die with this one
+    out = []
+    for circle_id, circle_boxes in snapshot.boxes.groupby('circle_id', sort=False):
+        if 'circle' in levels:
+            out.append(('circle', {'circle': circle_id, 'center': None, 'box': None}))
+
+        for center_id, center_boxes in circle_boxes.groupby('center_id', sort=False):
+            if 'center' in levels:
+                out.append(('center', {'circle': circle_id, 'center': center_id, 'box': None}))
+
+            if 'box' in levels:
+                for box_id in center_boxes['box_id']:
+                    out.append(('box', {'circle': circle_id, 'center': center_id, 'box': box_id}))
+
+    return [(level, f | {'relationship': DEFAULT_RELATIONSHIPS, 'degree': DEFAULT_DEGREE}) for level, f in out]
+
+
+def prioritize(locations, db_dir):
+    # most requested first; the hierarchy walk order breaks ties (sort is stable)
+    hits = result_cache.access_counts(db_dir, 'get_relative_counts')
+    location = lambda f: result_cache.location_key(graph.get_location_names(f['circle'], f['center'], f['box']))
+    return sorted(locations, key=lambda x: -hits.get(location(x[1]), 0))
+
+
+def warm_location(filters):
+    # only persistent_cache results outlive this process, so that is all there is to warm
+    started = time.perf_counter()
+    _, _, info = graph.get_relative_counts(filters)
+    return time.perf_counter() - started, info['truncated']
+
+
+def warm(db_dir, workers=WARM_WORKERS, levels=LEVELS, time_budget=WARM_TIME_BUDGET):
+    graph.DB_DIR = db_dir
+    result_cache.recording = False
+
+    snapshot = graph.get_snapshot()
+    if snapshot is None:
+        print(f"No graph snapshot in {db_dir}, nothing to warm.")
+        return None
+
+    started = time.perf_counter()
+    pruned = result_cache.prune(db_dir, snapshot.build_id)
+    todo = prioritize(location_filters(snapshot, levels), db_dir)
+    print(f"Warming {len(todo)} locations for build {snapshot.build_id} with {workers} workers ({pruned} stale results dropped) ...")
+
+    stats = {level: {'warmed': 0, 'truncated': 0, 'failed': 0, 'seconds': 0.0} for level in levels}
+    pending = {}
+    queue = iter(todo)
+    skipped = 0
+
+    # never more than `workers` searches in flight, and nothing new once the budget is spent
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            while len(pending) < workers and time.perf_counter() - started < time_budget:
+                item = next(queue, None)
+                if item is None:
+                    break
+                pending[pool.submit(warm_location, item[1])] = item
+
+            if not pending:
+                break
+
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                level, filters = pending.pop(future)
+                try:
+                    seconds, truncated = future.result()
+                    stats[level]['warmed'] += 1
+                    stats[level]['truncated'] += int(truncated)
+                    stats[level]['seconds'] += seconds
+                except Exception as e:
+                    stats[level]['failed'] += 1
+                    print(f"> failed {filters}: {type(e).__name__}: {e}")
+
+        skipped = sum(1 for _ in queue)
+
+    elapsed = time.perf_counter() - started
+    for level, s in stats.items():
+        print(f"> {level}: {s['warmed']} warmed ({s['truncated']} truncated, not cached), {s['failed']} failed, {s['seconds']:.1f}s of work")
+    if skipped:
+        print(f"> {skipped} locations left cold, time budget of {time_budget}s spent")
+    print(f"Cache warm-up finished in {elapsed:.1f}s")
+
+    return {'build_id': snapshot.build_id, 'elapsed': elapsed, 'skipped': skipped, 'levels': stats}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db-dir', default=graph.DB_DIR)
+    parser.add_argument('--workers', type=int, default=WARM_WORKERS)
+    parser.add_argument('--levels', nargs='+', choices=LEVELS, default=LEVELS)
+    parser.add_argument('--time-budget', type=float, default=WARM_TIME_BUDGET, help='seconds')
+    args = parser.parse_args()
+
+    warm(args.db_dir, args.workers, args.levels, args.time_budget)